@@ -17,6 +17,10 @@ class Settings(BaseSettings):
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 1440
     app_version: str = "2026.03.03.17.18.19"
+    # Retention: Zeilen pro Chunk/Commit, Drossel (0 = ungebremst), Intervall des Zeitplans (0 = aus)
+    retention_chunk_size: int = 10000
+    retention_rows_per_second: int = 20000
+    retention_interval_minutes: int = 60
     
     @property
     def database_url(self) -> str:
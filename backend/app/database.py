@@ -5,6 +5,7 @@
 # Beschreibung: LogBot v2026.01.30.13.30.00 - Async SQLAlchemy Database
 # ==============================================================================
 
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from .config import settings
@@ -13,6 +14,17 @@ engine = create_async_engine(settings.database_url, pool_pre_ping=True)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
+# Geschätzte Zeilenzahl von logs aus pg_class (kein Full-Scan). logs ist partitioniert:
+# reltuples der Elterntabelle pflegt autovacuum nicht, daher Summe über die Partitionen
+# (Schema ohne Partitionierung: nur die Tabelle selbst). Nie oder nur leer analysierte
+# Partitionen (reltuples -1/0, meist die des aktuellen Tages) zählen mit n_live_tup
+LOG_COUNT_ESTIMATE = text(
+    "SELECT COALESCE(SUM(GREATEST(c.reltuples, COALESCE(s.n_live_tup, 0))), 0)::bigint "
+    "FROM pg_class c LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid "
+    "WHERE (c.oid = 'logs'::regclass AND c.relkind = 'r') "
+    "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = 'logs'::regclass)"
+)
+
 async def get_db():
     async with async_session() as session:
         try:
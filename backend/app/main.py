@@ -5,19 +5,23 @@
 # Beschreibung: LogBot v2026.02.20.12.00.00 - FastAPI Hauptanwendung
 # ==============================================================================
 
+import asyncio
 from datetime import datetime
 import secrets
 import logging
 from fastapi import FastAPI, HTTPException, Query, Header, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import select, desc
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from .config import settings
 from .database import get_db, async_session
-from .models import Webhook, Log, Agent, AgentToken
+from .models import Webhook, Log, Agent, AgentToken, LogSource, LogRollup, LEVEL_SEVERITY
 from .schemas import LogResponse, LogDetailResponse, LogIngestRequest, LogIngestResponse
 from .routes import auth_router, health_router, users_router, agents_router, agent_tokens_router, logs_router, webhooks_router, settings_router
 from .branding import branding_router
+from .retention import retention_scheduler
+from .search import field_matches, level_in
 
 app = FastAPI(
     title="LogBot",
@@ -61,6 +65,17 @@ async def ensure_default_agent_token():
         # Nicht den gesamten Service kippen, falls DB noch nicht bereit ist
         logger.warning("Default agent token init skipped: %s", exc)
 
+# Aktiven Event-Loop protokollieren (Auswahl per UVICORN_LOOP: auto = uvloop, falls installiert)
+@app.on_event("startup")
+async def log_event_loop():
+    loop = asyncio.get_running_loop()
+    logging.getLogger("logbot.startup").info("Event-Loop: %s", type(loop).__module__.split(".")[0])
+
+@app.on_event("startup")
+async def start_retention_scheduler():
+    if settings.retention_interval_minutes > 0:
+        app.state.retention_scheduler = asyncio.create_task(retention_scheduler())
+
 # Öffentlicher Webhook Endpoint - KEINE Auth!
 @app.get("/api/webhook/{webhook_id}/call", tags=["Webhooks"])
 async def call_webhook(webhook_id: int, token: str = Query(...), db: AsyncSession = Depends(get_db)):
@@ -74,11 +89,11 @@ async def call_webhook(webhook_id: int, token: str = Query(...), db: AsyncSessio
     query = select(Log)
     
     if filters.get("hostname"):
-        query = query.where(Log.hostname.ilike(f"%{filters['hostname']}%"))
+        query = query.where(field_matches("hostname", f"%{filters['hostname']}%"))
     if filters.get("source"):
-        query = query.where(Log.source.ilike(f"%{filters['source']}%"))
+        query = query.where(field_matches("source", f"%{filters['source']}%"))
     if filters.get("level"):
-        query = query.where(Log.level.in_(filters["level"]))
+        query = query.where(level_in(filters["level"]))
     
     query = query.order_by(desc(Log.timestamp)).limit(webhook.max_results)
     result = await db.execute(query)
@@ -90,10 +105,11 @@ async def call_webhook(webhook_id: int, token: str = Query(...), db: AsyncSessio
     
     if webhook.include_raw:
         return [LogDetailResponse(id=l.id, hostname=l.hostname, ip_address=l.ip_address, timestamp=l.timestamp,
-                level=l.level, source=l.source, message=l.message, agent_id=l.agent_id, facility=l.facility,
-                raw_message=l.raw_message, metadata=l.metadata or {}) for l in logs]
+                level=l.level, source=l.source, message=l.message, repeat_count=l.repeat_count,
+                agent_id=l.agent_id, facility=l.facility, raw_message=l.full_raw_message, extra_data=l.extra_data or {},
+                first_timestamp=l.first_timestamp, last_timestamp=l.last_timestamp) for l in logs]
     return [LogResponse(id=l.id, hostname=l.hostname, ip_address=l.ip_address, timestamp=l.timestamp,
-            level=l.level, source=l.source, message=l.message) for l in logs]
+            level=l.level, source=l.source, message=l.message, repeat_count=l.repeat_count) for l in logs]
 
 # Öffentlicher Ingest-Endpoint - Auth via Agent-Token (Bearer)
 @app.post("/api/agents/ingest", response_model=LogIngestResponse, tags=["Agent Ingest"])
@@ -131,14 +147,36 @@ async def ingest_logs(
         db.add(agent)
         await db.flush()
 
-    # Logs einfügen
+    # Sources im Wörterbuch anlegen (Host steht über agent_id in agents)
+    names = {event.source[:100] for event in data.events if event.source}
+    source_ids = {}
+    if names:
+        await db.execute(pg_insert(LogSource).values([{"name": name} for name in names])
+                         .on_conflict_do_nothing(index_elements=["name"]))
+        source_ids = dict((await db.execute(
+            select(LogSource.name, LogSource.id).where(LogSource.name.in_(names)))).all())
+
+    # Logs einfügen, Zähler für logs_rollup (Statistiken) in derselben Transaktion
+    now = datetime.utcnow()
+    counts = {}
     for event in data.events:
         log = Log(
-            agent_id=agent.id, hostname=data.hostname, ip_address=client_ip,
-            facility=1, level=event.level, source=event.source,
+            agent_id=agent.id, timestamp=now, facility=1, severity=LEVEL_SEVERITY.get(event.level.lower()),
+            source_id=source_ids.get(event.source[:100]),
             message=event.message, raw_message=event.message,
             extra_data={"ingested_via": "https"})
         db.add(log)
+        counts[(log.severity, log.source_id)] = counts.get((log.severity, log.source_id), 0) + 1
+    if counts:
+        minute = now.replace(second=0, microsecond=0)
+        rollup = pg_insert(LogRollup).values([
+            {"minute": minute, "agent_id": agent.id, "severity": severity, "source_id": source_id, "count": n}
+            # Feste Reihenfolge der Zeilensperren bei parallelen Ingests
+            for (severity, source_id), n in sorted(counts.items(), key=lambda item: (
+                item[0][0] is None, item[0][0] or 0, item[0][1] is None, item[0][1] or 0))])
+        await db.execute(rollup.on_conflict_do_update(
+            index_elements=["minute", "agent_id", "severity", "source_id"],
+            set_={"count": LogRollup.count + rollup.excluded["count"]}))
 
     await db.commit()
     return LogIngestResponse(accepted=len(data.events))
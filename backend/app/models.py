@@ -6,10 +6,17 @@
 # ==============================================================================
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, SmallInteger, BigInteger, String, Text, Boolean, DateTime, ForeignKey, JSON, func, select
+from sqlalchemy.orm import relationship, column_property
 from .database import Base
 
+# Syslog-Severity (logs.severity) -> Level-Name, wie im Syslog-Server
+LEVEL_NAMES = {0: "emergency", 1: "alert", 2: "critical", 3: "error",
+               4: "warning", 5: "notice", 6: "info", 7: "debug"}
+# Level-Name (klein) -> Severity, inkl. gängiger Kurzformen
+LEVEL_SEVERITY = {**{name: severity for severity, name in LEVEL_NAMES.items()},
+                  "emerg": 0, "crit": 2, "err": 3, "warn": 4, "information": 6, "informational": 6}
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -34,21 +41,59 @@ class Agent(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     logs = relationship("Log", back_populates="agent", passive_deletes=True)
 
+class LogSource(Base):
+    __tablename__ = "log_sources"
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+
 class Log(Base):
     __tablename__ = "logs"
     id = Column(Integer, primary_key=True)
     agent_id = Column(Integer, ForeignKey("agents.id", ondelete="SET NULL"))
-    hostname = Column(String(255))
-    ip_address = Column(String(45))
+    # Absender-IP nur für Zeilen ohne Agent (Agent-Auflösung im Syslog-Server fehlgeschlagen)
+    sender_ip = Column("ip_address", String(45))
     timestamp = Column(DateTime, default=datetime.utcnow)
     facility = Column(Integer)
-    level = Column(String(20))
-    source = Column(String(100))
+    # Kompakt gespeichert: Level als Syslog-Severity, Source als ID in log_sources
+    severity = Column(SmallInteger)
+    source_id = Column(Integer)
     message = Column(Text)
     raw_message = Column(Text)
+    # Syslog RAW_STORAGE=compact: nur der Teil vor message, raw_message bleibt NULL
+    raw_prefix = Column(Text)
     extra_data = Column(JSON, default=dict)
+    # Zusammengefasste Wiederholungen (Syslog DEDUP_WINDOW): Anzahl und Zeitraum
+    repeat_count = Column(Integer, nullable=False, default=1)
+    first_timestamp = Column(DateTime)
+    last_timestamp = Column(DateTime)
+    message_hash = Column(BigInteger)
     created_at = Column(DateTime, default=datetime.utcnow)
     agent = relationship("Agent", back_populates="logs")
+    # Lesend wie früher als Spalten (Unterabfrage per Primärschlüssel); filtern über agent_id/source_id
+    hostname = column_property(select(Agent.hostname).where(Agent.id == agent_id).scalar_subquery())
+    ip_address = column_property(func.coalesce(
+        select(Agent.ip_address).where(Agent.id == agent_id).scalar_subquery(), sender_ip))
+    source = column_property(select(LogSource.name).where(LogSource.id == source_id).scalar_subquery())
+
+    @property
+    def level(self):
+        return LEVEL_NAMES.get(self.severity)
+
+    @property
+    def full_raw_message(self):
+        """Original-Nachricht, bei kompakter Speicherung aus raw_prefix + message rekonstruiert."""
+        if self.raw_message is None and self.raw_prefix is not None:
+            return self.raw_prefix + (self.message or "")
+        return self.raw_message
+
+class LogRollup(Base):
+    """Anzahl Logs pro Minute, Agent, Severity und Source (Statistiken ohne count über logs)."""
+    __tablename__ = "logs_rollup"
+    minute = Column(DateTime, primary_key=True)
+    agent_id = Column(Integer, primary_key=True)
+    severity = Column(SmallInteger, primary_key=True)
+    source_id = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False)
 
 class Webhook(Base):
     __tablename__ = "webhooks"
@@ -0,0 +1,191 @@
+# ==============================================================================
+# Name:        Philipp Fischer
+# Kontakt:     p.fischer@itconex.de
+# Version:     2026.10.18.12.00.00
+# Beschreibung: LogBot v2026.10.18.12.00.00 - Log-Retention als Hintergrund-Job
+#               Tages-Partitionen droppen, Rest in gedrosselten Chunks löschen,
+#               zeitgesteuert nach log_retention_days
+# ==============================================================================
+
+import asyncio
+import logging
+import time as _time
+from datetime import datetime, time, timedelta
+from typing import Optional
+from sqlalchemy import select, delete, func, text
+from .config import settings
+from .database import engine, async_session
+from .models import Log, LogRollup, Setting
+
+logger = logging.getLogger("logbot.retention")
+
+
+def retention_cutoff(days: int) -> datetime:
+    """Stichtag der Retention, auf 00:00 UTC abgerundet (logs ist nach Tagen partitioniert)."""
+    return datetime.combine((datetime.utcnow() - timedelta(days=days)).date(), time.min)
+
+
+class RetentionJob:
+    """Ein Retention-Lauf im Hintergrund (höchstens einer gleichzeitig).
+
+    1. Ganze Tages-Partitionen vor dem Stichtag per logs_drop_partitions löschen.
+    2. Verbleibende Zeilen (logs_default, logs_legacy bzw. Schema ohne Partitionen) in
+       Chunks zu retention_chunk_size über idx_logs_timestamp_id löschen, Commit pro Chunk,
+       gedrosselt auf retention_rows_per_second - keine minutenlange Transaktion, WAL verteilt.
+    3. Zähler in logs_rollup bis zum selben Stichtag löschen.
+
+    Ein Session-Advisory-Lock verhindert parallele Läufe mehrerer Backend-Prozesse.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._reset()
+
+    def _reset(self):
+        """Zustand eines Laufs zurücksetzen (vor jedem neuen Lauf)."""
+        self.status = "idle"
+        self.trigger: Optional[str] = None
+        self.cutoff: Optional[datetime] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.partition_rows = 0
+        self.deleted_count = 0
+        self.total: Optional[int] = None
+        self.chunks = 0
+        self.error: Optional[str] = None
+        # monotonic-Zeitpunkte der Chunk-Phase (gemessene Löschrate)
+        self._delete_started: Optional[float] = None
+        self._delete_finished: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, cutoff: datetime, trigger: str) -> bool:
+        """Job starten; False, wenn bereits einer läuft."""
+        if self.running:
+            return False
+        self._reset()
+        self.status = "running"
+        self.trigger = trigger
+        self.cutoff = cutoff
+        self.started_at = datetime.utcnow()
+        self._task = asyncio.create_task(self._run())
+        return True
+
+    def snapshot(self) -> dict:
+        done = self.partition_rows + self.deleted_count
+        if self.status == "done":
+            progress = 1.0
+        elif self.total:
+            progress = min(done / self.total, 1.0)
+        else:
+            progress = 0.0
+        # Tatsächliche Rate der Chunk-Löschung (Partitionen fallen ohne Drosselung weg)
+        rate = 0.0
+        if self._delete_started is not None:
+            elapsed = (self._delete_finished or _time.monotonic()) - self._delete_started
+            if elapsed > 0:
+                rate = round(self.deleted_count / elapsed, 1)
+        return {
+            "status": self.status,
+            "trigger": self.trigger,
+            "cutoff": self.cutoff,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "partition_rows": self.partition_rows,
+            "deleted_count": done,
+            "total": self.total,
+            "progress": progress,
+            "chunks": self.chunks,
+            "rows_per_second": rate,
+            "rows_per_second_limit": settings.retention_rows_per_second,
+            "error": self.error,
+        }
+
+    async def _run(self):
+        try:
+            async with engine.connect() as conn:
+                if not (await conn.execute(text("SELECT pg_try_advisory_lock(hashtext('logs_retention'))"))).scalar():
+                    await conn.commit()
+                    self.status = "skipped"
+                    self.error = "Retention läuft bereits in einem anderen Prozess"
+                    return
+                try:
+                    await self._drop_partitions(conn)
+                    await self._delete_chunks(conn)
+                    await conn.execute(delete(LogRollup).where(LogRollup.minute < self.cutoff))
+                    await conn.commit()
+                finally:
+                    await conn.rollback()
+                    await conn.execute(text("SELECT pg_advisory_unlock(hashtext('logs_retention'))"))
+                    await conn.commit()
+            self.status = "done"
+            logger.info("Retention (%s) bis %s: %d Logs gelöscht (%d per Partition, %d Chunks)",
+                        self.trigger, self.cutoff, self.partition_rows + self.deleted_count,
+                        self.partition_rows, self.chunks)
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as exc:
+            self.status = "failed"
+            self.error = str(exc)
+            logger.error("Retention fehlgeschlagen: %s", exc)
+        finally:
+            self.finished_at = datetime.utcnow()
+
+    async def _drop_partitions(self, conn):
+        if not (await conn.execute(text("SELECT to_regproc('logs_drop_partitions') IS NOT NULL"))).scalar():
+            return
+        self.partition_rows = (await conn.execute(
+            text("SELECT logs_drop_partitions(:cutoff)"), {"cutoff": self.cutoff})).scalar() or 0
+        await conn.commit()
+
+    async def _delete_chunks(self, conn):
+        remaining = (await conn.execute(
+            select(func.count()).select_from(Log).where(Log.timestamp < self.cutoff))).scalar() or 0
+        await conn.commit()
+        self.total = self.partition_rows + remaining
+        if not remaining:
+            return
+        size = max(settings.retention_chunk_size, 1)
+        # Chunk = Zeitbereich bis zum size-ältesten Eintrag: Grenze und DELETE laufen beide als
+        # Range-Scan über den timestamp-Index, ohne die Tabelle pro Chunk komplett zu lesen
+        boundary = select(Log.timestamp).where(Log.timestamp < self.cutoff).order_by(Log.timestamp).offset(size - 1).limit(1)
+        rate = settings.retention_rows_per_second
+        self._delete_started = _time.monotonic()
+        try:
+            while True:
+                started = _time.monotonic()
+                bound = (await conn.execute(boundary)).scalar()
+                condition = Log.timestamp <= bound if bound is not None else Log.timestamp < self.cutoff
+                deleted = (await conn.execute(delete(Log).where(condition))).rowcount
+                await conn.commit()
+                self.deleted_count += deleted
+                self.chunks += 1
+                if bound is None:
+                    break
+                if rate > 0:
+                    await asyncio.sleep(max(0.0, deleted / rate - (_time.monotonic() - started)))
+        finally:
+            self._delete_finished = _time.monotonic()
+
+retention_job = RetentionJob()
+
+
+async def retention_scheduler():
+    """Retention alle retention_interval_minutes nach dem Setting log_retention_days starten."""
+    interval = settings.retention_interval_minutes * 60
+    # Erster Lauf kurz nach dem Start, nicht im selben Moment wie alle anderen Startup-Tasks
+    await asyncio.sleep(min(interval, 60))
+    while True:
+        try:
+            async with async_session() as session:
+                days = (await session.execute(
+                    select(Setting.value).where(Setting.key == "log_retention_days"))).scalar()
+            days = int(days or 0)
+            if days > 0:
+                retention_job.start(retention_cutoff(days), "schedule")
+        except Exception as exc:
+            logger.warning("Retention-Zeitplan übersprungen: %s", exc)
+        await asyncio.sleep(interval)
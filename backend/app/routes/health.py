@@ -9,11 +9,11 @@ import time
 from datetime import datetime, timedelta
 import psutil
 from fastapi import APIRouter, Depends
-from sqlalchemy import select, func, text
+from sqlalchemy import select, func, BigInteger
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..config import settings
-from ..database import get_db
-from ..models import Log, Agent
+from ..database import get_db, LOG_COUNT_ESTIMATE
+from ..models import LogRollup, Agent
 from ..schemas import HealthResponse, HealthDetailedResponse
 from ..auth import get_current_user
 
@@ -29,11 +29,11 @@ async def health_detailed(db: AsyncSession = Depends(get_db), _=Depends(get_curr
     db_ok = True
     logs_total = logs_24h = agents_total = agents_online = 0
     try:
-        logs_total = (await db.execute(text(
-            "SELECT GREATEST(reltuples::bigint, 0) FROM pg_class WHERE relname = 'logs'"
-        ))).scalar() or 0
+        logs_total = (await db.execute(LOG_COUNT_ESTIMATE)).scalar() or 0
         yesterday = datetime.utcnow() - timedelta(hours=24)
-        logs_24h = (await db.execute(select(func.count(Log.id)).where(Log.timestamp >= yesterday))).scalar() or 0
+        # Aus logs_rollup (auf die Minute genau) statt count über die Logs der letzten 24h
+        logs_24h = (await db.execute(select(func.sum(LogRollup.count).cast(BigInteger))
+                                     .where(LogRollup.minute >= yesterday))).scalar() or 0
         agents_total = (await db.execute(select(func.count(Agent.id)))).scalar() or 0
         five_min = datetime.utcnow() - timedelta(minutes=5)
         agents_online = (await db.execute(select(func.count(Agent.id)).where(Agent.last_seen >= five_min))).scalar() or 0
@@ -5,35 +5,56 @@
 # Beschreibung: LogBot v2026.02.16.12.00.00 - Logs API Endpoints
 # ==============================================================================
 
+import base64
 import logging
 from datetime import datetime
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, func, desc, text
+from sqlalchemy import select, func, desc, tuple_, BigInteger
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..database import get_db
-from ..models import Log, Agent, User
+from ..database import get_db, LOG_COUNT_ESTIMATE
+from ..models import Log, Agent, LogSource, LogRollup, User, LEVEL_NAMES
 from ..schemas import LogResponse, LogDetailResponse, LogListResponse, LogStatsResponse
 from ..auth import get_current_user
+from ..search import compile_search, field_matches, level_in, SearchSyntaxError
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/logs", tags=["Logs"])
 
+# Obergrenze für den Treffer-Count gefilterter Listen
+COUNT_LIMIT = 10000
 
-def _apply_filters(query, hostname, level, source, search, start_date, end_date):
-    """Filter-Bedingungen auf eine Query anwenden."""
+
+def _encode_cursor(log: Log) -> str:
+    """Position nach dem letzten Eintrag einer Seite: (timestamp, id), opak kodiert."""
+    return base64.urlsafe_b64encode(f"{log.timestamp.isoformat()}|{log.id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, log_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ungültiger Cursor")
+
+
+def _apply_filters(query, hostname, level, source, search, start_date, end_date, condition=None):
+    """Filter-Bedingungen auf eine Query anwenden (condition: übersetzte Suchanfrage q)."""
     if hostname:
-        query = query.where(Log.hostname.ilike(f"%{hostname}%"))
+        query = query.where(field_matches("hostname", f"%{hostname}%"))
     if level:
-        query = query.where(func.lower(Log.level) == level.lower())
+        query = query.where(level_in([level]))
     if source:
-        query = query.where(Log.source.ilike(f"%{source}%"))
+        query = query.where(field_matches("source", f"%{source}%"))
     if search:
         query = query.where(Log.message.ilike(f"%{search}%"))
     if start_date:
         query = query.where(Log.timestamp >= start_date)
     if end_date:
         query = query.where(Log.timestamp <= end_date)
+    if condition is not None:
+        query = query.where(condition)
     return query
 
 
@@ -45,34 +66,55 @@ async def list_logs(
     level: Optional[str] = Query(None),
     source: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description='Suchanfrage, z.B. host:fw01 "failed password" -debug'),
+    cursor: Optional[str] = Query(None, description="next_cursor der vorherigen Seite (statt page)"),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
     db: AsyncSession = Depends(get_db),
     _=Depends(get_current_user)
 ):
-    logger.info(f"Log-Filter: hostname={hostname}, level={level}, source={source}, search={search}, page={page}")
+    logger.info(f"Log-Filter: hostname={hostname}, level={level}, source={source}, search={search}, q={q}, page={page}, cursor={cursor}")
+
+    try:
+        condition = compile_search(q)
+    except SearchSyntaxError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     query = select(Log)
-    has_filters = any([hostname, level, source, search, start_date, end_date])
-    query = _apply_filters(query, hostname, level, source, search, start_date, end_date)
-
-    # Bei Filtern exakten Count, ohne Filter Schätzung aus pg_class
-    if has_filters:
-        count_query = _apply_filters(
-            select(func.count(Log.id)), hostname, level, source, search, start_date, end_date
-        )
-        total = (await db.execute(count_query)).scalar() or 0
+    has_filters = any([hostname, level, source, search, start_date, end_date, condition is not None])
+    query = _apply_filters(query, hostname, level, source, search, start_date, end_date, condition)
+
+    # Bei Filtern Count bis COUNT_LIMIT (breite Suchen zählen sonst Millionen Treffer),
+    # ohne Filter Schätzung aus pg_class. Folgeseiten per Cursor zählen nicht erneut.
+    total, total_exact = None, True
+    if not cursor:
+        if has_filters:
+            count_query = _apply_filters(
+                select(Log.id), hostname, level, source, search, start_date, end_date, condition
+            ).limit(COUNT_LIMIT + 1)
+            total = (await db.execute(select(func.count()).select_from(count_query.subquery()))).scalar() or 0
+            if total > COUNT_LIMIT:
+                total, total_exact = COUNT_LIMIT, False
+        else:
+            total = (await db.execute(LOG_COUNT_ESTIMATE)).scalar() or 0
+        logger.info(f"Log-Filter Ergebnis: {total} Treffer")
+
+    # Sortierung passend zu idx_logs_timestamp_id; id macht die Reihenfolge eindeutig
+    query = query.order_by(desc(Log.timestamp), desc(Log.id))
+    if cursor:
+        # Keyset: Seek hinter den letzten Eintrag statt OFFSET - jede Seite kostet gleich viel,
+        # neu eintreffende Logs verschieben die Seiten nicht. timestamp <= zusätzlich für Partition-Pruning.
+        timestamp, log_id = _decode_cursor(cursor)
+        query = query.where(Log.timestamp <= timestamp, tuple_(Log.timestamp, Log.id) < tuple_(timestamp, log_id))
     else:
-        total = (await db.execute(text(
-            "SELECT GREATEST(reltuples::bigint, 0) FROM pg_class WHERE relname = 'logs'"
-        ))).scalar() or 0
-
-    logger.info(f"Log-Filter Ergebnis: {total} Treffer")
-
-    offset = (page - 1) * page_size
-    result = await db.execute(query.order_by(desc(Log.timestamp)).offset(offset).limit(page_size))
+        query = query.offset((page - 1) * page_size)
+    # Eine Zeile mehr lesen: nur wenn es sie gibt, folgt eine weitere Seite
+    items = (await db.execute(query.limit(page_size + 1))).scalars().all()
+    next_cursor = _encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    items = items[:page_size]
 
-    return LogListResponse(items=result.scalars().all(), total=total, page=page, page_size=page_size)
+    return LogListResponse(items=items, total=total, total_exact=total_exact, page=page, page_size=page_size,
+                           next_cursor=next_cursor)
 
 @router.get("/filter-options")
 async def get_filter_options(db: AsyncSession = Depends(get_db), _=Depends(get_current_user)):
@@ -82,13 +124,9 @@ async def get_filter_options(db: AsyncSession = Depends(get_db), _=Depends(get_c
     hostnames = (await db.execute(
         select(Agent.hostname).where(Agent.hostname.isnot(None)).distinct().order_by(Agent.hostname)
     )).scalars().all()
-    # Source/Level: DISTINCT nur über indizierte Spalten, schnell genug
-    sources = (await db.execute(
-        select(Log.source).where(Log.source.isnot(None)).distinct().order_by(Log.source)
-    )).scalars().all()
-    levels = (await db.execute(
-        select(Log.level).where(Log.level.isnot(None)).distinct().order_by(Log.level)
-    )).scalars().all()
+    # Sources aus log_sources (Wörterbuch, kein DISTINCT über logs), Level fest nach Severity
+    sources = (await db.execute(select(LogSource.name).order_by(LogSource.name))).scalars().all()
+    levels = list(LEVEL_NAMES.values())
     return {"hostnames": hostnames, "sources": sources, "levels": levels}
 
 @router.get("/recent", response_model=List[LogResponse])
@@ -100,15 +138,21 @@ async def get_recent_logs(limit: int = Query(10, ge=1, le=100), db: AsyncSession
 async def get_log_stats(db: AsyncSession = Depends(get_db), _=Depends(get_current_user)):
     today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
 
-    # Nur Logs ab heute zählen für Level/Source Statistiken (nutzt timestamp-Index)
-    today_count = (await db.execute(select(func.count(Log.id)).where(Log.timestamp >= today))).scalar() or 0
-    by_level = dict((await db.execute(select(Log.level, func.count(Log.id)).where(Log.timestamp >= today).group_by(Log.level))).all())
-    by_source = dict((await db.execute(select(Log.source, func.count(Log.id)).where(Log.timestamp >= today).group_by(Log.source).order_by(desc(func.count(Log.id))).limit(10))).all())
+    # Level/Source-Statistik für heute aus logs_rollup (Zeilen pro Minute statt pro Log)
+    count = func.sum(LogRollup.count).cast(BigInteger)
+    today_count = (await db.execute(select(count).where(LogRollup.minute >= today))).scalar() or 0
+    # Gruppiert wird über severity/source_id, die Namen kommen erst danach dazu
+    by_level = {LEVEL_NAMES.get(severity, "unknown"): n for severity, n in (await db.execute(
+        select(LogRollup.severity, count).where(LogRollup.minute >= today).group_by(LogRollup.severity))).all()}
+    top_sources = select(LogRollup.source_id, count.label("count")).where(LogRollup.minute >= today) \
+        .group_by(LogRollup.source_id).order_by(desc(count)).limit(10).subquery()
+    by_source = dict((await db.execute(
+        select(func.coalesce(LogSource.name, "unknown"), top_sources.c.count)
+        .select_from(top_sources).outerjoin(LogSource, LogSource.id == top_sources.c.source_id)
+        .order_by(desc(top_sources.c.count)))).all())
 
     # Gesamtzahl aus pg_class Statistik (sofort, kein Full-Scan über 8M+ Zeilen)
-    total = (await db.execute(text(
-        "SELECT GREATEST(reltuples::bigint, 0) FROM pg_class WHERE relname = 'logs'"
-    ))).scalar() or 0
+    total = (await db.execute(LOG_COUNT_ESTIMATE)).scalar() or 0
 
     # Unique Hosts aus agents-Tabelle (7 Zeilen statt 41k+ Logs scannen)
     unique = (await db.execute(select(func.count(Agent.id)))).scalar() or 0
@@ -5,15 +5,15 @@
 # Beschreibung: LogBot v2026.01.30.13.30.00 - Settings API Endpoints
 # ==============================================================================
 
-from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, delete, func
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..models import Setting, Log, User
 from ..config import settings as app_settings
-from ..schemas import SettingsResponse, SettingUpdate, RetentionResponse, DatabaseSettingsResponse
+from ..schemas import SettingsResponse, SettingUpdate, RetentionResponse, RetentionJobResponse, DatabaseSettingsResponse
 from ..auth import get_current_user, get_current_admin
+from ..retention import retention_cutoff, retention_job
 
 router = APIRouter(prefix="/api/settings", tags=["Settings"])
 
@@ -55,14 +55,18 @@ async def update_setting(key: str, data: SettingUpdate, db: AsyncSession = Depen
 
 @router.post("/retention/preview", response_model=RetentionResponse)
 async def preview_retention(days: int = Query(..., ge=1), db: AsyncSession = Depends(get_db), _=Depends(get_current_admin)):
-    cutoff = datetime.utcnow() - timedelta(days=days)
+    cutoff = retention_cutoff(days)
     count = (await db.execute(select(func.count(Log.id)).where(Log.timestamp < cutoff))).scalar() or 0
     oldest = (await db.execute(select(func.min(Log.timestamp)))).scalar()
     return RetentionResponse(logs_to_delete=count, oldest_log_date=oldest)
 
 @router.post("/retention/execute", response_model=RetentionResponse)
-async def execute_retention(days: int = Query(..., ge=1), db: AsyncSession = Depends(get_db), _=Depends(get_current_admin)):
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    result = await db.execute(delete(Log).where(Log.timestamp < cutoff))
-    await db.commit()
-    return RetentionResponse(deleted_count=result.rowcount, message=f"{result.rowcount} Logs gelöscht")
+async def execute_retention(days: int = Query(..., ge=1), _=Depends(get_current_admin)):
+    # Löschen läuft im Hintergrund (Chunks, gedrosselt) - Fortschritt über /retention/job
+    if not retention_job.start(retention_cutoff(days), "manual"):
+        raise HTTPException(status_code=409, detail="Retention läuft bereits")
+    return RetentionResponse(message="Retention gestartet")
+
+@router.get("/retention/job", response_model=RetentionJobResponse)
+async def get_retention_job(_=Depends(get_current_admin)):
+    return RetentionJobResponse(**retention_job.snapshot())
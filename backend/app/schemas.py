@@ -7,7 +7,7 @@
 
 from datetime import datetime
 from typing import Optional, List, Any, Dict
-from pydantic import BaseModel, Field
+from pydantic import AliasChoices, BaseModel, Field
 
 class Token(BaseModel):
     access_token: str
@@ -66,20 +66,30 @@ class LogResponse(BaseModel):
     level: Optional[str]
     source: Optional[str]
     message: Optional[str]
+    repeat_count: int = 1
     class Config:
         from_attributes = True
 
 class LogDetailResponse(LogResponse):
     agent_id: Optional[int]
     facility: Optional[int]
-    raw_message: Optional[str]
+    # Aus dem ORM-Objekt die rekonstruierte Fassung (Log.full_raw_message)
+    raw_message: Optional[str] = Field(validation_alias=AliasChoices("full_raw_message", "raw_message"))
     extra_data: Dict[str, Any] = {}
+    first_timestamp: Optional[datetime] = None
+    last_timestamp: Optional[datetime] = None
+    message_hash: Optional[int] = None
 
 class LogListResponse(BaseModel):
     items: List[LogResponse]
-    total: int
+    # None bei Abfrage per Cursor (Count nur für die erste Seite)
+    total: Optional[int] = None
+    # False: mehr als total Treffer (Count bei COUNT_LIMIT abgebrochen)
+    total_exact: bool = True
     page: int
     page_size: int
+    # Für die nächste Seite als cursor übergeben; None = letzte Seite
+    next_cursor: Optional[str] = None
 
 class LogStatsResponse(BaseModel):
     total_logs: int
@@ -160,6 +170,21 @@ class RetentionResponse(BaseModel):
     oldest_log_date: Optional[datetime] = None
     message: Optional[str] = None
 
+class RetentionJobResponse(BaseModel):
+    status: str
+    trigger: Optional[str] = None
+    cutoff: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    partition_rows: int = 0
+    deleted_count: int = 0
+    total: Optional[int] = None
+    progress: float = 0.0
+    chunks: int = 0
+    rows_per_second: float = 0.0
+    rows_per_second_limit: int = 0
+    error: Optional[str] = None
+
 # Database
 class DatabaseSettingsResponse(BaseModel):
     host: str
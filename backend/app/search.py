@@ -0,0 +1,180 @@
+# ==============================================================================
+# Name:        Philipp Fischer
+# Kontakt:     p.fischer@itconex.de
+# Version:     2026.10.18.12.00.00
+# Beschreibung: LogBot v2026.10.18.12.00.00 - Such-Syntax für Logs
+#               Übersetzt Suchanfragen in Bedingungen, die die Trigramm- und
+#               Volltext-Indizes auf logs nutzen (siehe db/init.sql)
+# ==============================================================================
+#
+# Syntax:
+#   timeout                 Teilstring in der Nachricht (ILIKE, pg_trgm-Index)
+#   "failed password"       Wörter/Phrase in der Nachricht (Volltext, tsvector-Index)
+#   host:fw01 source:sshd   Feld enthält Wert (host, source, ip, msg)
+#   host:"fw01"             Feld ist genau der Wert (Groß-/Kleinschreibung egal), * als Platzhalter
+#   level:error             Level (exakt, auch Kurzformen wie warn/err)
+#   a b / a AND b           beide
+#   a OR b                  eines von beiden
+#   -a / NOT a              ohne (auch -( ... ))
+#   ( ... )                 Gruppierung
+# Operatoren nur in Großbuchstaben; "*" ist überall Platzhalter für beliebig viele Zeichen.
+
+import re
+from sqlalchemy import and_, or_, not_, func, literal_column, select
+from .models import Log, Agent, LogSource, LEVEL_SEVERITY
+
+# Muss dem Ausdruck von idx_logs_message_fts entsprechen, sonst greift der Index nicht
+FTS_CONFIG = literal_column("'simple'")
+MESSAGE_TSVECTOR = func.to_tsvector(FTS_CONFIG, Log.message)
+
+FIELDS = {
+    'host': 'hostname',
+    'hostname': 'hostname',
+    'source': 'source',
+    'src': 'source',
+    'ip': 'ip_address',
+    'msg': 'message',
+    'message': 'message',
+    'level': 'level',
+}
+
+TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<close>\))
+      | (?P<neg>-)?(?:
+            (?P<open>\()
+          | (?:(?P<field>\w+):)?(?:"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<word>[^\s()"]+))
+        )
+    )''', re.VERBOSE)
+
+
+class SearchSyntaxError(ValueError):
+    pass
+
+
+def _pattern(value: str) -> str:
+    """ILIKE-Muster: %, _ und \\ wörtlich, * als Platzhalter."""
+    value = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return value.replace('*', '%')
+
+
+def field_matches(field: str, pattern: str):
+    """ILIKE auf message, hostname, ip_address oder source.
+
+    hostname/ip_address/source stehen nicht in logs: gesucht wird in den kleinen Tabellen
+    agents bzw. log_sources, logs wird dann über idx_logs_agent_id/idx_logs_source_id gefiltert.
+    Zeilen ohne Agent haben nur ihre Absender-IP (Log.sender_ip).
+    """
+    if field == 'message':
+        return Log.message.ilike(pattern)
+    if field == 'source':
+        return Log.source_id.in_(select(LogSource.id).where(LogSource.name.ilike(pattern)))
+    if field == 'hostname':
+        return Log.agent_id.in_(select(Agent.id).where(Agent.hostname.ilike(pattern)))
+    return or_(Log.agent_id.in_(select(Agent.id).where(Agent.ip_address.ilike(pattern))),
+               Log.sender_ip.ilike(pattern))
+
+
+def level_in(levels):
+    """Level-Namen (Groß-/Kleinschreibung egal) als Bedingung auf severity; unbekannte treffen nichts."""
+    return Log.severity.in_([LEVEL_SEVERITY[level.lower()] for level in levels if level.lower() in LEVEL_SEVERITY])
+
+
+def _term(field, quoted, word):
+    if field and field.lower() not in FIELDS:
+        # Unbekanntes Feld (z.B. "port:22"): normaler Suchbegriff
+        word = f"{field}:{word}" if word is not None else f'{field}:"{quoted}"'
+        field, quoted = None, None
+    if quoted is not None:
+        quoted = re.sub(r'\\(.)', r'\1', quoted)
+    if not field:
+        if quoted is not None:
+            return MESSAGE_TSVECTOR.op('@@')(func.phraseto_tsquery(FTS_CONFIG, quoted))
+        return Log.message.ilike(f"%{_pattern(word)}%")
+    field = FIELDS[field.lower()]
+    value = quoted if quoted is not None else word
+    if field == 'level':
+        if value.lower() not in LEVEL_SEVERITY:
+            raise SearchSyntaxError(f"Unbekanntes Level: {value}")
+        return Log.severity == LEVEL_SEVERITY[value.lower()]
+    if quoted is not None:
+        return field_matches(field, _pattern(value))
+    if field == 'ip_address':
+        # IP-Präfix: ip:192.168.1.
+        return field_matches(field, f"{_pattern(value)}%")
+    return field_matches(field, f"%{_pattern(value)}%")
+
+
+class _Parser:
+    def __init__(self, query: str):
+        self.tokens = []
+        pos = 0
+        query = query.rstrip()
+        while pos < len(query):
+            match = TOKEN.match(query, pos)
+            if not match or match.end() == pos:
+                raise SearchSyntaxError(f"Ungültige Suche bei Zeichen {pos + 1}: {query[pos:pos + 20]}")
+            self.tokens.append(match)
+            pos = match.end()
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def keyword(self, name: str) -> bool:
+        token = self.peek()
+        if token is not None and token['word'] == name and not token['field'] and not token['neg']:
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self):
+        expr = self.parse_or()
+        if self.peek() is not None:
+            raise SearchSyntaxError("Ungültige Suche: ')' ohne '('")
+        return expr
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.keyword('OR'):
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else or_(*parts)
+
+    def parse_and(self):
+        parts = [self.parse_unary()]
+        while True:
+            token = self.peek()
+            if token is None or token['close'] or (token['word'] == 'OR' and not token['field'] and not token['neg']):
+                break
+            self.keyword('AND')
+            parts.append(self.parse_unary())
+        return parts[0] if len(parts) == 1 else and_(*parts)
+
+    def parse_unary(self):
+        if self.keyword('NOT'):
+            return not_(self.parse_unary())
+        token = self.peek()
+        if token is None:
+            raise SearchSyntaxError("Ungültige Suche: Begriff fehlt")
+        self.pos += 1
+        if token['open']:
+            expr = self.parse_or()
+            closing = self.peek()
+            if closing is None or not closing['close']:
+                raise SearchSyntaxError("Ungültige Suche: ')' fehlt")
+            self.pos += 1
+            return not_(expr) if token['neg'] else expr
+        if token['close']:
+            raise SearchSyntaxError("Ungültige Suche: ')' ohne '('")
+        expr = _term(token['field'], token['quoted'], token['word'])
+        return not_(expr) if token['neg'] else expr
+
+
+def compile_search(query: str):
+    """Suchanfrage in eine SQLAlchemy-Bedingung übersetzen (None bei leerer Anfrage).
+
+    Wirft SearchSyntaxError bei ungültiger Syntax.
+    """
+    if not query or not query.strip():
+        return None
+    return _Parser(query).parse()
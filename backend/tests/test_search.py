@@ -0,0 +1,40 @@
+# ==============================================================================
+# Name:        Philipp Fischer
+# Kontakt:     p.fischer@itconex.de
+# Version:     2026.10.18.12.00.00
+# Beschreibung: LogBot v2026.10.18.12.00.00 - Tests der Such-Syntax (app/search.py)
+# ==============================================================================
+#
+# Ausführen im Verzeichnis backend: python -m pytest tests
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from app.search import compile_search, SearchSyntaxError
+
+
+def sql(query: str) -> str:
+    return str(compile_search(query).compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_negated_group():
+    assert sql("-(a OR b)") == "NOT (logs.message ILIKE '%%a%%' OR logs.message ILIKE '%%b%%')"
+
+
+def test_negated_group_equals_not():
+    assert sql("-(a OR b)") == sql("NOT (a OR b)")
+
+
+def test_minus_as_word():
+    # Einzelnes "-" und "-" im Wort bleiben Suchbegriffe
+    assert sql("a-b") == "logs.message ILIKE '%%a-b%%'"
+    assert "'%%-%%'" in sql("x - y")
+
+
+def test_unbalanced_group():
+    with pytest.raises(SearchSyntaxError):
+        compile_search("-(a OR b")
+
+
+def test_ip_matches_rows_without_agent():
+    # Zeilen ohne Agent tragen die Absender-IP selbst
+    assert sql("ip:10.0.").endswith("OR logs.ip_address ILIKE '10.0.%%'")
@@ -33,27 +33,227 @@ CREATE TABLE IF NOT EXISTS agents (
 CREATE UNIQUE INDEX IF NOT EXISTS idx_agents_hostname_ip ON agents(hostname, ip_address);
 CREATE INDEX IF NOT EXISTS idx_agents_mac ON agents(mac_address);
 
--- Logs-Tabelle
-CREATE TABLE IF NOT EXISTS logs (
+-- Logs-Tabelle, nach Tag partitioniert (timestamp = Empfangszeit UTC, logs_pYYYYMMDD)
+-- Retention löscht ganze Partitionen (logs_drop_partitions), Abfragen mit Zeitfilter
+-- lesen nur die betroffenen Tage. Neue Partitionen legt der Syslog-Server vorab an
+-- (logs_ensure_partitions), Zeilen außerhalb landen in logs_default.
+
+-- Bestehende Installation: alte Tabelle wird Partition logs_legacy (siehe unten)
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('logs')) = 'r' THEN
+        ALTER TABLE logs RENAME TO logs_legacy;
+        ALTER TABLE logs_legacy RENAME CONSTRAINT logs_pkey TO logs_legacy_pkey;
+        ALTER TABLE logs_legacy RENAME CONSTRAINT logs_agent_id_fkey TO logs_legacy_agent_id_fkey;
+        ALTER SEQUENCE IF EXISTS logs_id_seq RENAME TO logs_legacy_id_seq;
+        ALTER INDEX IF EXISTS idx_logs_agent_id RENAME TO logs_legacy_agent_id_idx;
+        ALTER INDEX IF EXISTS idx_logs_timestamp RENAME TO logs_legacy_timestamp_idx;
+        ALTER INDEX IF EXISTS idx_logs_hostname RENAME TO logs_legacy_hostname_idx;
+        ALTER INDEX IF EXISTS idx_logs_level RENAME TO logs_legacy_level_idx;
+        ALTER INDEX IF EXISTS idx_logs_source RENAME TO logs_legacy_source_idx;
+    END IF;
+END $$;
+
+-- Quellen (Programm/Tag) als Wörterbuch: logs speichert nur source_id. Einträge werden
+-- nie gelöscht (daher kein Fremdschlüssel - spart den RI-Trigger pro Zeile beim COPY).
+CREATE TABLE IF NOT EXISTS log_sources (
     id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE
+);
+
+-- Kompaktes Zeilenformat (einmalige Umstellung älterer Tabellen, schreibt jede Zeile neu):
+-- hostname/ip_address kommen aus agents (agent_id), level wird severity (0 = emergency ..
+-- 7 = debug), source wird source_id. Absender ohne Agent werden als Agent nachgetragen;
+-- ip_address bleibt nur in Zeilen ohne Agent (kein Hostname) gefüllt.
+CREATE OR REPLACE FUNCTION logs_compact(tbl TEXT) RETURNS VOID AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_attribute WHERE attrelid = to_regclass(tbl) AND attname = 'level' AND NOT attisdropped) THEN
+        RETURN;
+    END IF;
+    EXECUTE format('INSERT INTO log_sources (name) SELECT DISTINCT left(source, 100) FROM %I '
+                   'WHERE source IS NOT NULL ON CONFLICT (name) DO NOTHING', tbl);
+    -- NOT EXISTS statt nur ON CONFLICT: der Unique-Index greift bei ip_address NULL nicht
+    EXECUTE format('INSERT INTO agents (hostname, ip_address) SELECT DISTINCT left(l.hostname, 255), l.ip_address FROM %I l '
+                   'WHERE l.agent_id IS NULL AND l.hostname IS NOT NULL AND NOT EXISTS (SELECT 1 FROM agents a '
+                   'WHERE a.hostname = left(l.hostname, 255) AND a.ip_address IS NOT DISTINCT FROM l.ip_address) '
+                   'ON CONFLICT DO NOTHING', tbl);
+    EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS severity SMALLINT, ADD COLUMN IF NOT EXISTS source_id INTEGER', tbl);
+    -- Alte Spalten auf NULL, damit die neu geschriebenen Zeilen schon kompakt sind
+    EXECUTE format($sql$
+        UPDATE %I l SET
+            severity = CASE lower(l.level)
+                WHEN 'emergency' THEN 0 WHEN 'emerg' THEN 0 WHEN 'alert' THEN 1
+                WHEN 'critical' THEN 2 WHEN 'crit' THEN 2 WHEN 'error' THEN 3 WHEN 'err' THEN 3
+                WHEN 'warning' THEN 4 WHEN 'warn' THEN 4 WHEN 'notice' THEN 5
+                WHEN 'info' THEN 6 WHEN 'information' THEN 6 WHEN 'informational' THEN 6
+                WHEN 'debug' THEN 7 END,
+            source_id = (SELECT s.id FROM log_sources s WHERE s.name = left(l.source, 100)),
+            agent_id = COALESCE(l.agent_id, (SELECT min(a.id) FROM agents a WHERE a.hostname = left(l.hostname, 255)
+                                             AND a.ip_address IS NOT DISTINCT FROM l.ip_address)),
+            ip_address = CASE WHEN l.agent_id IS NULL AND l.hostname IS NULL THEN l.ip_address END,
+            hostname = NULL, level = NULL, source = NULL
+    $sql$, tbl);
+    EXECUTE format('ALTER TABLE %I DROP COLUMN hostname, DROP COLUMN level, DROP COLUMN source', tbl);
+END $$ LANGUAGE plpgsql;
+
+CREATE TABLE IF NOT EXISTS logs (
+    id SERIAL,
     agent_id INTEGER REFERENCES agents(id) ON DELETE SET NULL,
-    hostname VARCHAR(255),
+    -- Absender-IP nur für Zeilen ohne Agent (Auflösung fehlgeschlagen), sonst NULL
     ip_address VARCHAR(45),
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     facility INTEGER,
-    level VARCHAR(20),
-    source VARCHAR(100),
+    severity SMALLINT,
+    source_id INTEGER,
     message TEXT,
     raw_message TEXT,
+    raw_prefix TEXT,
     extra_data JSONB DEFAULT '{}',
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    repeat_count INTEGER NOT NULL DEFAULT 1,
+    first_timestamp TIMESTAMP,
+    last_timestamp TIMESTAMP,
+    message_hash BIGINT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
 
 CREATE INDEX IF NOT EXISTS idx_logs_agent_id ON logs(agent_id);
-CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp DESC);
-CREATE INDEX IF NOT EXISTS idx_logs_hostname ON logs(hostname);
-CREATE INDEX IF NOT EXISTS idx_logs_level ON logs(level);
-CREATE INDEX IF NOT EXISTS idx_logs_source ON logs(source);
+-- Sortierung der Log-Liste inkl. Cursor-Paging (ROW(timestamp, id) < ...), ersetzt den
+-- früheren Index nur auf timestamp
+CREATE INDEX IF NOT EXISTS idx_logs_timestamp_id ON logs(timestamp DESC, id DESC);
+DROP INDEX IF EXISTS idx_logs_timestamp;
+DROP INDEX IF EXISTS logs_legacy_timestamp_idx;
+CREATE INDEX IF NOT EXISTS idx_logs_severity ON logs(severity);
+CREATE INDEX IF NOT EXISTS idx_logs_source_id ON logs(source_id);
+
+-- Suche (backend/app/search.py): Volltext für Wörter/Phrasen, pg_trgm für Teilstrings
+-- (ILIKE '%...%' auf message). Ohne pg_trgm funktioniert die Suche weiterhin,
+-- Teilstring-Suchen lesen dann aber alle Zeilen im Zeitraum.
+CREATE INDEX IF NOT EXISTS idx_logs_message_fts ON logs USING gin (to_tsvector('simple', message));
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    CREATE INDEX IF NOT EXISTS idx_logs_message_trgm ON logs USING gin (message gin_trgm_ops);
+EXCEPTION WHEN undefined_file OR feature_not_supported OR insufficient_privilege THEN
+    RAISE NOTICE 'pg_trgm nicht verfügbar (%), Teilstring-Suche ohne Index', SQLERRM;
+END $$;
+
+CREATE TABLE IF NOT EXISTS logs_default PARTITION OF logs DEFAULT;
+
+-- Partitionen für heute bis heute + days_ahead anlegen; Zeilen dieser Tage, die schon in
+-- logs_default liegen, werden in die neue Partition verschoben. Gibt die Anzahl neuer Partitionen zurück.
+CREATE OR REPLACE FUNCTION logs_ensure_partitions(days_ahead INTEGER DEFAULT 7) RETURNS INTEGER AS $$
+DECLARE
+    today DATE := (now() AT TIME ZONE 'UTC')::date;
+    day DATE;
+    part TEXT;
+    created INTEGER := 0;
+BEGIN
+    -- Mehrere Syslog-Worker rufen parallel auf
+    PERFORM pg_advisory_xact_lock(hashtext('logs_partitions'));
+    FOR day IN SELECT generate_series(today, today + days_ahead, INTERVAL '1 day')::date LOOP
+        part := 'logs_p' || to_char(day, 'YYYYMMDD');
+        CONTINUE WHEN to_regclass(part) IS NOT NULL;
+        EXECUTE format('CREATE TABLE %I (LIKE logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', part);
+        EXECUTE format('WITH moved AS (DELETE FROM logs_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                       'INSERT INTO %I SELECT * FROM moved', day, day + 1, part);
+        EXECUTE format('ALTER TABLE logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', part, day, day + 1);
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END $$ LANGUAGE plpgsql;
+
+-- Alle Tages-Partitionen vor cutoff löschen (und logs_legacy, sobald sie komplett älter ist).
+-- Gibt die geschätzte Anzahl gelöschter Zeilen zurück (pg_class.reltuples, kein count;
+-- nie oder nur leer analysierte Partitionen mit n_live_tup).
+CREATE OR REPLACE FUNCTION logs_drop_partitions(cutoff TIMESTAMP) RETURNS BIGINT AS $$
+DECLARE
+    part RECORD;
+    dropped BIGINT := 0;
+    expired BOOLEAN;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('logs_partitions'));
+    FOR part IN
+        SELECT c.relname,
+               GREATEST(c.reltuples, COALESCE(s.n_live_tup, 0))::bigint AS estimate
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE i.inhparent = 'logs'::regclass AND c.relname ~ '^logs_p[0-9]{8}$'
+          AND to_date(substr(c.relname, 7), 'YYYYMMDD') + 1 <= cutoff
+    LOOP
+        EXECUTE format('DROP TABLE %I', part.relname);
+        dropped := dropped + part.estimate;
+    END LOOP;
+    IF to_regclass('logs_legacy') IS NOT NULL THEN
+        -- Dynamisch, da die Tabelle nach dem Löschen fehlt
+        EXECUTE 'SELECT NOT EXISTS (SELECT 1 FROM logs_legacy WHERE timestamp >= $1)' INTO expired USING cutoff;
+        IF expired THEN
+            dropped := dropped + (SELECT GREATEST(c.reltuples, COALESCE(s.n_live_tup, 0))::bigint
+                FROM pg_class c LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid WHERE c.oid = to_regclass('logs_legacy'));
+            DROP TABLE logs_legacy;
+        END IF;
+    END IF;
+    RETURN dropped;
+END $$ LANGUAGE plpgsql;
+
+-- Umstellung bestehender Installationen (einmalig, dauert bei großen Tabellen etwas):
+-- Zeilen ab heute wandern in die Tages-Partitionen, der Rest wird Partition logs_legacy
+-- bis heute 00:00 UTC und verschwindet per Retention als Ganzes.
+DO $$
+DECLARE
+    today DATE := (now() AT TIME ZONE 'UTC')::date;
+BEGIN
+    IF to_regclass('logs_legacy') IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass('logs_legacy')) THEN
+        PERFORM logs_compact('logs_legacy');
+        -- Primärschlüssel der Partition muss (id, timestamp) sein, ATTACH legt ihn an
+        ALTER TABLE logs_legacy DROP CONSTRAINT IF EXISTS logs_legacy_pkey;
+        UPDATE logs_legacy SET timestamp = COALESCE(created_at, now() AT TIME ZONE 'UTC') WHERE timestamp IS NULL;
+        ALTER TABLE logs_legacy ALTER COLUMN timestamp SET NOT NULL;
+        PERFORM setval('logs_id_seq', COALESCE((SELECT max(id) FROM logs_legacy), 0) + 1, false);
+        PERFORM logs_ensure_partitions(7);
+        -- Spalten der alten Tabelle; raw_prefix, repeat_count usw. bekommen ihre Defaults
+        INSERT INTO logs (id, agent_id, ip_address, timestamp, facility, severity, source_id, message, raw_message,
+                          extra_data, created_at)
+            SELECT id, agent_id, ip_address, timestamp, facility, severity, source_id, message, raw_message,
+                   extra_data, created_at
+            FROM logs_legacy WHERE timestamp >= today;
+        DELETE FROM logs_legacy WHERE timestamp >= today;
+        -- ATTACH verlangt dieselben Spalten wie logs
+        ALTER TABLE logs_legacy
+            ADD COLUMN raw_prefix TEXT,
+            ADD COLUMN repeat_count INTEGER NOT NULL DEFAULT 1,
+            ADD COLUMN first_timestamp TIMESTAMP,
+            ADD COLUMN last_timestamp TIMESTAMP,
+            ADD COLUMN message_hash BIGINT;
+        -- Bereichs-Check vorab, damit ATTACH nicht erneut die ganze Tabelle prüft
+        EXECUTE format('ALTER TABLE logs_legacy ADD CONSTRAINT logs_legacy_range CHECK (timestamp < %L)', today);
+        EXECUTE format('ALTER TABLE logs ATTACH PARTITION logs_legacy FOR VALUES FROM (MINVALUE) TO (%L)', today);
+        ALTER TABLE logs_legacy DROP CONSTRAINT logs_legacy_range;
+    END IF;
+END $$;
+
+SELECT logs_ensure_partitions(7);
+
+-- Zeilen pro Minute, Agent, Severity und Source: Grundlage für Dashboard/Statistiken statt
+-- count(*) über logs. Der Syslog-Server schreibt seine Zähler gebündelt per Upsert, das
+-- Backend beim HTTPS-Ingest; die Retention löscht mit. Beim Anlegen einmal aus logs befüllt.
+DO $$
+BEGIN
+    IF to_regclass('logs_rollup') IS NULL THEN
+        CREATE TABLE logs_rollup (
+            minute TIMESTAMP NOT NULL,
+            agent_id INTEGER,
+            severity SMALLINT,
+            source_id INTEGER,
+            count BIGINT NOT NULL
+        );
+        CREATE UNIQUE INDEX idx_logs_rollup_key ON logs_rollup (minute, agent_id, severity, source_id) NULLS NOT DISTINCT;
+        INSERT INTO logs_rollup (minute, agent_id, severity, source_id, count)
+            SELECT date_trunc('minute', timestamp), agent_id, severity, source_id, count(*)
+            FROM logs GROUP BY 1, 2, 3, 4;
+    END IF;
+END $$;
 
 -- Webhooks-Tabelle
 CREATE TABLE IF NOT EXISTS webhooks (
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# ==============================================================================
+# Name:        Philipp Fischer
+# Kontakt:     p.fischer@itconex.de
+# Version:     2026.10.18.12.00.00
+# Beschreibung: LogBot v2026.10.18.12.00.00 - Event-Loop Benchmark
+#               Vergleicht asyncio und uvloop: UDP-Empfangsrate des Syslog-Servers
+#               (Empfang + Ingest-Queue, optional Parsen) und Latenz der Backend-API
+# ==============================================================================
+#
+# Beispiele:
+#   python bench_loop.py                                    # UDP, asyncio vs. uvloop
+#   python bench_loop.py --engine batch --parse --senders 2
+#   python bench_loop.py --api-dir ../backend               # zusätzlich API (startet uvicorn je Loop)
+#   python bench_loop.py --skip-udp --api-url http://127.0.0.1:8000/api/health
+#
+# Der UDP-Teil läuft ohne DB: Empfänger und Sender sind lokale Prozesse, gezählt wird
+# received/dropped des Servers. Für die API startet das Skript das Backend je Loop mit
+# uvicorn --loop (dieselben DB_* Variablen wie im Betrieb) und misst GET --api-path.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import syslog_server as server
+from bench_parser import DEFAULT_MIX, build_corpus, parse_mix
+
+LOOPS = ('asyncio', 'uvloop')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+# ==============================================================================
+# UDP
+# ==============================================================================
+
+def udp_receiver(loop_mode: str, args, ready, stop, results):
+    """Empfangsprozess wie serve(): Socket + Engine + Ingest-Queue, Consumer ohne DB."""
+    server.stats = server.IngestStats()
+
+    async def consume(ingest_queue: server.IngestQueue, parser: Optional[server.SyslogParser]):
+        while True:
+            batch = await ingest_queue.get_batch(server.QUEUE_BATCH)
+            if parser is not None:
+                for data, ip in batch:
+                    parser.parse(data.decode('utf-8', errors='replace'), ip)
+            server.stats.incr('processed', len(batch))
+            await asyncio.sleep(0)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        ingest_queue = server.IngestQueue()
+        sock = server.create_udp_socket(args.port, False, args.rcvbuf)
+        if args.engine == 'batch':
+            receiver = server.BatchUDPReceiver(sock, ingest_queue)
+            receiver.start(loop)
+            close = receiver.close
+        else:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: server.SyslogUDPProtocol(ingest_queue), sock=sock)
+            close = transport.close
+        parser = server.SyslogParser() if args.parse else None
+        consumers = [asyncio.create_task(consume(ingest_queue, parser)) for _ in range(server.QUEUE_CONSUMERS)]
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        # Rest der Queue noch abarbeiten lassen
+        while len(ingest_queue):
+            await asyncio.sleep(0.01)
+        close()
+        for task in consumers:
+            task.cancel()
+        results.put({'loop': server.loop_name(loop), **server.stats.snapshot()})
+
+    server.run_loop(main(), loop_mode)
+
+
+def udp_sender(index: int, args, messages: List[bytes], results):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    addr = ('127.0.0.1', args.port)
+    sendto = sock.sendto
+    count = len(messages)
+    sent = index
+    end = time.perf_counter() + args.duration
+    while time.perf_counter() < end:
+        for _ in range(256):
+            sendto(messages[sent % count], addr)
+            sent += 1
+        if args.rate:
+            # Gleichmäßig auf die Sender verteilt, in Schüben zu 256
+            time.sleep(256 * args.senders / args.rate)
+    sock.close()
+    results.put(sent - index)
+
+
+def bench_udp(loop_mode: str, args, messages: List[bytes]) -> Dict[str, float]:
+    ctx = multiprocessing.get_context('fork')
+    ready, stop, results = ctx.Event(), ctx.Event(), ctx.Queue()
+    receiver = ctx.Process(target=udp_receiver, args=(loop_mode, args, ready, stop, results))
+    receiver.start()
+    if not ready.wait(10):
+        receiver.terminate()
+        raise RuntimeError(f"UDP-Empfänger ({loop_mode}) startet nicht")
+    sent_q = ctx.Queue()
+    start = time.perf_counter()
+    senders = [ctx.Process(target=udp_sender, args=(i, args, messages, sent_q)) for i in range(args.senders)]
+    for proc in senders:
+        proc.start()
+    sent = sum(sent_q.get() for _ in senders)
+    for proc in senders:
+        proc.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    snap = results.get()
+    receiver.join()
+    received = snap.get('received', 0)
+    return {
+        'loop': snap['loop'],
+        'sent': sent,
+        'received': received,
+        'received_per_s': received / elapsed,
+        # Kernel-Verluste (Socket-Puffer voll) und Verluste der Ingest-Queue
+        'lost_socket': max(0, sent - received) / sent if sent else 0.0,
+        'dropped_queue': snap.get('dropped', 0),
+    }
+
+
+# ==============================================================================
+# API
+# ==============================================================================
+
+async def http_get_latencies(host: str, port: int, path: str, requests: int, concurrency: int) -> List[float]:
+    """GET path über concurrency Keep-Alive-Verbindungen; Latenz pro Request in Sekunden."""
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    latencies: List[float] = []
+    remaining = requests
+
+    async def client():
+        nonlocal remaining
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                writer.write(request)
+                head = await reader.readuntil(b'\r\n\r\n')
+                if not head.startswith(b'HTTP/1.1 200'):
+                    raise RuntimeError(f"{path}: {head.splitlines()[0].decode()}")
+                length = 0
+                for line in head.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def wait_for_port(host: str, port: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def bench_api(loop_mode: Optional[str], args) -> Dict[str, float]:
+    """Backend mit uvicorn --loop starten (loop_mode None: laufende Instanz unter --api-url)."""
+    proc = None
+    if loop_mode is None:
+        url = urlsplit(args.api_url)
+        host, port, path = url.hostname, url.port or 80, url.path or '/'
+    else:
+        host, port, path = '127.0.0.1', args.api_port, args.api_path
+        proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', args.api_app, '--host', host, '--port', str(port),
+                                 '--loop', loop_mode, '--no-access-log', '--log-level', 'warning'],
+                                cwd=args.api_dir)
+    try:
+        if not wait_for_port(host, port, 30):
+            raise RuntimeError(f"API auf {host}:{port} nicht erreichbar")
+        # Aufwärmen (Imports, Verbindungsaufbau), dann messen
+        asyncio.run(http_get_latencies(host, port, path, 200, args.concurrency))
+        start = time.perf_counter()
+        latencies = asyncio.run(http_get_latencies(host, port, path, args.requests, args.concurrency))
+        elapsed = time.perf_counter() - start
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(10)
+    return {
+        'loop': loop_mode or 'laufend',
+        'requests_per_s': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies, default=0.0) * 1000,
+    }
+
+
+def print_report(udp: List[Dict[str, float]], api: List[Dict[str, float]]):
+    if udp:
+        header = f"{'UDP-Loop':<10} {'gesendet':>10} {'empfangen':>10} {'empfangen/s':>12} {'Socket-Verlust':>15} {'Queue-Drops':>12}"
+        print(header)
+        print('-' * len(header))
+        for r in udp:
+            print(f"{r['loop']:<10} {r['sent']:>10,} {r['received']:>10,} {r['received_per_s']:>12,.0f} "
+                  f"{r['lost_socket']:>14.2%} {r['dropped_queue']:>12,}")
+    if api:
+        if udp:
+            print()
+        header = f"{'API-Loop':<10} {'Requests/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        print(header)
+        print('-' * len(header))
+        for r in api:
+            print(f"{r['loop']:<10} {r['requests_per_s']:>11,.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                  f"{r['max_ms']:>8.2f}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='LogBot Event-Loop Benchmark (asyncio vs. uvloop)')
+    ap.add_argument('--loops', default=','.join(LOOPS), help='Zu vergleichende Loops')
+    ap.add_argument('--skip-udp', action='store_true')
+    ap.add_argument('--port', type=int, default=15514, help='UDP-Port des Test-Empfängers')
+    ap.add_argument('--engine', choices=('protocol', 'batch'), default=server.UDP_ENGINE)
+    ap.add_argument('--rcvbuf', type=int, default=server.UDP_RCVBUF, help='SO_RCVBUF des Test-Empfängers')
+    ap.add_argument('--parse', action='store_true', help='Im Empfänger auch parsen (ohne DB)')
+    ap.add_argument('--senders', type=int, default=1)
+    ap.add_argument('--rate', type=float, default=0, help='Nachrichten/s gesamt (0 = so schnell wie möglich)')
+    ap.add_argument('--duration', type=float, default=5, help='Sekunden pro Loop')
+    ap.add_argument('--mix', default=DEFAULT_MIX)
+    ap.add_argument('--api-dir', help='Backend-Verzeichnis: API je Loop mit uvicorn starten und messen')
+    ap.add_argument('--api-app', default='app.main:app')
+    ap.add_argument('--api-port', type=int, default=18000)
+    ap.add_argument('--api-path', default='/api/health')
+    ap.add_argument('--api-url', help='Laufende API messen statt sie zu starten')
+    ap.add_argument('--requests', type=int, default=5000)
+    ap.add_argument('--concurrency', type=int, default=16)
+    ap.add_argument('--json', action='store_true', help='Ergebnis als JSON ausgeben')
+    args = ap.parse_args(argv)
+
+    loops = [name.strip() for name in args.loops.split(',') if name.strip()]
+    if 'uvloop' in loops and server.uvloop is None:
+        print("uvloop nicht installiert - nur asyncio", file=sys.stderr)
+        loops.remove('uvloop')
+
+    udp = []
+    if not args.skip_udp:
+        corpus = build_corpus(parse_mix(args.mix), 5000, 514)
+        messages = [item.encode() for items in corpus.values() for item in items]
+        for mode in loops:
+            udp.append(bench_udp(mode, args, messages))
+    api = []
+    if args.api_url:
+        api.append(bench_api(None, args))
+    elif args.api_dir:
+        for mode in loops:
+            api.append(bench_api(mode, args))
+
+    if args.json:
+        print(json.dumps({'udp': udp, 'api': api}, indent=2))
+    else:
+        print_report(udp, api)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
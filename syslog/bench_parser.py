@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# ==============================================================================
+# Name:        Philipp Fischer
+# Kontakt:     p.fischer@itconex.de
+# Version:     2026.10.18.12.00.00
+# Beschreibung: LogBot v2026.10.18.12.00.00 - Parser Micro-Benchmark
+#               Misst SyslogParser.parse, format_mac und parse_priority auf einem
+#               synthetischen Hersteller-Korpus und vergleicht mit einer Baseline
+# ==============================================================================
+#
+# Beispiele:
+#   python bench_parser.py                                   # Standard-Mix
+#   python bench_parser.py --mix bsd=70,netconsole=30        # eigener Mix
+#   python bench_parser.py --save-baseline baseline.json     # Baseline speichern
+#   python bench_parser.py --baseline baseline.json --max-regression 10
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from syslog_server import SyslogParser
+
+# Standard-Mix (Anteile, werden normiert) - entspricht grob einer UniFi-lastigen Site
+DEFAULT_MIX = 'netconsole=25,mac_model=25,bsd=30,rfc5424=10,pri=5,malformed=5'
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+PROGRAMS = ('sshd', 'CRON', 'kernel', 'systemd', 'dnsmasq-dhcp', 'postfix/smtpd', 'sudo')
+UNIFI_PROGRAMS = ('hostapd', 'mclagsyncd', 'stahtd', 'mcad', 'kernel', 'syswrapper')
+UNIFI_MODELS = ('U6-LR-6.7.31+15618', 'U6-Pro-6.6.77+15402', 'USW-24-PoE-7.1.26', 'UAP-AC-Pro-6.5.62')
+WORDS = ('auth', 'failed', 'from', 'port', 'user', 'session', 'opened', 'closed', 'wlan0',
+         'STA', 'associated', 'deauthenticated', 'DHCPACK', 'link', 'up', 'down', 'timeout')
+
+
+def _words(rnd: random.Random, lo: int = 4, hi: int = 14) -> str:
+    return ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(lo, hi)))
+
+
+def _pri(rnd: random.Random) -> int:
+    return rnd.choice((1, 3, 4, 16, 23)) * 8 + rnd.choice((3, 4, 5, 6, 6, 6, 7))
+
+
+def _mac(rnd: random.Random) -> str:
+    return ''.join(rnd.choice('0123456789abcdef') for _ in range(12))
+
+
+def _ts(rnd: random.Random) -> str:
+    return f"{rnd.choice(MONTHS)} {rnd.randint(1, 28):2d} {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}"
+
+
+def gen_netconsole(rnd: random.Random) -> str:
+    return (f"<{_pri(rnd)}>{{{rnd.getrandbits(16):x}}} [{rnd.uniform(1, 99999):.6f}] "
+            f"{rnd.choice(UNIFI_PROGRAMS)}[{rnd.randint(100, 9999)}]: {_words(rnd)}")
+
+
+def gen_mac_model(rnd: random.Random) -> str:
+    return f"<{_pri(rnd)}>{_mac(rnd)},{rnd.choice(UNIFI_MODELS)}: {rnd.choice(UNIFI_PROGRAMS)}: {_words(rnd)}"
+
+
+def gen_bsd(rnd: random.Random) -> str:
+    pid = f"[{rnd.randint(100, 99999)}]" if rnd.random() < 0.7 else ''
+    return f"<{_pri(rnd)}>{_ts(rnd)} host{rnd.randint(1, 200)} {rnd.choice(PROGRAMS)}{pid}: {_words(rnd)}"
+
+
+def gen_rfc5424(rnd: random.Random) -> str:
+    sd = '-' if rnd.random() < 0.5 else f'[origin@32473 ip="10.0.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}" seq="{rnd.randint(1, 10**6)}"]'
+    return (f"<{_pri(rnd)}>1 2026-02-16T12:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}.{rnd.randint(0, 999):03d}Z "
+            f"host{rnd.randint(1, 200)} {rnd.choice(PROGRAMS)} {rnd.randint(100, 9999)} ID{rnd.randint(1, 99)} {sd} {_words(rnd)}")
+
+
+def gen_pri(rnd: random.Random) -> str:
+    return f"<{_pri(rnd)}>{_words(rnd)}"
+
+
+def _ip(rnd: random.Random) -> str:
+    return f"10.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}"
+
+
+def gen_fortinet(rnd: random.Random) -> str:
+    return (f'<{_pri(rnd)}>date=2026-02-16 time=12:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d} '
+            f'devname="FGT60F-{rnd.randint(1, 9)}" devid="FGT60FTK21{rnd.randint(10000, 99999)}" '
+            f'logid="00000000{rnd.randint(10, 20)}" type="traffic" subtype="forward" level="notice" vd="root" '
+            f'srcip={_ip(rnd)} srcport={rnd.randint(1024, 65535)} srcintf="internal" dstip={_ip(rnd)} '
+            f'dstport={rnd.choice((53, 80, 443))} dstintf="wan1" proto=6 action="{rnd.choice(("accept", "close", "deny"))}" '
+            f'policyid={rnd.randint(1, 50)} service="HTTPS" sentbyte={rnd.randint(0, 10**6)} rcvdbyte={rnd.randint(0, 10**6)}')
+
+
+def gen_mikrotik(rnd: random.Random) -> str:
+    topics = rnd.choice(('system,info,account', 'firewall,info', 'dhcp,info', 'wireless,info', 'system,error,critical'))
+    return f"<{_pri(rnd)}>{topics} {_words(rnd)}"
+
+
+def gen_pfsense(rnd: random.Random) -> str:
+    return (f"<{_pri(rnd)}>{_ts(rnd)} filterlog[{rnd.randint(100, 99999)}]: {rnd.randint(1, 200)},,,"
+            f"100000{rnd.randint(1000, 9999)},igb{rnd.randint(0, 3)},match,{rnd.choice(('block', 'pass'))},in,4,0x0,,64,0,0,DF,6,tcp,60,"
+            f"{_ip(rnd)},{_ip(rnd)},{rnd.randint(1024, 65535)},{rnd.choice((22, 80, 443))},0,S,{rnd.getrandbits(32)},,64240,,mss")
+
+
+def gen_windows(rnd: random.Random) -> str:
+    return (f'<{_pri(rnd)}>{_ts(rnd)} WIN{rnd.randint(1, 50)} Microsoft-Windows-Security-Auditing[4]: '
+            f'{{"EventTime":"2026-02-16 12:00:00","Hostname":"WIN{rnd.randint(1, 50)}.corp","EventType":"AUDIT_SUCCESS",'
+            f'"EventID":{rnd.choice((4624, 4625, 4634, 4672))},"SourceName":"Microsoft-Windows-Security-Auditing",'
+            f'"Channel":"Security","RecordNumber":{rnd.randint(1, 10**7)},"Message":"{_words(rnd)}"}}')
+
+
+def gen_malformed(rnd: random.Random) -> str:
+    return rnd.choice((
+        _words(rnd),                                       # ganz ohne PRI
+        f"<{rnd.randint(192, 999)}>{_words(rnd)}",         # PRI ausserhalb 0..191
+        f"<{_pri(rnd)}>{{zz}} {_words(rnd)}",              # kaputte Netconsole-Sequenz
+        f"<{_pri(rnd)}>{_ts(rnd)} {_words(rnd, 1, 2)}",    # BSD ohne Tag
+        f"<{_pri(rnd)}>1 {_words(rnd, 1, 3)}",             # abgeschnittener RFC 5424 Header
+        f"<{_pri(rnd)}",                                   # abgeschnitten
+    ))
+
+
+GENERATORS: Dict[str, Callable[[random.Random], str]] = {
+    'netconsole': gen_netconsole,
+    'mac_model': gen_mac_model,
+    'bsd': gen_bsd,
+    'rfc5424': gen_rfc5424,
+    'pri': gen_pri,
+    'malformed': gen_malformed,
+    'fortinet': gen_fortinet,
+    'mikrotik': gen_mikrotik,
+    'pfsense': gen_pfsense,
+    'windows': gen_windows,
+}
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'bsd=70,netconsole=30' -> normierte Anteile."""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in GENERATORS:
+            raise SystemExit(f"Unbekannter Korpus-Typ '{name}' (erlaubt: {', '.join(GENERATORS)})")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    return {name: weight / total for name, weight in mix.items() if weight > 0}
+
+
+def build_corpus(mix: Dict[str, float], count: int, seed: int) -> Dict[str, List[str]]:
+    """Deterministischer Korpus pro Typ (gleicher Seed -> gleiche Nachrichten)."""
+    rnd = random.Random(seed)
+    return {name: [GENERATORS[name](rnd) for _ in range(max(1, round(count * share)))]
+            for name, share in mix.items()}
+
+
+def measure(func: Callable[[str], object], items: List[str], rounds: int) -> Dict[str, float]:
+    """Bester Durchlauf aus `rounds` + zurückbehaltene Allokationen pro Aufruf."""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+
+    # Allokationen: Ergebnisse festhalten, damit sie nicht sofort freigegeben werden
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    mem_before = tracemalloc.get_traced_memory()[0]
+    results = [func(item) for item in items]
+    blocks = sys.getallocatedblocks() - blocks_before
+    mem = tracemalloc.get_traced_memory()[0] - mem_before
+    tracemalloc.stop()
+    del results
+
+    n = len(items)
+    return {
+        'count': n,
+        'msgs_per_sec': n / best if best else 0.0,
+        'ns_per_msg': best / n * 1e9,
+        'allocs_per_msg': blocks / n,
+        'bytes_per_msg': mem / n,
+    }
+
+
+def run(mix: Dict[str, float], count: int, seed: int, rounds: int) -> Dict[str, Dict[str, float]]:
+    parser = SyslogParser()
+    corpus = build_corpus(mix, count, seed)
+    sender_ip = '10.0.0.1'
+    parse = lambda raw: parser.parse(raw, sender_ip)
+
+    results = {}
+    for name, items in corpus.items():
+        results[f"parse[{name}]"] = measure(parse, items, rounds)
+
+    # Gesamtmix in gemischter Reihenfolge (realistischere Branch-/Cache-Situation); jeder
+    # Absender bleibt wie in echten Netzen bei einem Format (Parser-Gedächtnis pro IP)
+    mixed = [(item, f"10.{kind}.0.{i % 50}") for kind, items in enumerate(corpus.values())
+             for i, item in enumerate(items)]
+    random.Random(seed).shuffle(mixed)
+    results['parse[mix]'] = measure(lambda entry: parser.parse(*entry), mixed, rounds)
+
+    rnd = random.Random(seed)
+    macs = [_mac(rnd) for _ in range(count)]
+    results['format_mac'] = measure(SyslogParser.format_mac, macs, rounds)
+    pris = [rnd.randint(0, 191) for _ in range(count)]
+    results['parse_priority'] = measure(SyslogParser.parse_priority, pris, rounds)
+    return results
+
+
+def print_report(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]] = None):
+    header = f"{'Benchmark':<22} {'msgs/s':>12} {'ns/msg':>10} {'allocs/msg':>11} {'bytes/msg':>10}"
+    if baseline:
+        header += f" {'Δ msgs/s':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        line = (f"{name:<22} {r['msgs_per_sec']:>12,.0f} {r['ns_per_msg']:>10.0f} "
+                f"{r['allocs_per_msg']:>11.2f} {r['bytes_per_msg']:>10.0f}")
+        if baseline:
+            base = baseline.get(name)
+            line += f" {change(base, r):>+9.1f}%" if base else f" {'neu':>10}"
+        print(line)
+
+
+def change(base: Dict[str, float], current: Dict[str, float]) -> float:
+    """Durchsatzänderung gegenüber der Baseline in Prozent (negativ = langsamer)."""
+    return (current['msgs_per_sec'] / base['msgs_per_sec'] - 1) * 100 if base['msgs_per_sec'] else 0.0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='LogBot Syslog-Parser Micro-Benchmark')
+    ap.add_argument('--mix', default=DEFAULT_MIX, help=f"Korpus-Mix, Standard: {DEFAULT_MIX}")
+    ap.add_argument('--count', type=int, default=20000, help='Nachrichten im Korpus')
+    ap.add_argument('--rounds', type=int, default=5, help='Durchläufe, gewertet wird der schnellste')
+    ap.add_argument('--seed', type=int, default=514)
+    ap.add_argument('--baseline', help='Baseline-JSON zum Vergleich')
+    ap.add_argument('--save-baseline', help='Ergebnisse als Baseline-JSON speichern')
+    ap.add_argument('--max-regression', type=float,
+                    help='Exit-Code 1, wenn ein Benchmark mehr als X%% Durchsatz verliert')
+    ap.add_argument('--json', action='store_true', help='Ergebnisse als JSON ausgeben')
+    args = ap.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    results = run(mix, args.count, args.seed, args.rounds)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    if args.json:
+        print(json.dumps({'mix': mix, 'count': args.count, 'seed': args.seed, 'results': results}, indent=2))
+    else:
+        print(f"Korpus: {args.count} Nachrichten, Seed {args.seed}, Mix "
+              + ', '.join(f"{name}={share:.0%}" for name, share in mix.items()))
+        print_report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'mix': mix, 'count': args.count, 'seed': args.seed,
+                       'python': sys.version.split()[0], 'results': results}, f, indent=2)
+        print(f"Baseline gespeichert: {args.save_baseline}", file=sys.stderr)
+
+    if baseline and args.max_regression is not None:
+        regressions: List[Tuple[str, float]] = [
+            (name, change(baseline[name], r)) for name, r in results.items()
+            if name in baseline and change(baseline[name], r) < -args.max_regression]
+        for name, delta in regressions:
+            print(f"REGRESSION: {name} {delta:+.1f}% (Grenze -{args.max_regression}%)", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
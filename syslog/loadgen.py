@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# ==============================================================================
+# Name:        Philipp Fischer
+# Kontakt:     p.fischer@itconex.de
+# Version:     2026.10.18.12.00.00
+# Beschreibung: LogBot v2026.10.18.12.00.00 - Ingest-Lastgenerator
+#               Sendet synthetische oder aufgezeichnete Syslog-Zeilen per UDP/TCP mit fester
+#               Rate an den Syslog-Server und misst über die logs-Tabelle Durchsatz,
+#               Verlustrate und Latenz bis zur gespeicherten Zeile
+# ==============================================================================
+#
+# Beispiele:
+#   python loadgen.py --rate 5000 --duration 30                      # UDP, Standard-Mix
+#   python loadgen.py --rate 2000,5000,10000,20000 --senders 4       # Kapazität in Stufen
+#   python loadgen.py --proto tcp --connections 8 --rate 20000
+#   python loadgen.py --replay aufzeichnung.log --rate 3000          # eigene Zeilen
+#   python loadgen.py --rate 10000 --save-report v1.json
+#   python loadgen.py --rate 10000 --baseline v1.json                # Vergleich zweier Versionen
+#
+# Jede Nachricht bekommt am Ende eine Markierung " lg:<Lauf>:<Nummer>:<Sendezeit ms>", über
+# die die Zeilen in logs gezählt werden. Latenz = created_at der Zeile (Start der COPY-
+# Transaktion) - Sendezeit; Generator, Server und PostgreSQL müssen dieselbe Uhr haben
+# (lokal bzw. NTP). DB-Zugang über dieselben DB_* Variablen wie der Server.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import socket
+import sys
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import asyncpg
+
+from bench_parser import DEFAULT_MIX, build_corpus, parse_mix
+from syslog_server import DB_HOST, DB_NAME, DB_PASSWORD, DB_PORT, DB_USER
+
+# Server-Zähler aus /metrics, die im Bericht als Differenz vor/nach einer Stufe erscheinen
+SERVER_METRICS = ('received', 'dropped', 'parsed', 'stored', 'failed', 'failed_batches', 'spooled')
+
+COUNT_SQL = """SELECT count(*) FROM logs
+               WHERE timestamp >= $1 AND COALESCE(raw_message, raw_prefix || message) LIKE $2"""
+ROWS_SQL = """SELECT (regexp_match(COALESCE(raw_message, raw_prefix || message), $3))[1]::bigint AS sent_ms,
+                     extract(epoch FROM created_at AT TIME ZONE current_setting('TimeZone')) * 1000 AS created_ms
+              FROM logs WHERE timestamp >= $1 AND COALESCE(raw_message, raw_prefix || message) LIKE $2"""
+
+
+def load_messages(args) -> List[str]:
+    """Aufgezeichnete Zeilen (--replay) oder synthetischer Korpus aus bench_parser."""
+    if args.replay:
+        with open(args.replay, encoding='utf-8', errors='replace') as f:
+            lines = [line.rstrip('\r\n') for line in f]
+        messages = [line for line in lines if line.strip()]
+        if not messages:
+            raise SystemExit(f"Keine Zeilen in {args.replay}")
+        return messages
+    corpus = build_corpus(parse_mix(args.mix), args.corpus, args.seed)
+    messages = [item for items in corpus.values() for item in items]
+    random.Random(args.seed).shuffle(messages)
+    return messages
+
+
+def sender_count(args) -> int:
+    """Anzahl Sendeprozesse: bei --proto both je Sender einer für UDP und einer für TCP."""
+    return args.senders * 2 if args.proto == 'both' else args.senders
+
+
+def sender(index: int, args, run: str, rate: float, messages: List[str], results):
+    """Sendeprozess: rate Nachrichten/s für args.duration Sekunden, Nummern index, index+N, ..."""
+    host, port = args.host, args.port
+    proto = args.proto if args.proto != 'both' else ('udp', 'tcp')[index % 2]
+    if proto == 'udp':
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        conns = [sock]
+    else:
+        conns = [socket.create_connection((host, port)) for _ in range(args.connections)]
+
+    burst = max(1, int(rate / 200))  # alle ~5 ms ein Schub
+    start = time.perf_counter()
+    end = start + args.duration
+    sent = errors = 0
+    seq = index
+    step = sender_count(args)
+    count = len(messages)
+    while True:
+        now = time.perf_counter()
+        if now >= end:
+            break
+        due = int((now - start) * rate) - sent
+        if due <= 0:
+            time.sleep(min(0.005, (sent + 1) / rate - (now - start)))
+            continue
+        sent_ms = int(time.time() * 1000)
+        for _ in range(min(due, burst * 4)):
+            line = f"{messages[seq % count]} lg:{run}:{seq}:{sent_ms}"
+            data = line.encode('utf-8')
+            try:
+                if proto == 'udp':
+                    conns[0].sendto(data, (host, port))
+                elif args.framing == 'octet':
+                    conns[seq % len(conns)].sendall(b'%d %s' % (len(data), data))
+                else:
+                    conns[seq % len(conns)].sendall(data + b'\n')
+            except OSError:
+                errors += 1
+            sent += 1
+            seq += step
+    for conn in conns:
+        conn.close()
+    results.put({'sent': sent, 'errors': errors, 'elapsed': time.perf_counter() - start})
+
+
+def fetch_metrics(url: Optional[str]) -> Dict[str, float]:
+    """Summen der SERVER_METRICS aus dem Prometheus-Endpunkt (Label-Varianten addiert)."""
+    if not url:
+        return {}
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            text = resp.read().decode()
+    except OSError as e:
+        print(f"Metrics nicht erreichbar ({url}): {e}", file=sys.stderr)
+        return {}
+    totals = dict.fromkeys(SERVER_METRICS, 0.0)
+    for line in text.splitlines():
+        if line.startswith('#') or ' ' not in line:
+            continue
+        name, _, value = line.rpartition(' ')
+        name = name.partition('{')[0]
+        for metric in SERVER_METRICS:
+            if name == f"logbot_syslog_{metric}_total":
+                totals[metric] += float(value)
+    return totals
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def wait_for_rows(conn, since: datetime, pattern: str, expected: int, settle: float, timeout: float) -> int:
+    """Zählen, bis sich die Zeilenzahl settle Sekunden nicht mehr ändert (oder alle da sind)."""
+    rows, changed, deadline = -1, time.monotonic(), time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        count = await conn.fetchval(COUNT_SQL, since, pattern)
+        if count != rows:
+            rows, changed = count, time.monotonic()
+        if rows >= expected or time.monotonic() - changed >= settle:
+            break
+        await asyncio.sleep(0.5)
+    return rows
+
+
+async def run_step(args, conn, rate: float, messages: List[str]) -> Dict[str, float]:
+    """Eine Laststufe: senden, auf die Zeilen warten, auswerten."""
+    run = f"{random.getrandbits(32):08x}"
+    # Server schreibt timestamp als Empfangszeit in UTC; etwas Spielraum für Uhrabweichung
+    since = datetime.utcnow() - timedelta(seconds=5)
+    before = fetch_metrics(args.metrics)
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    senders = sender_count(args)
+    procs = [ctx.Process(target=sender, args=(i, args, run, rate / senders, messages, results))
+             for i in range(senders)]
+    for proc in procs:
+        proc.start()
+    totals = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    sent = sum(t['sent'] for t in totals)
+    send_elapsed = max(t['elapsed'] for t in totals)
+
+    pattern = f"% lg:{run}:%"
+    rows = await wait_for_rows(conn, since, pattern, sent, args.settle, args.timeout)
+    records = await conn.fetch(ROWS_SQL, since, pattern, f"lg:{run}:\\d+:(\\d+)")
+    latencies = [(r['created_ms'] - r['sent_ms']) / 1000 for r in records if r['sent_ms'] is not None]
+    after = fetch_metrics(args.metrics)
+
+    first_sent = min((r['sent_ms'] for r in records), default=0)
+    last_created = max((r['created_ms'] for r in records), default=0)
+    span = (last_created - first_sent) / 1000 if records else 0
+    report = {
+        'rate_target': rate,
+        'sent': sent,
+        'send_errors': sum(t['errors'] for t in totals),
+        'rate_sent': sent / send_elapsed if send_elapsed else 0.0,
+        'rows': rows,
+        'drop_rate': 1 - rows / sent if sent else 0.0,
+        # Gespeicherte Zeilen pro Sekunde vom ersten Senden bis zur letzten Zeile
+        'throughput': rows / span if span > 0 else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_p99': percentile(latencies, 99),
+        'latency_max': max(latencies, default=0.0),
+    }
+    for metric in SERVER_METRICS:
+        if metric in before and metric in after:
+            report[f"server_{metric}"] = after[metric] - before[metric]
+    return report
+
+
+def print_report(steps: List[Dict[str, float]], baseline: Optional[List[Dict[str, float]]] = None):
+    header = (f"{'Ziel/s':>8} {'gesendet/s':>11} {'gesendet':>10} {'Zeilen':>10} {'Verlust':>8} "
+              f"{'Zeilen/s':>10} {'p50 s':>7} {'p90 s':>7} {'p99 s':>7} {'max s':>7}")
+    if baseline:
+        header += f" {'Δ Zeilen/s':>11} {'Δ p99':>8}"
+    print(header)
+    print('-' * len(header))
+    base = {step['rate_target']: step for step in baseline or []}
+    for r in steps:
+        line = (f"{r['rate_target']:>8,.0f} {r['rate_sent']:>11,.0f} {r['sent']:>10,} {r['rows']:>10,} "
+                f"{r['drop_rate']:>7.2%} {r['throughput']:>10,.0f} {r['latency_p50']:>7.3f} "
+                f"{r['latency_p90']:>7.3f} {r['latency_p99']:>7.3f} {r['latency_max']:>7.3f}")
+        if baseline:
+            b = base.get(r['rate_target'])
+            if b and b['throughput']:
+                line += (f" {(r['throughput'] / b['throughput'] - 1) * 100:>+10.1f}%"
+                         f" {r['latency_p99'] - b['latency_p99']:>+8.3f}")
+            else:
+                line += f" {'neu':>11}"
+        print(line)
+        server = ', '.join(f"{k[7:]}={v:,.0f}" for k, v in r.items() if k.startswith('server_'))
+        if server:
+            print(f"{'':>8} Server: {server}")
+
+
+async def run(args) -> List[Dict[str, float]]:
+    messages = load_messages(args)
+    conn = await asyncpg.connect(host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+    try:
+        steps = []
+        for i, rate in enumerate(args.rate):
+            if i:
+                await asyncio.sleep(args.pause)
+            print(f"Stufe {i + 1}/{len(args.rate)}: {rate:,.0f} Nachrichten/s, {args.duration}s, "
+                  f"{args.proto}, {args.senders} Sender", file=sys.stderr)
+            steps.append(await run_step(args, conn, rate, messages))
+        return steps
+    finally:
+        await conn.close()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description='LogBot Ingest-Lastgenerator')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=514)
+    ap.add_argument('--proto', choices=('udp', 'tcp', 'both'), default='udp')
+    ap.add_argument('--framing', choices=('lf', 'octet'), default='lf', help='TCP-Framing (RFC 6587)')
+    ap.add_argument('--rate', default='5000', help='Nachrichten/s, mehrere Stufen kommagetrennt')
+    ap.add_argument('--duration', type=float, default=30, help='Sekunden pro Stufe')
+    ap.add_argument('--senders', type=int, default=1, help='Sendeprozesse (ab ~30k/s pro Prozess nötig; bei --proto both je einer für UDP und TCP)')
+    ap.add_argument('--connections', type=int, default=1, help='TCP-Verbindungen pro Sender')
+    ap.add_argument('--replay', help='Datei mit einer Syslog-Zeile pro Zeile statt synthetischem Korpus')
+    ap.add_argument('--mix', default=DEFAULT_MIX, help=f"Korpus-Mix, Standard: {DEFAULT_MIX}")
+    ap.add_argument('--corpus', type=int, default=20000, help='Verschiedene synthetische Nachrichten')
+    ap.add_argument('--seed', type=int, default=514)
+    ap.add_argument('--metrics', default='http://127.0.0.1:9514/metrics',
+                    help="Metrics-Endpunkt des Servers ('' = nicht abfragen)")
+    ap.add_argument('--settle', type=float, default=5, help='Sekunden ohne neue Zeilen = fertig')
+    ap.add_argument('--timeout', type=float, default=120, help='Maximale Wartezeit auf Zeilen pro Stufe')
+    ap.add_argument('--pause', type=float, default=5, help='Pause zwischen Stufen')
+    ap.add_argument('--baseline', help='Bericht-JSON zum Vergleich')
+    ap.add_argument('--save-report', help='Bericht als JSON speichern')
+    ap.add_argument('--json', action='store_true', help='Bericht als JSON ausgeben')
+    args = ap.parse_args(argv)
+    args.rate = [float(rate) for rate in args.rate.split(',')]
+
+    steps = asyncio.run(run(args))
+    report = {'proto': args.proto, 'duration': args.duration, 'senders': args.senders,
+              'source': args.replay or args.mix, 'steps': steps}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['steps']
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(steps, baseline)
+
+    if args.save_report:
+        with open(args.save_report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Bericht gespeichert: {args.save_report}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
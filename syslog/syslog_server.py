@@ -9,15 +9,37 @@
 # ==============================================================================
 
 import asyncio
+import bisect
+import hashlib
+import multiprocessing
 import os
+import queue
 import re
 import json
 import logging
+import mmap
+import random
+import signal
+import socket
+import struct
+import threading
 import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Optional, Dict, Any, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import wait as mp_wait
+from typing import Optional, Dict, Any, Callable, List, Tuple
 import asyncpg
 
+try:
+    import uvloop
+except ImportError:  # optional, siehe EVENT_LOOP
+    uvloop = None
+
 # Logging Setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('syslog_server')
@@ -30,42 +52,667 @@ DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 DB_NAME = os.getenv('DB_NAME', 'logbot')
 SYSLOG_PORT = int(os.getenv('SYSLOG_PORT', '514'))
 
-# Batch-Konfiguration
-BATCH_SIZE = 100
-BATCH_INTERVAL = 2.0  # Sekunden
-AGENT_CACHE_TTL = 300  # 5 Minuten
+# Multi-Prozess-Modus: >1 startet einen Supervisor mit N Workern (SO_REUSEPORT)
+SYSLOG_WORKERS = int(os.getenv('SYSLOG_WORKERS', '1'))
+STATS_INTERVAL = float(os.getenv('STATS_INTERVAL', '60'))  # Sekunden
+# Event-Loop: auto (uvloop, falls installiert) | uvloop | asyncio
+EVENT_LOOP = os.getenv('EVENT_LOOP', 'auto')
+# Prometheus-Endpunkt /metrics (0 = aus); im Supervisor-Modus über alle Worker aggregiert
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9514'))
+# Pool-Größe pro Prozess (bei N Workern N-fach, max_connections beachten!)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '2'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+
+# Batch-Konfiguration (adaptiv: Start-/Grenzwerte, sonst feste Größe und Intervall)
+BATCH_ADAPTIVE = os.getenv('BATCH_ADAPTIVE', '1') == '1'
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '100'))
+BATCH_INTERVAL = float(os.getenv('BATCH_INTERVAL', '2.0'))  # Sekunden, max. Linger
+BATCH_SIZE_MIN = int(os.getenv('BATCH_SIZE_MIN', '100'))
+BATCH_SIZE_MAX = int(os.getenv('BATCH_SIZE_MAX', '5000'))
+BATCH_LINGER_MIN = float(os.getenv('BATCH_LINGER_MIN', '0.05'))  # Sekunden
+BATCH_TARGET_LATENCY = float(os.getenv('BATCH_TARGET_LATENCY', '1.0'))  # Empfang -> DB, Sekunden
+# Parallele COPY-Writer (je eine Pool-Verbindung) und max. Batches in der Pipeline
+FLUSH_WRITERS = int(os.getenv('FLUSH_WRITERS', '4'))
+MAX_INFLIGHT_BATCHES = int(os.getenv('MAX_INFLIGHT_BATCHES', '8'))
+# Durable Spool für Batches, die nicht geschrieben werden können (leer = deaktiviert)
+SPOOL_DIR = os.getenv('SPOOL_DIR', '')
+SPOOL_MAX_BYTES = int(os.getenv('SPOOL_MAX_BYTES', str(1024 * 1024 * 1024)))
+SPOOL_SEGMENT_BYTES = int(os.getenv('SPOOL_SEGMENT_BYTES', str(64 * 1024 * 1024)))
+SPOOL_FSYNC = os.getenv('SPOOL_FSYNC', 'interval')  # always | interval | never
+SPOOL_FSYNC_INTERVAL = float(os.getenv('SPOOL_FSYNC_INTERVAL', '1.0'))  # Sekunden
+SPOOL_REPLAY_RATE = int(os.getenv('SPOOL_REPLAY_RATE', '5000'))  # Logs/s beim Replay
+# Wiederholte Nachrichten pro Absender zusammenfassen (0 = deaktiviert)
+DEDUP_WINDOW = float(os.getenv('DEDUP_WINDOW', '0'))  # Sekunden
+DEDUP_MAX_ENTRIES = int(os.getenv('DEDUP_MAX_ENTRIES', '50000'))
+# Tages-Partitionen von logs im Voraus anlegen (0 = aus, siehe logs_ensure_partitions in init.sql)
+PARTITION_DAYS_AHEAD = int(os.getenv('PARTITION_DAYS_AHEAD', '7'))
+PARTITION_CHECK_INTERVAL = 3600  # Sekunden
+# raw_message speichern: full (immer) | compact (nur der Teil vor message, siehe RowEncoder)
+RAW_STORAGE = os.getenv('RAW_STORAGE', 'compact')
+# Aktive Format-Parser (all oder Liste, z.B. netconsole,mac_model,bsd) und Absender-Gedächtnis
+SYSLOG_PARSERS = os.getenv('SYSLOG_PARSERS', 'all')
+PARSER_CACHE_SIZE = int(os.getenv('PARSER_CACHE_SIZE', '10000'))
+
+# Spalten der COPY-Zeilen (Feldreihenfolge: Kopf, source_id, RowEncoder.tail)
+LOG_COLUMNS = ['agent_id', 'ip_address', 'source_id', 'timestamp', 'facility', 'severity', 'message', 'raw_message',
+               'raw_prefix', 'extra_data', 'repeat_count', 'first_timestamp', 'last_timestamp', 'message_hash']
+# Max. Einträge im Cache source -> log_sources.id
+SOURCE_CACHE_SIZE = int(os.getenv('SOURCE_CACHE_SIZE', '50000'))
+
+# Binäres COPY-Format: Signatur + Flags + Header-Erweiterung, Ende = Feldanzahl -1
+PG_EPOCH = 946684800  # 2000-01-01 UTC in Unix-Sekunden
+COPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+COPY_TRAILER = struct.pack('!h', -1)
+AGENT_CACHE_TTL = int(os.getenv('AGENT_CACHE_TTL', '300'))  # 5 Minuten
+AGENT_CACHE_SIZE = int(os.getenv('AGENT_CACHE_SIZE', '20000'))  # max. Einträge (LRU)
+AGENT_NEGATIVE_TTL = int(os.getenv('AGENT_NEGATIVE_TTL', '30'))  # fehlgeschlagene Lookups merken
+
+# Ingest-Queue zwischen UDP-Empfang und Verarbeitung (begrenzt, statt Task pro Datagramm)
+QUEUE_CAPACITY = int(os.getenv('QUEUE_CAPACITY', '50000'))
+QUEUE_POLICY = os.getenv('QUEUE_POLICY', 'drop_newest')  # drop_newest | drop_oldest | drop_severity
+QUEUE_CONSUMERS = int(os.getenv('QUEUE_CONSUMERS', '4'))
+QUEUE_BATCH = int(os.getenv('QUEUE_BATCH', '256'))
+# Parsen + Kodieren in N Hilfsprozessen statt im Event-Loop (0 = im Loop, siehe parse_chunk)
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '0'))
+
+# UDP-Empfang: 'protocol' (asyncio DatagramProtocol) oder 'batch' (viele Datagramme pro Wakeup)
+UDP_ENGINE = os.getenv('UDP_ENGINE', 'protocol')
+UDP_RECV_BATCH = int(os.getenv('UDP_RECV_BATCH', '256'))   # max. Datagramme pro Wakeup
+UDP_RCVBUF = int(os.getenv('UDP_RCVBUF', str(8 * 1024 * 1024)))  # SO_RCVBUF (0 = Kernel-Standard)
+UDP_MAX_DATAGRAM = 65535
+
+# TCP-Empfang (RFC 6587): max. Framegröße, Lesepuffer pro Verbindung, Pause ab Queue-Füllstand
+TCP_MAX_FRAME = int(os.getenv('TCP_MAX_FRAME', '65536'))
+TCP_READ_BUFFER = int(os.getenv('TCP_READ_BUFFER', str(256 * 1024)))
+TCP_PAUSE_RATIO = 0.8
 
 # Syslog Level Namen
 LEVEL_NAMES = {0: 'emergency', 1: 'alert', 2: 'critical', 3: 'error',
                4: 'warning', 5: 'notice', 6: 'info', 7: 'debug'}
+LEVEL_SEVERITY = {name: severity for severity, name in LEVEL_NAMES.items()}
+
+
+class IngestStats:
+    """Ingest-Zähler eines Prozesses (im Supervisor-Modus pro Worker).
+
+    Schlüssel mit Labels werden direkt im Prometheus-Format geführt ('received{protocol="udp"}'),
+    Histogramme als ein Zähler pro Bucket plus _sum/_count. So bleibt ein Snapshot ein
+    flaches Dict, dessen Zähler der Supervisor einfach summieren kann.
+    """
+
+    FIELDS = ('received', 'queued', 'dropped', 'processed', 'parsed', 'stored', 'failed', 'queue_depth')
+    # Momentanwerte (im Supervisor pro Worker statt summiert exportiert)
+    GAUGES = frozenset(('queue_depth', 'buffer_rows', 'batches_inflight', 'batch_size', 'batch_linger_ms',
+                        'copy_latency_ms', 'batch_latency_ms', 'spool_bytes', 'dedup_entries',
+                        'agent_cache_size', 'source_cache_size', 'last_seen_pending',
+                        'last_seen_flush_timestamp', 'rollup_pending'))
+    # Obergrenzen der Histogramm-Buckets in Sekunden
+    HISTOGRAMS = {
+        'copy_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+        'batch_seconds': (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+        'last_seen_flush_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    }
+    HELP = {
+        'received': 'Empfangene Nachrichten',
+        'queued': 'In die Ingest-Queue eingereihte Nachrichten',
+        'dropped': 'Wegen voller Ingest-Queue verworfene Nachrichten',
+        'processed': 'Aus der Ingest-Queue entnommene Nachrichten',
+        'parsed': 'Geparste Nachrichten',
+        'stored': 'In die DB geschriebene Logs',
+        'failed': 'Verlorene Logs (Parse-/Insert-Fehler, Spool voll)',
+        'failed_batches': 'Fehlgeschlagene Batches (verworfen oder gespoolt)',
+        'agent_cache_hit': 'Treffer im Agent-Cache',
+        'agent_cache_miss': 'Fehlgriffe im Agent-Cache',
+        'source_cache_size': 'Einträge im Source-Cache (log_sources)',
+        'sources_created': 'Neu angelegte Sources (log_sources)',
+        'queue_depth': 'Nachrichten in der Ingest-Queue',
+        'buffer_rows': 'Logs im aktuellen, noch nicht abgegebenen Batch',
+        'batches_inflight': 'Batches, die auf einen Writer warten oder geschrieben werden',
+        'copy_seconds': 'Dauer eines COPY-Batches',
+        'batch_seconds': 'Zeit von der ersten gepufferten Zeile bis zum gespeicherten Batch',
+        'last_seen_flush_seconds': 'Dauer des gebündelten last_seen Updates',
+        'last_seen_flush_timestamp': 'Unix-Zeit des letzten erfolgreichen last_seen Updates',
+        'last_seen_pending': 'Agents mit ausstehendem last_seen Update',
+        'rollup_pending': 'Noch nicht geschriebene Zähler für logs_rollup',
+        'rollup_rows': 'Nach logs_rollup geschriebene Zähler (Upserts)',
+    }
+
+    def __init__(self):
+        self.counters = dict.fromkeys(self.FIELDS, 0)
+        # Histogramm -> Bucket-Schlüssel (letzter = +Inf)
+        self._buckets = {name: [f'{name}_bucket{{le="{le}"}}' for le in bounds] + [f'{name}_bucket{{le="+Inf"}}']
+                         for name, bounds in self.HISTOGRAMS.items()}
+        # (Name, Labelwert) -> fertiger Schlüssel
+        self._keys: Dict[Tuple[str, str], str] = {}
+
+    def incr(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name: str, value: int):
+        """Momentanwert (Gauge) setzen, z.B. Queue-Tiefe."""
+        self.counters[name] = value
+
+    def incr_label(self, name: str, label: str, value: str, n: int = 1):
+        """Zähler mit einem Label erhöhen, z.B. incr_label('parsed', 'format', 'bsd')."""
+        key = self._keys.get((name, value))
+        if key is None:
+            key = self._keys[(name, value)] = f'{name}{{{label}="{value}"}}'
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name: str, value: float):
+        """Messwert in ein Histogramm (HISTOGRAMS) eintragen."""
+        counters = self.counters
+        key = self._buckets[name][bisect.bisect_left(self.HISTOGRAMS[name], value)]
+        counters[key] = counters.get(key, 0) + 1
+        counters[f"{name}_sum"] = counters.get(f"{name}_sum", 0) + value
+        counters[f"{name}_count"] = counters.get(f"{name}_count", 0) + 1
+
+    def snapshot(self) -> Dict[str, float]:
+        return dict(self.counters)
+
+    def drain(self) -> Dict[str, float]:
+        """Zähler abgeben und zurücksetzen (Parse-Worker -> Hauptprozess, siehe add)."""
+        counters, self.counters = self.counters, dict.fromkeys(self.FIELDS, 0)
+        return {name: value for name, value in counters.items() if value}
+
+    def add(self, counters: Dict[str, float]):
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @staticmethod
+    def merge(snapshots) -> Dict[str, float]:
+        """Summiert die Zähler mehrerer Snapshots (Worker-Aggregation).
+
+        Gauges bleiben außen vor: eine Summe über Worker ist kein sinnvoller Momentanwert
+        (pro Worker siehe render, Maximum siehe gauge_max).
+        """
+        total = dict.fromkeys(IngestStats.FIELDS, 0)
+        for snap in snapshots:
+            for name, value in snap.items():
+                if name.partition('{')[0] not in IngestStats.GAUGES:
+                    total[name] = total.get(name, 0) + value
+        return total
+
+    @staticmethod
+    def gauge_max(snapshots) -> Dict[str, float]:
+        """Maximum jeder Gauge über mehrere Snapshots (z.B. tiefste Queue aller Worker)."""
+        result: Dict[str, float] = {}
+        for snap in snapshots:
+            for name, value in snap.items():
+                if name.partition('{')[0] in IngestStats.GAUGES:
+                    result[name] = max(result.get(name, value), value)
+        return result
+
+    @staticmethod
+    def format(snap: Dict[str, float]) -> str:
+        text = ', '.join(f"{name}={snap.get(name, 0)}" for name in IngestStats.FIELDS)
+        # Zusätzliche Zähler (z.B. dropped_debug) nur anzeigen, wenn sie anfallen;
+        # Label-Varianten und Histogramme gibt es nur unter /metrics
+        extra = ', '.join(f"{name}={value}" for name, value in sorted(snap.items())
+                          if name not in IngestStats.FIELDS and value and '{' not in name
+                          and not name.endswith(('_sum', '_count')))
+        return f"{text}, {extra}" if extra else text
+
+    @staticmethod
+    def render(snap: Dict[str, float], workers: Optional[Dict[int, Dict[str, float]]] = None) -> str:
+        """Snapshot im Prometheus-Textformat (Prefix logbot_syslog_, Zähler mit _total).
+
+        workers: Snapshots pro Worker - Gauges werden dann mit Label worker statt summiert
+        ausgegeben, Zähler und Histogramme kommen aus dem summierten snap.
+        """
+        metrics: Dict[str, list] = {}
+        labelled = {key.partition('{')[0] for key in snap if '{' in key}
+        for key, value in snap.items():
+            name, _, labels = key.partition('{')
+            if name in IngestStats.GAUGES and workers is not None:
+                continue
+            if name.endswith(('_bucket', '_sum', '_count')) and name.rpartition('_')[0] in IngestStats.HISTOGRAMS:
+                continue
+            # Gesamtwert nicht zusätzlich zu den Label-Varianten exportieren
+            if not labels and name in labelled:
+                continue
+            metrics.setdefault(name, []).append((labels, value))
+        for worker_id, worker_snap in sorted((workers or {}).items()):
+            for key, value in worker_snap.items():
+                name, _, labels = key.partition('{')
+                if name in IngestStats.GAUGES:
+                    metrics.setdefault(name, []).append((f'worker="{worker_id}",{labels}' if labels
+                                                         else f'worker="{worker_id}"}}', value))
+
+        lines = []
+        for name in sorted(metrics):
+            gauge = name in IngestStats.GAUGES
+            metric = f"logbot_syslog_{name}" if gauge else f"logbot_syslog_{name}_total"
+            if name in IngestStats.HELP:
+                lines.append(f"# HELP {metric} {IngestStats.HELP[name]}")
+            lines.append(f"# TYPE {metric} {'gauge' if gauge else 'counter'}")
+            for labels, value in sorted(metrics[name]):
+                lines.append(f"{metric}{{{labels} {value}" if labels else f"{metric} {value}")
+        for name, bounds in IngestStats.HISTOGRAMS.items():
+            count = snap.get(f"{name}_count", 0)
+            metric = f"logbot_syslog_{name}"
+            lines.append(f"# HELP {metric} {IngestStats.HELP[name]}")
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for le in bounds:
+                cumulative += snap.get(f'{name}_bucket{{le="{le}"}}', 0)
+                lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{metric}_sum {snap.get(f'{name}_sum', 0)}")
+            lines.append(f"{metric}_count {count}")
+        return '\n'.join(lines) + '\n'
+
+
+# Zähler dieses Prozesses (Worker erben per fork eine frische Instanz, siehe run_worker)
+stats = IngestStats()
+
+# Facility/Level pro gültiger Priority (0..191) vorberechnet
+PRIORITIES = [(pri >> 3, LEVEL_NAMES[pri & 0x07]) for pri in range(192)]
+
+MONTHS = frozenset(('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                    'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'))
+HEX_CHARS = frozenset('0123456789abcdefABCDEF')
+MONTH_INITIALS = frozenset(month[0] for month in MONTHS)
 
 # ==============================================================================
 # REGEX PATTERNS - UniFi Netconsole und MAC/Model Format
+# Alle Patterns werden NACH dem bereits gelesenen <PRI> angewendet (match(raw, pos)).
+# Tags ohne '[' laufen über die schnellen Patterns ohne Backtracking; die *_TAG_FALLBACK
+# Patterns (lazy wie bisher) werden nur für Tags mit Klammern benötigt.
 # ==============================================================================
 
 # Pattern 1: UniFi Netconsole - {hex} ist Sequenznummer, NICHT Hostname!
 # Beispiel: <6>{f1d1} [1234.567890] mclagsyncd[1234]: Message
 UNIFI_NETCONSOLE = re.compile(
-    r'^<(\d+)>\{([a-fA-F0-9]+)\}\s*\[[\d.]+\]\s*(\S+?)(?:\[\d+\])?:\s*(.*)$'
+    r'\{([a-fA-F0-9]+)\}\s*\[[\d.]+\]\s*([^\s:\[]+)(?:\[\d+\])?:\s*(.*)', re.DOTALL
+)
+UNIFI_NETCONSOLE_TAG_FALLBACK = re.compile(
+    r'\{([a-fA-F0-9]+)\}\s*\[[\d.]+\]\s*(\S+?)(?:\[\d+\])?:\s*(.*)', re.DOTALL
 )
 
 # Pattern 2: UniFi MAC/Model Format
 # Beispiel: <30>784558fc21cf,U6-LR-6.7.31+15618: hostapd: Message
 UNIFI_MAC_MODEL = re.compile(
-    r'^<(\d+)>([a-fA-F0-9]{12}),([^:]+):\s*(\S+?):\s*(.*)$'
+    r'([a-fA-F0-9]{12}),([^:]+):\s*([^\s:]+):\s*(.*)', re.DOTALL
 )
 
-# Pattern 3: Standard BSD Syslog
+# Pattern 3: Standard BSD Syslog (RFC 3164)
+# Beispiel: <30>Feb 16 12:00:00 host sshd[1234]: Message
 BSD_SYSLOG = re.compile(
-    r'^<(\d+)>([A-Z][a-z]{2}\s+\d+\s+\d+:\d+:\d+)\s+(\S+)\s+(\S+?)(?:\[\d+\])?:\s*(.*)$'
+    r'([A-Z][a-z]{2}\s+\d+\s+\d+:\d+:\d+)\s+(\S+)\s+([^\s:\[]+)(?:\[\d+\])?:\s*(.*)', re.DOTALL
+)
+BSD_SYSLOG_TAG_FALLBACK = re.compile(
+    r'([A-Z][a-z]{2}\s+\d+\s+\d+:\d+:\d+)\s+(\S+)\s+(\S+?)(?:\[\d+\])?:\s*(.*)', re.DOTALL
 )
 
-# Pattern 4: Nur Priority
-SIMPLE = re.compile(r'^<(\d+)>\s*(.*)$')
+# Pattern 4: RFC 5424 Header (VERSION TIMESTAMP HOSTNAME APP-NAME PROCID MSGID), danach SD + MSG
+# Beispiel: <165>1 2026-02-16T12:00:00.000Z host app 1234 ID47 [exampleSDID@32473 iut="3"] Message
+RFC5424_HEADER = re.compile(r'1 (\S+) (\S+) (\S+) (\S+) (\S+) ')
+RFC5424_SD_ELEMENT = re.compile(r'\[([^\s\]=]+)((?:\s+[^\s=\]"]+="(?:[^"\\]|\\.)*")*)\s*\]')
+RFC5424_SD_PARAM = re.compile(r'([^\s=\]"]+)="((?:[^"\\]|\\.)*)"')
+RFC5424_SD_ESCAPE = re.compile(r'\\(["\\\]])')
+
+# Pattern 6: Fortinet FortiGate (key=value, Werte optional in Anführungszeichen)
+# Beispiel: <189>date=2026-02-16 time=12:00:00 devname="FGT60F" logid="0000000013" type="traffic" msg="..."
+FORTINET_KV = re.compile(r'([A-Za-z0-9_]+)=("[^"\\]*(?:\\.[^"\\]*)*"|\S*)')
+
+# Pattern 7: pfSense/FreeBSD - BSD-Header ohne Hostname
+# Beispiel: <134>Feb 16 12:00:00 filterlog[1234]: 5,,,1000000103,igb1,match,block,in,4,0x0,,64,...
+BSD_NO_HOST = re.compile(r'([A-Z][a-z]{2}\s+\d+\s+\d+:\d+:\d+)\s+([^\s:\[]+)(?:\[\d+\])?:\s*(.*)', re.DOTALL)
+
+# Pattern 8: MikroTik RouterOS - Topics (inkl. Severity) statt Tag, BSD-Header optional
+# Beispiel: <30>system,info,account user admin logged in from 10.0.0.2 via ssh
+MIKROTIK = re.compile(r'(?:[A-Z][a-z]{2}\s+\d+\s+\d+:\d+:\d+\s+(\S+)\s+)?([a-z]+(?:,[a-z]+)+)\s+(.*)', re.DOTALL)
+MIKROTIK_SEVERITIES = frozenset(('debug', 'info', 'warning', 'error', 'critical'))
+
+# Pattern 9: Windows Eventlog via NXLog (to_json), optionaler BSD-Header vor dem JSON
+# Beispiel: <14>Feb 16 12:00:00 WINHOST Microsoft-Windows-Security-Auditing[4]: {"EventID":4624,...}
+NXLOG_BSD_HEADER = re.compile(r'[A-Z][a-z]{2}\s+\d+\s+\d+:\d+:\d+\s+(\S+)\s+\S+?:\s*')
+
+# Konstante extra_data (werden von allen Ergebnissen geteilt - nicht verändern!)
+EXTRA_NONE: Dict[str, Any] = {}
+EXTRA_BSD: Dict[str, Any] = {'format': 'bsd'}
+
+
+class ParsedLog:
+    """Ergebnis von SyslogParser.parse - kompakt per __slots__ statt dict pro Nachricht."""
+
+    __slots__ = ('hostname', 'ip_address', 'mac_address', 'device_type', 'facility',
+                 'level', 'source', 'message', 'raw_message', 'extra_data')
+
+    def __init__(self, hostname: str, ip_address: str, mac_address: Optional[str], device_type: str,
+                 facility: int, level: str, source: str, message: str, raw_message: str,
+                 extra_data: Dict[str, Any]):
+        self.hostname = hostname
+        self.ip_address = ip_address
+        self.mac_address = mac_address
+        self.device_type = device_type
+        self.facility = facility
+        self.level = level
+        self.source = source
+        self.message = message
+        self.raw_message = raw_message
+        self.extra_data = extra_data
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"ParsedLog({fields})"
+
+
+class VendorParser(ABC):
+    """Basis der registrierten Format-Parser (siehe register_parser).
+
+    parse bekommt die Nachricht samt Position hinter <PRI> und gibt None zurück, wenn das
+    Format nicht passt. Vor dem Regex prüft jeder Parser billig Präfix bzw. erstes Zeichen,
+    damit ein Fehlversuch fast nichts kostet. first_chars (mögliche erste Zeichen hinter
+    <PRI>, None = beliebig) bestimmt, in welchen Ketten der Parser überhaupt vorkommt.
+    generic: der Parser nimmt fast alles an (Auffangformat) und wird daher nicht pro Absender
+    gemerkt - sonst überginge er spezifischere Parser davor in der Kette.
+    """
+
+    name = ''
+    priority = 100  # kleiner = früher in der Kette
+    first_chars: Optional[frozenset] = None
+    generic = False
+
+    @abstractmethod
+    def parse(self, raw: str, pos: int, fac: int, lvl: str, sender_ip: str) -> Optional[ParsedLog]:
+        ...
+
+
+# name -> Parser-Instanz (Reihenfolge der Kette über priority)
+PARSERS: Dict[str, VendorParser] = {}
+
+
+def register_parser(cls):
+    """Klassen-Decorator: Parser unter cls.name registrieren (gleicher Name ersetzt den alten)."""
+    PARSERS[cls.name] = cls()
+    return cls
+
+
+@register_parser
+class UniFiNetconsoleParser(VendorParser):
+    """Pattern 1: UniFi Netconsole - {hex} ist KEINE Device-ID, Hostname ist die IP."""
+
+    name = 'netconsole'
+    priority = 10
+    first_chars = frozenset('{')
+
+    def parse(self, raw, pos, fac, lvl, sender_ip):
+        if raw[pos:pos + 1] != '{':
+            return None
+        m = UNIFI_NETCONSOLE.match(raw, pos)
+        if not m and '[' in raw:
+            m = UNIFI_NETCONSOLE_TAG_FALLBACK.match(raw, pos)
+        if not m:
+            return None
+        hex_seq, source, msg = m.groups()
+        # IP als Hostname, NICHT hex_seq!
+        return ParsedLog(sender_ip, sender_ip, None, 'unifi_ap', fac, lvl, source, msg, raw,
+                         {'format': 'netconsole', 'sequence': hex_seq})
+
+
+@register_parser
+class UniFiMacModelParser(VendorParser):
+    """Pattern 2: UniFi MAC/Model - MAC als Hostname."""
+
+    name = 'mac_model'
+    priority = 20
+    first_chars = HEX_CHARS
+
+    def parse(self, raw, pos, fac, lvl, sender_ip):
+        if raw[pos:pos + 1] not in HEX_CHARS or raw[pos + 12:pos + 13] != ',':
+            return None
+        m = UNIFI_MAC_MODEL.match(raw, pos)
+        if not m:
+            return None
+        mac_raw, model, source, msg = m.groups()
+        mac = SyslogParser.format_mac(mac_raw)
+        return ParsedLog(mac, sender_ip, mac, 'unifi_ap', fac, lvl, source, msg, raw,
+                         {'format': 'mac_model', 'model': model})
+
+
+@register_parser
+class RFC5424Parser(VendorParser):
+    """Pattern 4: RFC 5424 inkl. Structured Data."""
+
+    name = 'rfc5424'
+    priority = 30
+    first_chars = frozenset('1')
+
+    @staticmethod
+    def parse_structured_data(raw: str, pos: int) -> Tuple[Dict[str, Dict[str, str]], int]:
+        """RFC 5424 STRUCTURED-DATA ab pos lesen -> ({sd_id: {param: wert}}, Endposition)."""
+        sd = {}
+        while True:
+            m = RFC5424_SD_ELEMENT.match(raw, pos)
+            if not m:
+                return sd, pos
+            params = {}
+            for name, value in RFC5424_SD_PARAM.findall(m.group(2)):
+                params[name] = RFC5424_SD_ESCAPE.sub(r'\1', value) if '\\' in value else value
+            sd[m.group(1)] = params
+            pos = m.end()
+
+    def parse(self, raw, pos, fac, lvl, sender_ip):
+        if raw[pos:pos + 2] != '1 ':
+            return None
+        m = RFC5424_HEADER.match(raw, pos)
+        if not m:
+            return None
+        ts, host, app, procid, msgid = m.groups()
+        pos = m.end()
+        extra: Dict[str, Any] = {'format': 'rfc5424'}
+        if procid != '-':
+            extra['procid'] = procid
+        if msgid != '-':
+            extra['msgid'] = msgid
+
+        if raw[pos:pos + 1] == '-':
+            pos += 1
+        else:
+            sd, pos = self.parse_structured_data(raw, pos)
+            if not sd:
+                return None
+            extra['structured_data'] = sd
+
+        msg = raw[pos + 1:] if raw[pos:pos + 1] == ' ' else raw[pos:]
+        if msg[:1] == '\ufeff':
+            msg = msg[1:]
+        return ParsedLog(sender_ip if host == '-' else host, sender_ip, None, 'syslog', fac, lvl,
+                         'unknown' if app == '-' else app, msg, raw, extra)
+
+
+@register_parser
+class FortinetParser(VendorParser):
+    """Pattern 6: FortiGate key=value - devname als Hostname, Level aus dem Log selbst."""
+
+    name = 'fortinet'
+    priority = 40
+    first_chars = frozenset('dl')
+    # Übernommene Felder (ein Traffic-Log hat 40+ Paare, die meisten sind für die Suche wertlos)
+    FIELDS = ('devid', 'logid', 'type', 'subtype', 'vd', 'action', 'policyid', 'srcip', 'srcport',
+              'srcintf', 'dstip', 'dstport', 'dstintf', 'proto', 'service', 'user')
+    LEVELS = {'information': 'info', 'emergency': 'emergency', 'alert': 'alert', 'critical': 'critical',
+              'error': 'error', 'warning': 'warning', 'notice': 'notice', 'debug': 'debug'}
+
+    @staticmethod
+    def value(fields: Dict[str, str], key: str) -> Optional[str]:
+        """Wert ohne Anführungszeichen (None, wenn nicht vorhanden oder leer)."""
+        value = fields.get(key)
+        if value and value[0] == '"':
+            value = value[1:-1].replace('\\"', '"')
+        return value or None
+
+    def parse(self, raw, pos, fac, lvl, sender_ip):
+        if not raw.startswith(('date=', 'logver='), pos):
+            return None
+        # Rohwerte per C-Schleife einsammeln, Anführungszeichen nur bei übernommenen Feldern entfernen
+        fields = dict(FORTINET_KV.findall(raw, pos))
+        value = self.value
+        extra: Dict[str, Any] = {'format': 'fortinet'}
+        for key in self.FIELDS:
+            if key in fields:
+                extra[key] = value(fields, key)
+        return ParsedLog(value(fields, 'devname') or sender_ip, sender_ip, None, 'fortigate', fac,
+                         self.LEVELS.get(value(fields, 'level'), lvl),
+                         value(fields, 'subtype') or value(fields, 'type') or 'fortinet',
+                         value(fields, 'msg') or value(fields, 'logdesc') or raw[pos:], raw, extra)
+
+
+@register_parser
+class WindowsNXLogParser(VendorParser):
+    """Pattern 9: Windows Eventlog über NXLog (to_json), mit oder ohne BSD-Header."""
+
+    name = 'windows'
+    priority = 50
+    first_chars = MONTH_INITIALS | {'{'}
+    # NXLog-Feld -> extra_data
+    FIELDS = {'EventID': 'event_id', 'Channel': 'channel', 'Category': 'category', 'RecordNumber': 'record_number',
+              'Domain': 'domain', 'AccountName': 'account', 'ProcessID': 'process_id'}
+    LEVELS = {'CRITICAL': 'critical', 'ERROR': 'error', 'AUDIT_FAILURE': 'warning', 'WARNING': 'warning',
+              'INFO': 'info', 'AUDIT_SUCCESS': 'info', 'VERBOSE': 'debug'}
+
+    def parse(self, raw, pos, fac, lvl, sender_ip):
+        brace = raw.find('{"', pos)
+        if brace < 0:
+            return None
+        host = None
+        if brace > pos:
+            m = NXLOG_BSD_HEADER.fullmatch(raw, pos, brace)
+            if not m:
+                return None
+            host = m.group(1)
+        try:
+            event = json.loads(raw[brace:])
+        except ValueError:
+            return None
+        if not isinstance(event, dict) or 'EventID' not in event:
+            return None
+        extra: Dict[str, Any] = {'format': 'windows'}
+        for key, name in self.FIELDS.items():
+            if event.get(key) is not None:
+                extra[name] = event[key]
+        return ParsedLog(str(event.get('Hostname') or host or sender_ip), sender_ip, None, 'windows', fac,
+                         self.LEVELS.get(event.get('EventType'), lvl),
+                         str(event.get('SourceName') or event.get('Channel') or 'windows'),
+                         str(event.get('Message') or ''), raw, extra)
+
+
+@register_parser
+class PfSenseParser(VendorParser):
+    """Pattern 7: pfSense/FreeBSD - BSD-Header ohne Hostname, filterlog-CSV wird zerlegt."""
+
+    name = 'pfsense'
+    priority = 60
+    first_chars = MONTH_INITIALS
+
+    @staticmethod
+    def filterlog(csv: str) -> Dict[str, Any]:
+        """filterlog-CSV (IPv4/IPv6) -> Regel, Interface, Aktion, Protokoll, Adressen, Ports."""
+        f = csv.split(',')
+        if len(f) < 9:
+            return {}
+        extra = {'rule': f[0], 'interface': f[4], 'reason': f[5], 'action': f[6], 'direction': f[7]}
+        if f[8] == '4' and len(f) > 19:
+            proto, src, dst, ports = f[16], f[18], f[19], 20
+        elif f[8] == '6' and len(f) > 16:
+            proto, src, dst, ports = f[12], f[15], f[16], 17
+        else:
+            return extra
+        extra.update(proto=proto, src=src, dst=dst)
+        if proto in ('tcp', 'udp') and len(f) > ports + 1:
+            extra.update(src_port=f[ports], dst_port=f[ports + 1])
+        return extra
+
+    def parse(self, raw, pos, fac, lvl, sender_ip):
+        if raw[pos:pos + 3] not in MONTHS:
+            return None
+        m = BSD_NO_HOST.match(raw, pos)
+        if not m:
+            return None
+        ts, source, msg = m.groups()
+        if source != 'filterlog':
+            # Andere Dienste (oder FreeBSD/Linux ohne Hostname im Header): normales BSD
+            return ParsedLog(sender_ip, sender_ip, None, 'syslog', fac, lvl, source, msg, raw, EXTRA_BSD)
+        extra: Dict[str, Any] = {'format': 'pfsense'}
+        extra.update(self.filterlog(msg))
+        return ParsedLog(sender_ip, sender_ip, None, 'pfsense', fac, lvl, source, msg, raw, extra)
+
+
+@register_parser
+class MikroTikParser(VendorParser):
+    """Pattern 8: MikroTik RouterOS - erstes Topic als Source, BSD-Header optional."""
+
+    name = 'mikrotik'
+    priority = 70
+    first_chars = MONTH_INITIALS | frozenset('abcdefghijklmnopqrstuvwxyz')
+
+    def parse(self, raw, pos, fac, lvl, sender_ip):
+        if raw[pos:pos + 3] not in MONTHS:
+            # Ohne Header: Topics sind das erste Wort und enthalten mindestens ein Komma
+            space = raw.find(' ', pos)
+            if space < 0 or raw.find(',', pos, space) < 0:
+                return None
+        m = MIKROTIK.match(raw, pos)
+        if not m:
+            return None
+        host, topics, msg = m.groups()
+        # Ohne Severity-Topic ist es nur Text mit Komma am Anfang
+        if MIKROTIK_SEVERITIES.isdisjoint(topics.split(',')):
+            return None
+        return ParsedLog(host or sender_ip, sender_ip, None, 'mikrotik', fac, lvl, topics.partition(',')[0],
+                         msg, raw, {'format': 'mikrotik', 'topics': topics})
+
+
+@register_parser
+class BSDParser(VendorParser):
+    """Pattern 3: BSD Syslog (RFC 3164) mit Hostname."""
+
+    name = 'bsd'
+    priority = 80
+    first_chars = MONTH_INITIALS
+    generic = True
+
+    def parse(self, raw, pos, fac, lvl, sender_ip):
+        if raw[pos:pos + 3] not in MONTHS:
+            return None
+        m = BSD_SYSLOG.match(raw, pos)
+        if not m and '[' in raw:
+            m = BSD_SYSLOG_TAG_FALLBACK.match(raw, pos)
+        if not m:
+            return None
+        ts, host, source, msg = m.groups()
+        return ParsedLog(host, sender_ip, None, 'syslog', fac, lvl, source, msg, raw, EXTRA_BSD)
 
 
 class SyslogParser:
-    """Parst verschiedene Syslog-Formate inkl. UniFi."""
+    """Parst Syslog über die registrierten Format-Parser (PARSERS).
+
+    Die Priority wird einmal gelesen, danach läuft die Parser-Kette nach priority - nur mit
+    den Parsern, die das erste Zeichen dahinter akzeptieren. Ein Absender nutzt praktisch immer
+    dasselbe Format: der zuletzt passende Parser wird pro Absender-IP gemerkt (begrenzt auf
+    PARSER_CACHE_SIZE) und zuerst probiert, die Kette läuft nur bei Fehlgriffen. Auffang-Parser
+    (generic, z.B. bsd) werden nicht gemerkt: das Ergebnis hängt nie von früheren Nachrichten ab.
+    """
+
+    def __init__(self, enabled: str = SYSLOG_PARSERS, cache_size: int = PARSER_CACHE_SIZE):
+        names = list(PARSERS) if enabled == 'all' else [name.strip() for name in enabled.split(',') if name.strip()]
+        unknown = [name for name in names if name not in PARSERS]
+        if unknown:
+            raise ValueError(f"Unbekannte SYSLOG_PARSERS {', '.join(unknown)} (erlaubt: {', '.join(PARSERS)})")
+        self.parsers = sorted((PARSERS[name] for name in names), key=lambda p: p.priority)
+        # Erstes Zeichen hinter <PRI> -> parse-Methoden der in Frage kommenden Parser
+        # (Rest: nur die ohne first_chars); gebundene Methoden sparen den Lookup pro Aufruf
+        methods = {p: p.parse for p in self.parsers}
+        chars = set().union(*(p.first_chars for p in self.parsers if p.first_chars is not None))
+        self._chains = {char: tuple(methods[p] for p in self.parsers if p.first_chars is None or char in p.first_chars)
+                        for char in chars}
+        self._any_chain = tuple(methods[p] for p in self.parsers if p.first_chars is None)
+        self._generic = frozenset(methods[p] for p in self.parsers if p.generic)
+        self.cache_size = cache_size
+        # Absender-IP -> parse-Methode des zuletzt passenden Parsers (Einfügereihenfolge = Alter)
+        self._by_sender: Dict[str, Callable[..., Optional[ParsedLog]]] = {}
 
     @staticmethod
     def parse_priority(pri: int) -> Tuple[int, str]:
@@ -77,311 +724,1865 @@ class SyslogParser:
     @staticmethod
     def format_mac(mac: str) -> str:
         """Formatiert MAC: aabbccddeeff -> aa:bb:cc:dd:ee:ff"""
-        return ':'.join(mac[i:i+2].lower() for i in range(0, 12, 2))
+        mac = mac.lower()
+        return f"{mac[0:2]}:{mac[2:4]}:{mac[4:6]}:{mac[6:8]}:{mac[8:10]}:{mac[10:12]}"
 
-    def parse(self, raw: str, sender_ip: str) -> Dict[str, Any]:
+    def parse(self, raw: str, sender_ip: str) -> ParsedLog:
         """Parst eine Syslog-Nachricht."""
         raw = raw.strip()
-        result = {
-            'hostname': sender_ip,
-            'ip_address': sender_ip,
-            'mac_address': None,
-            'device_type': 'syslog',
-            'facility': 1,
-            'level': 'info',
-            'source': 'unknown',
-            'message': raw,
-            'raw_message': raw,
-            'extra_data': {}
-        }
-
-        # Pattern 1: UniFi Netconsole - {hex} ist KEINE Device-ID!
-        m = UNIFI_NETCONSOLE.match(raw)
-        if m:
-            pri, hex_seq, source, msg = m.groups()
-            fac, lvl = self.parse_priority(int(pri))
-            result.update({
-                'hostname': sender_ip,  # IP als Hostname, NICHT hex_seq!
-                'facility': fac,
-                'level': lvl,
-                'source': source,
-                'message': msg,
-                'device_type': 'unifi_ap',
-                'extra_data': {'format': 'netconsole', 'sequence': hex_seq}
-            })
-            return result
-
-        # Pattern 2: UniFi MAC/Model
-        m = UNIFI_MAC_MODEL.match(raw)
-        if m:
-            pri, mac_raw, model, source, msg = m.groups()
-            fac, lvl = self.parse_priority(int(pri))
-            mac = self.format_mac(mac_raw)
-            result.update({
-                'hostname': mac,  # MAC als Hostname
-                'mac_address': mac,
-                'facility': fac,
-                'level': lvl,
-                'source': source,
-                'message': msg,
-                'device_type': 'unifi_ap',
-                'extra_data': {'format': 'mac_model', 'model': model}
-            })
-            return result
-
-        # Pattern 3: BSD Syslog
-        m = BSD_SYSLOG.match(raw)
-        if m:
-            pri, ts, host, source, msg = m.groups()
-            fac, lvl = self.parse_priority(int(pri))
-            result.update({
-                'hostname': host,
-                'facility': fac,
-                'level': lvl,
-                'source': source,
-                'message': msg,
-                'extra_data': {'format': 'bsd'}
-            })
-            return result
-
-        # Pattern 4: Simple
-        m = SIMPLE.match(raw)
-        if m:
-            pri, msg = m.groups()
-            fac, lvl = self.parse_priority(int(pri))
-            result.update({'facility': fac, 'level': lvl, 'message': msg})
 
-        return result
+        if raw[:1] == '<':
+            end = raw.find('>', 1, 5)
+            pri_text = raw[1:end] if end > 1 else ''
+            if pri_text.isdecimal():
+                pri = int(pri_text)
+                fac, lvl = PRIORITIES[pri] if pri < 192 else self.parse_priority(pri)
+                pos = end + 1
+
+                cached = self._by_sender.get(sender_ip)
+                if cached is not None:
+                    parsed = cached(raw, pos, fac, lvl, sender_ip)
+                    if parsed is not None:
+                        return parsed
+                for vendor_parse in self._chains.get(raw[pos:pos + 1], self._any_chain):
+                    if vendor_parse is not cached:
+                        parsed = vendor_parse(raw, pos, fac, lvl, sender_ip)
+                        if parsed is not None:
+                            if vendor_parse not in self._generic:
+                                self._remember(sender_ip, vendor_parse)
+                            return parsed
+
+                # Pattern 5: Nur Priority
+                return ParsedLog(sender_ip, sender_ip, None, 'syslog', fac, lvl, 'unknown',
+                                 raw[pos:].lstrip(), raw, EXTRA_NONE)
+
+        return ParsedLog(sender_ip, sender_ip, None, 'syslog', 1, 'info', 'unknown', raw, raw, EXTRA_NONE)
+
+    def _remember(self, sender_ip: str, vendor_parse: Callable[..., Optional[ParsedLog]]):
+        """Parser für den Absender merken; bei vollem Cache fliegt die älteste Zuordnung."""
+        by_sender = self._by_sender
+        # Nur ein Wechsel, wenn der Absender schon einen anderen Parser hatte (nicht der erste Treffer)
+        if by_sender.pop(sender_ip, None) is not None:
+            stats.incr('parser_switches')
+        by_sender[sender_ip] = vendor_parse
+        if len(by_sender) > self.cache_size:
+            del by_sender[next(iter(by_sender))]
+
+
+# Marker für "nicht im Cache" (None ist ein gültiger, negativ gecachter Wert)
+CACHE_MISS = object()
+
+
+class AgentCache:
+    """Größenbegrenzter LRU-Cache key -> agent_id mit TTL.
+
+    Einträge laufen nach ttl (±10 % Jitter, damit vorgeladene Einträge nicht alle
+    gleichzeitig ablaufen) ab und werden dann aus der DB aufgefrischt. agent_id None ist
+    ein negativer Eintrag: der Lookup ist kürzlich fehlgeschlagen, Logs werden bis zum
+    Ablauf ohne Agent gespeichert statt die DB bei jeder Nachricht erneut zu fragen.
+    """
+
+    def __init__(self, max_size: int = AGENT_CACHE_SIZE, ttl: float = AGENT_CACHE_TTL,
+                 negative_ttl: float = AGENT_NEGATIVE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # key -> (agent_id | None, expires)
+        self._entries: 'OrderedDict[str, Tuple[Optional[int], float]]' = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str):
+        """agent_id (oder None bei negativem Eintrag) bzw. CACHE_MISS."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return CACHE_MISS
+        if entry[1] < time.monotonic():
+            del self._entries[key]
+            return CACHE_MISS
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: str, agent_id: Optional[int]):
+        ttl = self.negative_ttl if agent_id is None else self.ttl * random.uniform(0.9, 1.1)
+        self._entries[key] = (agent_id, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            stats.incr('agent_cache_evicted')
+
+
+class Spool:
+    """Write-Ahead-Spool: append-only, memory-mapped Segmentdateien für Log-Batches.
+
+    Batches, die nicht in die DB geschrieben werden können (DB weg, Pipeline voll),
+    landen hier und werden vom Replayer wieder per COPY eingespielt, sobald die DB
+    erreichbar ist. Record-Format: [Länge u32][CRC32 u32][JSON-Payload]; eine Länge
+    von 0 (vorallokierte Nullen) oder ein CRC-Fehler markiert das Segmentende.
+    Die Replay-Position steht in 'cursor' (at-least-once nach einem Absturz).
+    """
+
+    HEADER = struct.Struct('<II')
+
+    def __init__(self, path: str, max_bytes: int = SPOOL_MAX_BYTES,
+                 segment_bytes: int = SPOOL_SEGMENT_BYTES, fsync: str = SPOOL_FSYNC):
+        if fsync not in ('always', 'interval', 'never'):
+            raise ValueError(f"Unbekannte SPOOL_FSYNC Policy '{fsync}' (erlaubt: always, interval, never)")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+        # Abgeschlossene Segmente (älteste zuerst) und ihre Größe auf Platte
+        self._sealed = deque()
+        self._sizes: Dict[int, int] = {}
+        for name in sorted(os.listdir(path)):
+            if name.startswith('seg-') and name.endswith('.spool'):
+                seq = int(name[4:-6])
+                self._sealed.append(seq)
+                self._sizes[seq] = os.path.getsize(os.path.join(path, name))
+        self._cursor = self._load_cursor()
+        # Aktives Segment (lazy angelegt). Nie unter der Cursor-Nummer beginnen: sonst
+        # bezöge ein alter Cursor sein Offset auf ein neues Segment mit derselben Nummer
+        self._seq = max(self._sealed[-1] if self._sealed else 0, self._cursor[0]) + 1
+        self._fd = None
+        self._mm = None
+        self._used = 0
+        self._dirty = False
+        self._last_sync = time.monotonic()
+        if self._sealed:
+            logger.warning(f"Spool {path}: {len(self._sealed)} Segmente ({self.size} Bytes) warten auf Replay")
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.path, f"seg-{seq:012d}.spool")
+
+    def _load_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.path, 'cursor'), encoding='ascii') as f:
+                seq, offset = f.read().split()
+                return int(seq), int(offset)
+        except (OSError, ValueError):
+            return 0, 0
+
+    def _save_cursor(self):
+        tmp = os.path.join(self.path, 'cursor.tmp')
+        with open(tmp, 'w', encoding='ascii') as f:
+            f.write(f"{self._cursor[0]} {self._cursor[1]}")
+        os.replace(tmp, os.path.join(self.path, 'cursor'))
+
+    @property
+    def size(self) -> int:
+        """Belegte Bytes (abgeschlossene Segmente + aktiver Teil)."""
+        return sum(self._sizes.values()) + self._used
+
+    @property
+    def empty(self) -> bool:
+        return not self._sealed and not self._used
+
+    def append(self, payload: bytes) -> bool:
+        """Record anhängen; False wenn SPOOL_MAX_BYTES erreicht ist."""
+        needed = self.HEADER.size + len(payload)
+        if self.size + needed > self.max_bytes:
+            return False
+        if self._mm is not None and self._used + needed > len(self._mm):
+            self.seal()
+        if self._mm is None:
+            self._open_segment(max(self.segment_bytes, needed))
+        self.HEADER.pack_into(self._mm, self._used, len(payload), zlib.crc32(payload))
+        self._mm[self._used + self.HEADER.size:self._used + needed] = payload
+        self._used += needed
+        self._dirty = True
+        if self.fsync == 'always':
+            self.sync()
+        elif self.fsync == 'interval':
+            self.sync_if_due()
+        return True
+
+    def _open_segment(self, size: int):
+        self._fd = os.open(self._segment_path(self._seq), os.O_RDWR | os.O_CREAT, 0o600)
+        os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+        self._used = 0
+
+    def sync(self):
+        if self._mm is not None and self._dirty:
+            self._mm.flush()
+        self._dirty = False
+        self._last_sync = time.monotonic()
+
+    def sync_if_due(self):
+        if self._dirty and time.monotonic() - self._last_sync >= SPOOL_FSYNC_INTERVAL:
+            self.sync()
+
+    def seal(self):
+        """Aktives Segment abschließen (auf genutzte Größe kürzen) und zum Replay freigeben."""
+        if self._mm is None:
+            return
+        self._mm.flush()
+        self._mm.close()
+        os.ftruncate(self._fd, self._used)
+        if self.fsync != 'never':
+            os.fsync(self._fd)
+        os.close(self._fd)
+        self._sealed.append(self._seq)
+        self._sizes[self._seq] = self._used
+        self._seq += 1
+        self._fd = self._mm = None
+        self._used = 0
+        self._dirty = False
+
+    def peek(self) -> Optional[Tuple[int, int, bytes]]:
+        """Nächsten Record für den Replay lesen: (Segment, Folge-Offset, Payload) oder None."""
+        if not self._sealed and self._used:
+            self.seal()
+        while self._sealed:
+            seq = self._sealed[0]
+            offset = self._cursor[1] if self._cursor[0] == seq else 0
+            with open(self._segment_path(seq), 'rb') as f:
+                f.seek(offset)
+                header = f.read(self.HEADER.size)
+                if len(header) == self.HEADER.size:
+                    length, crc = self.HEADER.unpack(header)
+                    payload = f.read(length) if length else b''
+                    if length and len(payload) == length and zlib.crc32(payload) == crc:
+                        return seq, offset + self.HEADER.size + length, payload
+            # Segmentende (oder beschädigter Rest nach Absturz): Segment ist abgearbeitet
+            os.unlink(self._segment_path(seq))
+            self._sealed.popleft()
+            del self._sizes[seq]
+            if self._cursor[0] == seq:
+                self._cursor = (0, 0)
+                self._save_cursor()
+        return None
+
+    def ack(self, seq: int, offset: int):
+        """Record als eingespielt markieren."""
+        self._cursor = (seq, offset)
+        self._save_cursor()
+
+    def close(self):
+        self.seal()
+
+
+class BatchController:
+    """Passt Batchgröße und Linger-Zeit an Last und gemessene COPY-Latenz an.
+
+    - Stau (Ingest-Queue > eine Batchgröße oder halbe Pipeline belegt): Batchgröße
+      verdoppeln, weniger COPYs mit mehr Zeilen.
+    - COPY braucht mehr als das halbe Latenzziel: Batchgröße verkleinern.
+    - Leerlauf: Batchgröße langsam Richtung Minimum.
+    - Linger = min(erwartete Füllzeit, Latenzziel - COPY-Latenz), begrenzt auf
+      [BATCH_LINGER_MIN, BATCH_INTERVAL]; bei wenig Traffic wird also nicht
+      sekundenlang auf fast leere Batches gewartet.
+    Ohne BATCH_ADAPTIVE bleiben BATCH_SIZE und BATCH_INTERVAL fest.
+    """
+
+    ALPHA = 0.2  # Gewicht neuer Messwerte in den EWMAs
+
+    def __init__(self, adaptive: bool = BATCH_ADAPTIVE):
+        self.adaptive = adaptive
+        self.size = min(max(BATCH_SIZE, BATCH_SIZE_MIN), BATCH_SIZE_MAX) if adaptive else BATCH_SIZE
+        self.linger = BATCH_INTERVAL
+        self.copy_latency = 0.0   # EWMA Sekunden pro COPY
+        self.batch_latency = 0.0  # EWMA erste Zeile im Batch -> COPY fertig
+        self.rate = 0.0           # EWMA Logs/s
+        self._last_tick = time.monotonic()
+
+    def observe(self, copy_seconds: float, batch_seconds: float):
+        """Messwerte eines geschriebenen Batches."""
+        a = self.ALPHA
+        self.copy_latency += a * (copy_seconds - self.copy_latency)
+        self.batch_latency += a * (batch_seconds - self.batch_latency)
+
+    def tick(self, rows: int, queue_depth: int, inflight: int):
+        """Entscheidung neu treffen (einmal pro Flush-Zyklus, rows = seitdem gepufferte Logs)."""
+        now = time.monotonic()
+        elapsed = now - self._last_tick
+        if elapsed > 0:
+            self.rate += self.ALPHA * (rows / elapsed - self.rate)
+        self._last_tick = now
+
+        if self.adaptive:
+            if queue_depth > self.size or inflight > MAX_INFLIGHT_BATCHES // 2:
+                self.size = min(self.size * 2, BATCH_SIZE_MAX)
+            elif self.copy_latency > BATCH_TARGET_LATENCY / 2:
+                self.size = max(int(self.size * 0.75), BATCH_SIZE_MIN)
+            elif not queue_depth and not inflight:
+                self.size = max(int(self.size * 0.9), BATCH_SIZE_MIN)
+
+            fill_time = self.size / self.rate if self.rate > 0 else BATCH_INTERVAL
+            linger = min(fill_time, BATCH_TARGET_LATENCY - self.copy_latency)
+            self.linger = min(max(linger, BATCH_LINGER_MIN), BATCH_INTERVAL)
+
+        stats.set('batch_size', self.size)
+        stats.set('batch_linger_ms', int(self.linger * 1000))
+        stats.set('copy_latency_ms', int(self.copy_latency * 1000))
+        stats.set('batch_latency_ms', int(self.batch_latency * 1000))
+
+
+class RowEncoder:
+    """Kodiert Log-Zeilen direkt ins binäre COPY-Format (PGCOPY).
+
+    Eine Zeile besteht aus Kopf (Feldanzahl, agent_id, ip_address), source_id und Rest ("tail").
+    Der Rest wird beim Puffern genau einmal kodiert; bei unbekanntem Absender wird der Kopf erst
+    nach der Agent-Auflösung davorgesetzt, source_id setzt der DatabaseManager (Source-Cache).
+    hostname/ip_address stehen in agents; nur Zeilen ohne Agent (Auflösung fehlgeschlagen)
+    behalten die Absender-IP in ip_address. level steht als severity (smallint). Die wenigen
+    extra_data-Formen liegen als fertige Felder im Cache, json.dumps läuft nur noch für
+    RFC 5424 Structured Data.
+
+    RAW_STORAGE=compact: endet raw_message auf message (bei allen Parser-Formaten der Fall),
+    wird nur der Teil davor als raw_prefix gespeichert und raw_message bleibt NULL;
+    lesend gilt raw_message = raw_prefix || message.
+    """
+
+    STORAGE_MODES = ('full', 'compact')
+
+    NULL = struct.pack('!i', -1)
+    _LEN = struct.Struct('!i').pack
+    _INT4 = struct.Struct('!ii').pack   # Länge 4 + int4
+    _INT8 = struct.Struct('!iq').pack   # Länge 8 + int8
+    _HEAD = struct.Struct('!hiii').pack  # Feldanzahl + Länge 4 + agent_id + ip_address NULL
+    _TS_FACILITY = struct.Struct('!iqii').pack  # timestamp + facility in einem Aufruf
+    _NETCONSOLE = b'\x01{"format": "netconsole", "sequence": "'
+
+    def __init__(self, max_interned: int = 65536, raw_storage: str = RAW_STORAGE):
+        if raw_storage not in self.STORAGE_MODES:
+            raise ValueError(f"Unbekannter RAW_STORAGE '{raw_storage}' (erlaubt: {', '.join(self.STORAGE_MODES)})")
+        self.max_interned = max_interned
+        self.compact = raw_storage == 'compact'
+        self._models: Dict[str, bytes] = {}
+        # level -> severity als int2-Feld (unbekannt: NULL)
+        self._severity = {name: struct.pack('!ih', 2, severity) for name, severity in LEVEL_SEVERITY.items()}
+        # Geteilte Konstanten des Parsers (leben so lange wie das Modul, id() ist stabil)
+        self._extra_const = {id(EXTRA_NONE): self._jsonb(EXTRA_NONE), id(EXTRA_BSD): self._jsonb(EXTRA_BSD)}
+        # Kopf ohne Agent bis vor ip_address
+        self._head_null = struct.pack('!h', len(LOG_COLUMNS)) + self.NULL
+        # repeat_count 1, first_timestamp/last_timestamp NULL
+        self._once = self._INT4(4, 1) + self.NULL + self.NULL
+
+    @classmethod
+    def _jsonb(cls, value: Dict[str, Any]) -> bytes:
+        data = b'\x01' + json.dumps(value).encode()  # jsonb binär: Version 1 + Text
+        return cls._LEN(len(data)) + data
+
+    @staticmethod
+    def micros(ts: float) -> int:
+        """Unix-Zeit -> PostgreSQL timestamp (Mikrosekunden seit 2000-01-01, UTC)."""
+        return int((ts - PG_EPOCH) * 1000000)
+
+    def _text(self, value: Optional[str]) -> bytes:
+        if value is None:
+            return self.NULL
+        data = value.encode()
+        return self._LEN(len(data)) + data
+
+    def _extra(self, extra: Dict[str, Any]) -> bytes:
+        field = self._extra_const.get(id(extra))
+        if field is not None:
+            return field
+        fmt = extra.get('format')
+        if fmt == 'netconsole' and len(extra) == 2:
+            # sequence ist laut Regex reines Hex, kein Escaping nötig
+            data = self._NETCONSOLE + extra['sequence'].encode() + b'"}'
+            return self._LEN(len(data)) + data
+        if fmt == 'mac_model' and len(extra) == 2:
+            model = extra['model']
+            field = self._models.get(model)
+            if field is None:
+                field = self._jsonb(extra)
+                if len(self._models) < self.max_interned:
+                    self._models[model] = field
+            return field
+        return self._jsonb(extra)
+
+    def head(self, agent_id: Optional[int], ip_address: str) -> bytes:
+        """Zeilenkopf; ohne Agent bleibt wenigstens die Absender-IP in der Zeile."""
+        if agent_id is None:
+            return self._head_null + self._text(ip_address[:45])
+        return self._HEAD(len(LOG_COLUMNS), 4, agent_id, -1)
+
+    def tail(self, data: ParsedLog, ts: float, repeat_count: int = 1, first_timestamp: Optional[float] = None,
+             last_timestamp: Optional[float] = None, message_hash: Optional[int] = None) -> bytes:
+        """Alle Felder nach source_id in LOG_COLUMNS-Reihenfolge (Hot Path, daher ausgeschrieben)."""
+        message = data.message.encode()
+        raw = data.raw_message
+        if self.compact and raw.endswith(data.message):
+            raw = self.NULL + self._text(raw[:len(raw) - len(data.message)])
+        else:
+            raw = self._text(raw) + self.NULL
+        extra = self._extra_const.get(id(data.extra_data)) or self._extra(data.extra_data)
+        if first_timestamp is None:
+            repeat = self._once
+        else:
+            repeat = (self._INT4(4, repeat_count) + self._INT8(8, self.micros(first_timestamp))
+                      + self._INT8(8, self.micros(last_timestamp)))
+        return b''.join((
+            self._TS_FACILITY(8, int((ts - PG_EPOCH) * 1000000), 4, data.facility),
+            self._severity.get(data.level, self.NULL), self._LEN(len(message)), message, raw, extra,
+            repeat, self.NULL if message_hash is None else self._INT8(8, message_hash),
+        ))
+
+
+class LogBatch:
+    """Ein Batch binär kodierter COPY-Zeilen samt noch nicht aufgelöster Absender."""
+
+    __slots__ = ('buf', 'count', 'pending', 'created', 'formats', 'sources', 'fixups', 'rollup')
+
+    def __init__(self):
+        # Fertige Zeilen (bekannter Agent) direkt im COPY-Format, Header schon vorne
+        self.buf = bytearray(COPY_HEADER)
+        self.count = 0
+        # Zeitpunkt der ersten Zeile (Batch-Latenz für den BatchController)
+        self.created = 0.0
+        # Unbekannte Absender: key -> (ParsedLog, [tails]) - mehrere Nachrichten
+        # desselben neuen Geräts lösen nur einen Lookup aus
+        self.pending: Dict[str, Tuple[ParsedLog, list]] = {}
+        # Logs pro Format (Metrik stored{format=...})
+        self.formats: Dict[str, int] = {}
+        # Neue Sources: name -> Index k; die Zeilen tragen bis zum Schreiben -(k + 1) als
+        # source_id, fixups sind die Offsets dieser Felder in buf
+        self.sources: Dict[str, int] = {}
+        self.fixups: List[int] = []
+        # Zähler für logs_rollup: (Minute, agent_id, severity, source) -> Zeilen; agent_id ist
+        # bei offenen Absendern bis zur Auflösung deren Schlüssel in pending
+        self.rollup: Dict[tuple, int] = {}
+
+    def __len__(self):
+        return self.count
+
+
+class DedupEntry:
+    """Zustand einer Nachricht im Dedup-Fenster."""
+
+    __slots__ = ('data', 'message_hash', 'first_seen', 'repeats', 'first_repeat', 'last_repeat')
+
+    def __init__(self, data: ParsedLog, message_hash: int, now: float):
+        self.data = data
+        self.message_hash = message_hash
+        self.first_seen = now
+        self.repeats = 0
+        self.first_repeat = 0.0
+        self.last_repeat = 0.0
+
+
+class DedupWindow:
+    """Unterdrückt identische (Absender, source, message) innerhalb von DEDUP_WINDOW Sekunden.
+
+    Das erste Vorkommen wird sofort geschrieben; Wiederholungen werden nur gezählt
+    und nach Ablauf des Fensters als eine Zeile mit repeat_count und erstem/letztem
+    Zeitpunkt geschrieben. Ein Burst ergibt also zwei Zeilen: das Original (repeat_count 1)
+    und die Zusammenfassung (repeat_count = Anzahl Wiederholungen ohne das Original).
+    Das Original wird nicht per UPDATE angepasst: COPY liefert keine id, die Zeile kann
+    noch im Batch oder Spool liegen, und logs bleibt append-only.
+
+    Einträge liegen in Einfügereihenfolge (= first_seen), daher läuft die Ablaufprüfung
+    nur über den Anfang; bei DEDUP_MAX_ENTRIES wird der älteste Eintrag vorzeitig
+    abgeschlossen.
+    """
+
+    def __init__(self, window: float = DEDUP_WINDOW, max_entries: int = DEDUP_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, int], DedupEntry]' = OrderedDict()
+        # Abgeschlossene Einträge mit Wiederholungen, die noch geschrieben werden müssen
+        self._done = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def message_hash(source: str, message: str) -> int:
+        """64-Bit BLAKE2b über source + message (passt in BIGINT)."""
+        digest = hashlib.blake2b(f"{source}\x00{message}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big', signed=True)
+
+    def seen(self, key: Tuple[str, int], data: ParsedLog, message_hash: int, now: float) -> bool:
+        """True = Wiederholung innerhalb des Fensters (nicht schreiben)."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now - entry.first_seen < self.window:
+                if not entry.repeats:
+                    entry.first_repeat = now
+                entry.repeats += 1
+                entry.last_repeat = now
+                return True
+            del self._entries[key]
+            if entry.repeats:
+                self._done.append(entry)
+        elif len(self._entries) >= self.max_entries:
+            _, oldest = self._entries.popitem(last=False)
+            if oldest.repeats:
+                self._done.append(oldest)
+        self._entries[key] = DedupEntry(data, message_hash, now)
+        return False
+
+    def expire(self, now: float) -> list:
+        """Abgelaufene Einträge entfernen; gibt die mit Wiederholungen zurück."""
+        done, self._done = self._done, []
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if now - entry.first_seen < self.window:
+                break
+            del entries[key]
+            if entry.repeats:
+                done.append(entry)
+        return done
+
+    def drain(self) -> list:
+        """Alle offenen Wiederholungen (beim Beenden)."""
+        done = self._done + [entry for entry in self._entries.values() if entry.repeats]
+        self._done = []
+        self._entries.clear()
+        return done
 
 
 class DatabaseManager:
-    """Async PostgreSQL Verbindung mit Agent-Cache und Batch-Inserts."""
+    """Async PostgreSQL Verbindung mit Agent-Cache und Batch-Inserts.
 
-    def __init__(self):
+    Double-Buffering: queue_log füllt den aktuellen Batch und tauscht ihn bei voller Batchgröße
+    nur gegen einen leeren aus. Volle Batches gehen über eine begrenzte Queue
+    (MAX_INFLIGHT_BATCHES) an FLUSH_WRITERS Writer-Tasks, die parallel auf eigenen
+    Pool-Verbindungen COPY ausführen. Produzenten warten nur, wenn die Pipeline voll ist.
+
+    Mit Spool (SPOOL_DIR) gehen Batches bei nicht erreichbarer DB oder voller Pipeline
+    auf Platte statt verloren bzw. den Empfang zu bremsen; replay_loop spielt sie ein.
+    """
+
+    def __init__(self, spool: Optional[Spool] = None, dedup: Optional[DedupWindow] = None):
         self.pool = None
-        # Agent-Cache: key -> (agent_id, timestamp)
-        self._agent_cache = {}
-        # Batch-Buffer fÃ¼r Logs
-        self._log_buffer = []
-        self._buffer_lock = asyncio.Lock()
+        self.spool = spool
+        self.dedup = dedup
+        # False während eines DB-Ausfalls: Writer spoolen direkt, Replayer prüft die DB
+        self.healthy = False
+        self._spool_full_logged = 0.0
+        # Agent-Cache: key -> agent_id (LRU, TTL, negative Einträge)
+        self._agent_cache = AgentCache()
+        # Source-Cache: name -> fertiges source_id-Feld (log_sources wächst nur, daher ohne TTL)
+        self._sources: Dict[str, bytes] = {}
+        # Aktueller Batch-Buffer fÃ¼r Logs
+        self._batch = LogBatch()
+        self.encoder = RowEncoder()
+        self.controller = BatchController()
+        self._ingest_queue = None
+        self._appended = 0
+        # Volle Batches auf dem Weg zu den Writern
+        self._batches: asyncio.Queue = asyncio.Queue(maxsize=MAX_INFLIGHT_BATCHES)
+        self._writers = []
+        self._writing = 0
         # Set von Agent-IDs die ein last_seen Update brauchen
         self._agents_to_update = set()
+        # Zähler gespeicherter Zeilen für logs_rollup (siehe _flush_rollup)
+        self._rollup: Dict[tuple, int] = {}
 
     async def connect(self):
-        """Verbindung herstellen mit Retry."""
-        for i in range(30):
+        """Verbindung herstellen mit Retry.
+
+        Mit Spool startet der Server auch ohne DB (degradiert): Logs werden gespoolt
+        und replay_loop verbindet sich im Hintergrund neu.
+        """
+        attempts = 1 if self.spool is not None else 30
+        for i in range(attempts):
             try:
-                self.pool = await asyncpg.create_pool(
-                    host=DB_HOST, port=DB_PORT, user=DB_USER,
-                    password=DB_PASSWORD, database=DB_NAME,
-                    min_size=2, max_size=10
-                )
-                logger.info(f"DB verbunden: {DB_HOST}:{DB_PORT}/{DB_NAME}")
+                await self._create_pool()
                 return
             except Exception as e:
-                logger.warning(f"DB Verbindung fehlgeschlagen ({i+1}/30): {e}")
-                await asyncio.sleep(2)
+                logger.warning(f"DB Verbindung fehlgeschlagen ({i+1}/{attempts}): {e}")
+                if i + 1 < attempts:
+                    await asyncio.sleep(2)
+        if self.spool is not None:
+            logger.warning("Start ohne DB (degradiert): Logs werden gespoolt")
+            return
         raise Exception("DB Verbindung fehlgeschlagen")
 
+    async def _create_pool(self):
+        self.pool = await asyncpg.create_pool(
+            host=DB_HOST, port=DB_PORT, user=DB_USER,
+            password=DB_PASSWORD, database=DB_NAME,
+            min_size=DB_POOL_MIN, max_size=DB_POOL_MAX
+        )
+        self.healthy = True
+        logger.info(f"DB verbunden: {DB_HOST}:{DB_PORT}/{DB_NAME}")
+        try:
+            await self.preload_agents()
+        except Exception as e:
+            logger.warning(f"Agent-Cache konnte nicht vorgeladen werden: {e}")
+        try:
+            rows = await self.pool.fetch("SELECT id, name FROM log_sources ORDER BY id DESC LIMIT $1",
+                                         SOURCE_CACHE_SIZE)
+            for row in rows:
+                self._sources[row['name']] = RowEncoder._INT4(4, row['id'])
+        except Exception as e:
+            logger.warning(f"Source-Cache konnte nicht vorgeladen werden: {e}")
+
+    async def preload_agents(self):
+        """Agent-Cache mit einer Query vorbefüllen (verhindert Query-Sturm nach Neustart)."""
+        rows = await self.pool.fetch(
+            "SELECT id, hostname, ip_address, mac_address FROM agents ORDER BY last_seen DESC NULLS LAST LIMIT $1",
+            self._agent_cache.max_size)
+        # Älteste zuerst einfügen, damit die aktivsten Agents am LRU-Ende landen
+        for row in reversed(rows):
+            self._agent_cache.put(self._cache_key(row['hostname'], row['ip_address'], row['mac_address']), row['id'])
+            if row['mac_address']:
+                self._agent_cache.put(self._mac_key(row['mac_address']), row['id'])
+        logger.info(f"Agent-Cache vorgeladen: {len(rows)} Agents")
+
+    def start(self, ingest_queue=None):
+        """Writer-Tasks und Flush-Loop starten (ingest_queue: Füllstand für den BatchController)."""
+        self._ingest_queue = ingest_queue
+        self._writers = [asyncio.create_task(self._writer()) for _ in range(FLUSH_WRITERS)]
+        self._writers.append(asyncio.create_task(self.flush_loop()))
+        if PARTITION_DAYS_AHEAD > 0:
+            self._writers.append(asyncio.create_task(self.partition_loop()))
+        if self.spool is not None:
+            self._writers.append(asyncio.create_task(self.replay_loop()))
+
+    @property
+    def inflight(self) -> int:
+        """Batches, die auf einen Writer warten oder gerade geschrieben werden."""
+        return self._batches.qsize() + self._writing
+
+    def update_gauges(self):
+        """Füllstände für Statistik und /metrics übernehmen."""
+        stats.set('buffer_rows', self._batch.count)
+        stats.set('batches_inflight', self.inflight)
+        stats.set('agent_cache_size', len(self._agent_cache))
+        stats.set('source_cache_size', len(self._sources))
+        stats.set('last_seen_pending', len(self._agents_to_update))
+        stats.set('rollup_pending', len(self._rollup))
+
     async def close(self):
+        # Offene Wiederholungen und restlichen Buffer abgeben, warten bis alle Writer fertig sind
+        if self.dedup is not None:
+            await self._queue_repeats(self.dedup.drain())
+        await self._submit_batch()
+        if self._writers:
+            await self._batches.join()
+        for task in self._writers:
+            task.cancel()
         if self.pool:
-            await self._flush_buffer()
+            await self._flush_agent_timestamps()
+            await self._flush_rollup()
             await self.pool.close()
+        if self.spool is not None:
+            self.spool.close()
 
     def _cache_key(self, hostname: str, ip: str, mac: str) -> str:
         return f"{mac or ''}/{hostname}/{ip}"
 
-    async def get_or_create_agent(self, hostname: str, ip: str, mac: str,
-                                   device_type: str, extra_data: dict) -> int:
-        """Agent finden oder erstellen - mit In-Memory-Cache."""
-        key = self._cache_key(hostname, ip, mac)
-        now = time.monotonic()
-
-        # Cache prüfen
-        cached = self._agent_cache.get(key)
-        if cached and (now - cached[1]) < AGENT_CACHE_TTL:
-            self._agents_to_update.add(cached[0])
-            return cached[0]
+    def _mac_key(self, mac: str) -> str:
+        return f"mac:{mac}"
 
-        # DB abfragen / ggf. updaten
-        async with self.pool.acquire() as conn:
-            agent_row = None
-            if mac:
-                agent_row = await conn.fetchrow(
-                    "SELECT id, device_type, mac_address FROM agents WHERE mac_address = $1", mac)
-
-            if not agent_row:
-                agent_row = await conn.fetchrow(
-                    "SELECT id, device_type, mac_address FROM agents WHERE hostname=$1 AND ip_address=$2",
-                    hostname, ip)
-
-            if agent_row:
-                agent_id = agent_row['id']
-                updates = []
-                params = []
-
-                # Gerätetyp nachtragen, falls bisher unbekannt
-                if (agent_row['device_type'] in (None, 'unknown')) and device_type and device_type != 'unknown':
-                    updates.append(f"device_type = ${len(params) + 1}")
-                    params.append(device_type)
-
-                # MAC nachtragen, falls leer
-                if (not agent_row['mac_address']) and mac:
-                    updates.append(f"mac_address = ${len(params) + 1}")
-                    params.append(mac)
-
-                if updates:
-                    params.append(agent_id)
-                    await conn.execute(f"UPDATE agents SET {', '.join(updates)} WHERE id = ${len(params)}", *params)
-            else:
-                agent_id = await conn.fetchval(
-                    """INSERT INTO agents (hostname, ip_address, mac_address, device_type, extra_data)
-                       VALUES ($1, $2, $3, $4, $5::jsonb) RETURNING id""",
-                    hostname, ip, mac, device_type, json.dumps(extra_data))
-
-        # Cache aktualisieren
-        self._agent_cache[key] = (agent_id, now)
-        self._agents_to_update.add(agent_id)
+    def cached_agent(self, hostname: str, ip: str, mac: Optional[str]):
+        """Agent-ID aus dem Cache (None = negativ gecacht) oder CACHE_MISS."""
+        key = self._cache_key(hostname, ip, mac)
+        agent_id = self._agent_cache.get(key)
+        # Bei MAC auch über den MAC-Index (Preload / frühere Auflösung) suchen
+        if agent_id is CACHE_MISS and mac:
+            agent_id = self._agent_cache.get(self._mac_key(mac))
+            if agent_id is not CACHE_MISS:
+                self._agent_cache.put(key, agent_id)
+        if agent_id is CACHE_MISS:
+            stats.incr('agent_cache_miss')
+        else:
+            stats.incr('agent_cache_hit')
         return agent_id
 
-    async def queue_log(self, data: Dict[str, Any]):
-        """Log in den Buffer legen statt direkt einzufÃ¼gen."""
-        agent_id = await self.get_or_create_agent(
-            data['hostname'], data['ip_address'], data.get('mac_address'),
-            data['device_type'], data.get('extra_data', {}))
-
-        row = (agent_id, data['hostname'], data['ip_address'], data['facility'],
-               data['level'], data['source'], data['message'], data['raw_message'],
-               json.dumps(data.get('extra_data', {})))
+    async def _resolve_agents(self, conn, pending: Dict[str, Tuple[ParsedLog, list]]) -> Dict[str, Optional[int]]:
+        """Unbekannte Absender eines Batches mengenbasiert auflösen (key -> agent_id).
 
-        async with self._buffer_lock:
-            self._log_buffer.append(row)
-            if len(self._log_buffer) >= BATCH_SIZE:
-                await self._flush_buffer()
+        Statt SELECT/UPDATE/INSERT pro Gerät: ein SELECT über alle MACs, ein
+        INSERT ... ON CONFLICT ... RETURNING für den Rest und ein gebündeltes
+        device_type-Backfill. ON CONFLICT macht gleichzeitige Batches mit demselben
+        neuen Gerät unkritisch (kein Race auf idx_agents_hostname_ip).
+        """
+        resolved: Dict[str, Optional[int]] = {}
+        backfill: Dict[int, str] = {}
+        try:
+            # 1) Bekannte MACs (Gerät evtl. mit anderer IP/Hostname angelegt)
+            by_mac: Dict[str, list] = {}
+            for key, (info, _) in pending.items():
+                if info.mac_address:
+                    by_mac.setdefault(info.mac_address, []).append(key)
+            if by_mac:
+                for row in await conn.fetch(
+                        """SELECT DISTINCT ON (mac_address) id, mac_address, device_type FROM agents
+                           WHERE mac_address = ANY($1::text[]) ORDER BY mac_address, id""",
+                        list(by_mac)):
+                    for key in by_mac[row['mac_address']]:
+                        resolved[key] = row['id']
+                        device_type = pending[key][0].device_type
+                        if row['device_type'] in (None, 'unknown') and device_type not in (None, 'unknown'):
+                            backfill[row['id']] = device_type
+
+            # 2) Rest per Upsert auf (hostname, ip_address); MAC/device_type werden nachgetragen
+            remaining: Dict[Tuple[str, str], ParsedLog] = {}
+            for key, (info, _) in pending.items():
+                if key not in resolved:
+                    remaining.setdefault((info.hostname[:255], info.ip_address[:45]), info)
+            if remaining:
+                infos = list(remaining.values())
+                rows = await conn.fetch(
+                    """INSERT INTO agents (hostname, ip_address, mac_address, device_type, extra_data)
+                       SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::jsonb[])
+                       ON CONFLICT (hostname, ip_address) DO UPDATE SET
+                           device_type = CASE
+                               WHEN (agents.device_type IS NULL OR agents.device_type = 'unknown')
+                                    AND EXCLUDED.device_type IS NOT NULL AND EXCLUDED.device_type <> 'unknown'
+                               THEN EXCLUDED.device_type ELSE agents.device_type END,
+                           mac_address = COALESCE(agents.mac_address, EXCLUDED.mac_address)
+                       RETURNING id, hostname, ip_address, (xmax = 0) AS inserted""",
+                    [hostname for hostname, _ in remaining], [ip for _, ip in remaining],
+                    [info.mac_address for info in infos], [info.device_type[:50] for info in infos],
+                    [json.dumps(info.extra_data) for info in infos])
+                ids = {(row['hostname'], row['ip_address']): row['id'] for row in rows}
+                stats.incr('agents_created', sum(1 for row in rows if row['inserted']))
+                for key, (info, _) in pending.items():
+                    if key not in resolved:
+                        resolved[key] = ids.get((info.hostname[:255], info.ip_address[:45]))
+
+            # 3) device_type-Backfill für per MAC gefundene Agents
+            if backfill:
+                await conn.execute(
+                    """UPDATE agents SET device_type = v.device_type
+                       FROM unnest($1::int[], $2::text[]) AS v(id, device_type)
+                       WHERE agents.id = v.id AND (agents.device_type IS NULL OR agents.device_type = 'unknown')""",
+                    list(backfill), list(backfill.values()))
+        except Exception as e:
+            # DB weg: Batch samt offener Absender spoolen statt Keys negativ zu cachen
+            if self.spool is not None and self._is_transient(e):
+                raise
+            # Logs trotzdem speichern (ohne Agent); Keys negativ cachen statt pro Nachricht neu zu fragen
+            logger.error(f"Agent-Auflösung fehlgeschlagen ({len(pending)} Absender): {e}")
+
+        for key, (info, _) in pending.items():
+            agent_id = resolved.get(key)
+            self._agent_cache.put(key, agent_id)
+            if agent_id is not None:
+                if info.mac_address:
+                    self._agent_cache.put(self._mac_key(info.mac_address), agent_id)
+                self._agents_to_update.add(agent_id)
+        return resolved
+
+    async def queue_log(self, data: ParsedLog):
+        """Log in den Buffer legen statt direkt einzufÃ¼gen.
+
+        Unbekannte Absender werden nicht sofort aufgelöst, sondern pro Batch gesammelt
+        und erst beim Schreiben mengenbasiert angelegt (Zeilenkopf mit agent_id folgt dann).
+        Mit Dedup-Fenster werden Wiederholungen nur gezählt (siehe DedupWindow).
+        """
+        message_hash = None
+        if self.dedup is not None:
+            message_hash = DedupWindow.message_hash(data.source, data.message)
+            key = (self._cache_key(data.hostname, data.ip_address, data.mac_address), message_hash)
+            if self.dedup.seen(key, data, message_hash, time.time()):
+                stats.incr('deduplicated')
+                return
+        await self._append(data, 1, None, None, message_hash)
+
+    async def _queue_repeats(self, entries: list):
+        """Zusammengefasste Wiederholungen als je eine Zeile schreiben."""
+        for entry in entries:
+            await self._append(entry.data, entry.repeats, entry.first_repeat,
+                               entry.last_repeat, entry.message_hash)
+
+    async def queue_chunk(self, chunk: 'EncodedChunk'):
+        """Ergebnis eines Parse-Workers übernehmen: Agent-Lookup einmal pro Absender, Zeilen anhängen."""
+        for data in chunk.logs:
+            await self.queue_log(data)
+        senders = chunk.senders
+        agents = [self.cached_agent(info.hostname, info.ip_address, info.mac_address) for info in senders]
+        minute = int(chunk.timestamp // 60)
+        for index, fmt, source, severity, tail in chunk.rows:
+            if self._add_row(senders[index], agents[index], source, severity, minute, tail, fmt):
+                await self._submit_batch()
+
+    async def _append(self, data: ParsedLog, repeat_count: int, first_timestamp: Optional[float],
+                      last_timestamp: Optional[float], message_hash: Optional[int]):
+        """Zeile kodieren und in den aktuellen Batch schreiben (timestamp = Empfangszeit, UTC)."""
+        agent_id = self.cached_agent(data.hostname, data.ip_address, data.mac_address)
+        now = time.time()
+        tail = self.encoder.tail(data, now, repeat_count, first_timestamp, last_timestamp, message_hash)
+        if self._add_row(data, agent_id, data.source, LEVEL_SEVERITY.get(data.level), int(now // 60), tail,
+                         data.extra_data.get('format', 'plain')):
+            await self._submit_batch()
+
+    def _source_field(self, batch: LogBatch, source: Optional[str]) -> bytes:
+        """source_id-Feld aus dem Cache, sonst Platzhalter bis _resolve_sources."""
+        if not source:
+            return RowEncoder.NULL
+        source = source[:100]
+        field = self._sources.get(source)
+        if field is None:
+            index = batch.sources.get(source)
+            if index is None:
+                index = batch.sources[source] = len(batch.sources)
+            field = RowEncoder._INT4(4, -(index + 1))
+        return field
+
+    def _add_row(self, data: ParsedLog, agent_id, source: Optional[str], severity: Optional[int], minute: int,
+                 tail: bytes, fmt: str) -> bool:
+        """Kodierte Zeile in den aktuellen Batch legen; True = Batch voll (abgeben)."""
+        batch = self._batch
+        if not batch.count:
+            batch.created = time.monotonic()
+        batch.count += 1
+        batch.formats[fmt] = batch.formats.get(fmt, 0) + 1
+        # source_id steht vorne im tail (Platzhalter erkennt _copy_batch am negativen Wert)
+        tail = self._source_field(batch, source) + tail
+        if agent_id is CACHE_MISS:
+            key = self._cache_key(data.hostname, data.ip_address, data.mac_address)
+            entry = batch.pending.get(key)
+            if entry is None:
+                entry = batch.pending[key] = (data, [])
+            entry[1].append(tail)
+            rollup_key = (minute, key, severity, source[:100] if source else None)
+        else:
+            rollup_key = (minute, agent_id, severity, source[:100] if source else None)
+            if agent_id is not None:
+                self._agents_to_update.add(agent_id)
+            buf = batch.buf
+            buf += self.encoder.head(agent_id, data.ip_address)
+            if tail[4] & 0x80:
+                batch.fixups.append(len(buf))
+            buf += tail
+        batch.rollup[rollup_key] = batch.rollup.get(rollup_key, 0) + 1
+        self._appended += 1
+        return batch.count >= self.controller.size
+
+    async def _submit_batch(self):
+        """Aktuellen Buffer gegen einen leeren tauschen und an die Writer übergeben.
+
+        Der Tausch passiert synchron vor dem ersten await, daher ist kein Lock nötig.
+        Bei voller Pipeline (MAX_INFLIGHT_BATCHES) wartet der Aufrufer (Backpressure).
+        """
+        if not self._batch.count:
+            return
+        batch = self._batch
+        self._batch = LogBatch()
+        if self.spool is not None and self._batches.full():
+            # Pipeline voll: auf Platte auslagern statt den Empfang zu bremsen
+            self._spool_batch(batch)
+            return
+        await self._batches.put(batch)
 
-    async def _flush_buffer(self):
-        """Buffer in die DB schreiben via COPY (schnellster Weg)."""
-        if not self._log_buffer:
+    async def _writer(self):
+        """Writer-Task: nimmt volle Batches aus der Pipeline und schreibt sie."""
+        while True:
+            batch = await self._batches.get()
+            self._writing += 1
+            try:
+                await self._write_batch(batch)
+            finally:
+                self._writing -= 1
+                self._batches.task_done()
+
+    async def _write_batch(self, batch: LogBatch):
+        """Batch schreiben; bei DB-Ausfall in den Spool (falls aktiv)."""
+        if self.spool is not None and not self.healthy:
+            self._spool_batch(batch)
             return
+        try:
+            start = time.monotonic()
+            await self._copy_batch(batch)
+            end = time.monotonic()
+            self.controller.observe(end - start, end - batch.created)
+            stats.observe('copy_seconds', end - start)
+            stats.observe('batch_seconds', end - batch.created)
+            self._count_stored(batch)
+        except Exception as e:
+            stats.incr('failed_batches')
+            if self.spool is not None and self._is_transient(e):
+                self._mark_unhealthy(e)
+                self._spool_batch(batch)
+                return
+            stats.incr('failed', len(batch))
+            logger.error(f"Batch-Insert fehlgeschlagen ({len(batch)} Logs): {e}")
+
+    def _count_stored(self, batch: LogBatch):
+        stats.incr('stored', len(batch))
+        for fmt, n in batch.formats.items():
+            stats.incr_label('stored', 'format', fmt, n)
+        rollup = self._rollup
+        for key, n in batch.rollup.items():
+            rollup[key] = rollup.get(key, 0) + n
+
+    async def _copy_batch(self, batch: LogBatch):
+        """Batch in die DB schreiben via binärem COPY (schnellster Weg)."""
+        buf = batch.buf
+        async with self.pool.acquire() as conn:
+            if batch.pending:
+                resolved = await self._resolve_agents(conn, batch.pending)
+                head = self.encoder.head
+                for key, (info, tails) in batch.pending.items():
+                    prefix = head(resolved.get(key), info.ip_address)
+                    for tail in tails:
+                        buf += prefix
+                        if tail[4] & 0x80:
+                            batch.fixups.append(len(buf))
+                        buf += tail
+                batch.pending = {}
+                rollup = {}
+                for (minute, agent, severity, source), n in batch.rollup.items():
+                    if isinstance(agent, str):
+                        agent = resolved.get(agent)
+                    key = (minute, agent, severity, source)
+                    rollup[key] = rollup.get(key, 0) + n
+                batch.rollup = rollup
+            if batch.sources:
+                await self._resolve_sources(conn, batch)
+            buf += COPY_TRAILER
+            try:
+                await conn.copy_to_table('logs', source=buf, columns=LOG_COLUMNS, format='binary')
+            finally:
+                # Trailer wieder entfernen, falls der Batch gespoolt werden muss
+                del buf[-len(COPY_TRAILER):]
+
+    async def _resolve_sources(self, conn, batch: LogBatch):
+        """Neue Sources eines Batches anlegen und die Platzhalter in buf durch die IDs ersetzen."""
+        names = list(batch.sources)
+        # Zwei Statements: das SELECT sieht so auch Einträge, die ein anderer Writer parallel angelegt hat
+        created = await conn.fetch(
+            "INSERT INTO log_sources (name) SELECT unnest($1::text[]) ON CONFLICT (name) DO NOTHING RETURNING id",
+            names)
+        stats.incr('sources_created', len(created))
+        ids = {row['name']: row['id'] for row in await conn.fetch(
+            "SELECT id, name FROM log_sources WHERE name = ANY($1::text[])", names)}
+        fields = [RowEncoder._INT4(4, ids[name]) for name in names]
+        buf = batch.buf
+        for offset in batch.fixups:
+            index = -struct.unpack_from('!i', buf, offset + 4)[0] - 1
+            buf[offset:offset + 8] = fields[index]
+        for name, field in zip(names, fields):
+            if len(self._sources) < SOURCE_CACHE_SIZE:
+                self._sources[name] = field
+        batch.sources = {}
+        batch.fixups = []
 
-        rows = self._log_buffer
-        self._log_buffer = []
+    @staticmethod
+    def _is_transient(exc: Exception) -> bool:
+        """DB nicht erreichbar/in Wartung (spoolen) statt fehlerhafter Daten (verwerfen)."""
+        if isinstance(exc, asyncpg.PostgresError):
+            # 08 Verbindung, 53 Ressourcen (Platte voll), 57 Shutdown/Wartung, 58 System
+            return (getattr(exc, 'sqlstate', None) or '')[:2] in ('08', '53', '57', '58')
+        # Verbindungsabbrüche/Timeouts; clientseitige Datenfehler (DataError) sind ValueErrors
+        return not isinstance(exc, (ValueError, TypeError))
+
+    def _mark_unhealthy(self, exc: Exception):
+        if self.healthy:
+            logger.warning(f"DB nicht erreichbar, Logs werden gespoolt: {exc}")
+        self.healthy = False
+
+    def _spool_batch(self, batch: LogBatch):
+        """Batch (inkl. offener Absender) als Record in den Spool schreiben.
+
+        Record: [Länge Meta][Meta-JSON][fertige COPY-Zeilen][tails der offenen Absender].
+        Neue Sources stehen als Platzhalter in den Zeilen (sources/fixups, Offsets ohne COPY-Header).
+        """
+        pending = [[info.hostname, info.ip_address, info.mac_address, info.device_type,
+                    info.extra_data, [len(tail) for tail in tails]]
+                   for info, tails in batch.pending.values()]
+        header = len(COPY_HEADER)
+        meta = json.dumps({'count': batch.count, 'formats': batch.formats,
+                           'pending': pending, 'sources': list(batch.sources),
+                           'fixups': [offset - header for offset in batch.fixups],
+                           'rollup': [[*key, n] for key, n in batch.rollup.items()]},
+                          separators=(',', ':')).encode()
+        parts = [struct.pack('!i', len(meta)), meta, memoryview(batch.buf)[len(COPY_HEADER):]]
+        for _, tails in batch.pending.values():
+            parts.extend(tails)
+        if self.spool.append(b''.join(parts)):
+            stats.incr('spooled', len(batch))
+            return
+        stats.incr('failed', len(batch))
+        now = time.monotonic()
+        if now - self._spool_full_logged >= 10:
+            self._spool_full_logged = now
+            logger.error(f"Spool voll ({self.spool.size} Bytes), Batch verworfen ({len(batch)} Logs)")
+
+    def _load_spooled(self, payload: bytes) -> LogBatch:
+        meta_len = struct.unpack_from('!i', payload)[0]
+        meta = json.loads(payload[4:4 + meta_len])
+        end = len(payload) - sum(sum(lengths) for *_, lengths in meta['pending'])
+        batch = LogBatch()
+        batch.buf += memoryview(payload)[4 + meta_len:end]
+        batch.count = meta['count']
+        batch.formats = meta['formats']
+        batch.sources = {name: index for index, name in enumerate(meta['sources'])}
+        batch.fixups = [offset + len(COPY_HEADER) for offset in meta['fixups']]
+        batch.rollup = {tuple(key): n for *key, n in meta['rollup']}
+        pos = end
+        for hostname, ip, mac, device_type, extra_data, lengths in meta['pending']:
+            tails = []
+            for length in lengths:
+                tails.append(payload[pos:pos + length])
+                pos += length
+            info = ParsedLog(hostname, ip, mac, device_type, 0, '', '', '', '', extra_data)
+            batch.pending[self._cache_key(hostname, ip, mac)] = (info, tails)
+        return batch
+
+    async def replay_loop(self):
+        """Spool im Hintergrund einspielen, sobald die DB (wieder) erreichbar ist."""
+        while True:
+            try:
+                self.spool.sync_if_due()
+                if not self.healthy:
+                    await self._reconnect()
+                if self.healthy and not self.spool.empty:
+                    await self._replay_spool()
+                stats.set('spool_bytes', self.spool.size)
+            except Exception as e:
+                logger.error(f"Spool-Replay Fehler: {e}")
+            await asyncio.sleep(1.0)
 
+    async def _reconnect(self):
         try:
-            async with self.pool.acquire() as conn:
-                await conn.copy_records_to_table(
-                    'logs',
-                    records=rows,
-                    columns=['agent_id', 'hostname', 'ip_address', 'facility',
-                             'level', 'source', 'message', 'raw_message', 'extra_data']
-                )
-        except Exception as e:
-            logger.error(f"Batch-Insert fehlgeschlagen ({len(rows)} Logs): {e}")
+            if self.pool is None:
+                await self._create_pool()
+            else:
+                await self.pool.fetchval('SELECT 1')
+                self.healthy = True
+        except Exception:
+            return
+        logger.info(f"DB wieder erreichbar, Spool: {self.spool.size} Bytes")
+
+    async def _replay_spool(self):
+        """Records mit SPOOL_REPLAY_RATE einspielen, solange die Live-Pipeline Luft hat."""
+        while self.healthy and self._batches.qsize() <= MAX_INFLIGHT_BATCHES // 2:
+            record = self.spool.peek()
+            if record is None:
+                logger.info("Spool vollständig eingespielt")
+                return
+            seq, offset, payload = record
+            batch = self._load_spooled(payload)
+            try:
+                start = time.monotonic()
+                await self._copy_batch(batch)
+                stats.observe('copy_seconds', time.monotonic() - start)
+                self._count_stored(batch)
+                stats.incr('replayed', len(batch))
+            except Exception as e:
+                stats.incr('failed_batches')
+                if self._is_transient(e):
+                    self._mark_unhealthy(e)
+                    return
+                # Fehlerhafte Daten würden den Replay dauerhaft blockieren
+                stats.incr('failed', len(batch))
+                logger.error(f"Spool-Record verworfen ({len(batch)} Logs): {e}")
+            self.spool.ack(seq, offset)
+            await asyncio.sleep(len(batch) / SPOOL_REPLAY_RATE)
 
     async def _flush_agent_timestamps(self):
         """Alle ausstehenden last_seen Updates gebÃ¼ndelt schreiben."""
-        if not self._agents_to_update:
+        if not self._agents_to_update or not self.healthy:
             return
 
         agent_ids = list(self._agents_to_update)
         self._agents_to_update.clear()
 
         try:
+            start = time.monotonic()
             async with self.pool.acquire() as conn:
                 await conn.execute(
                     "UPDATE agents SET last_seen = NOW() WHERE id = ANY($1::int[])",
                     agent_ids)
+            stats.observe('last_seen_flush_seconds', time.monotonic() - start)
+            stats.set('last_seen_flush_timestamp', int(time.time()))
+            stats.incr('last_seen_updates', len(agent_ids))
         except Exception as e:
             logger.error(f"Agent last_seen Update fehlgeschlagen: {e}")
 
+    async def _flush_rollup(self):
+        """Zähler gespeicherter Zeilen per Upsert in logs_rollup übernehmen (Basis der Statistiken).
+
+        Sortiert, damit parallele Worker die Zeilen in derselben Reihenfolge sperren. Schlägt
+        der Upsert fehl, bleiben die Zähler für den nächsten Versuch erhalten.
+        """
+        if not self._rollup or not self.healthy:
+            return
+        rollup, self._rollup = self._rollup, {}
+        keys = sorted(rollup, key=lambda key: (key[0], key[1] or 0, -1 if key[2] is None else key[2], key[3] or ''))
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute(
+                    """INSERT INTO logs_rollup (minute, agent_id, severity, source_id, count)
+                       SELECT to_timestamp(r.minute * 60) AT TIME ZONE 'UTC', r.agent_id, r.severity, s.id, sum(r.count)
+                       FROM unnest($1::int[], $2::int[], $3::int2[], $4::text[], $5::int8[])
+                            AS r(minute, agent_id, severity, source, count)
+                       LEFT JOIN log_sources s ON s.name = r.source
+                       GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+                       ON CONFLICT (minute, agent_id, severity, source_id)
+                       DO UPDATE SET count = logs_rollup.count + EXCLUDED.count""",
+                    [key[0] for key in keys], [key[1] for key in keys], [key[2] for key in keys],
+                    [key[3] for key in keys], [rollup[key] for key in keys])
+            stats.incr('rollup_rows', len(keys))
+        except Exception as e:
+            for key, n in rollup.items():
+                self._rollup[key] = self._rollup.get(key, 0) + n
+            logger.error(f"Rollup-Update fehlgeschlagen: {e}")
+
     async def flush_loop(self):
-        """Periodisch Buffer und Agent-Timestamps flushen."""
+        """Buffer nach der Linger-Zeit des BatchControllers flushen, Agent-Timestamps,
+        Rollup-Zähler und Dedup-Fenster im festen BATCH_INTERVAL."""
+        last_maintenance = time.monotonic()
         while True:
-            await asyncio.sleep(BATCH_INTERVAL)
+            await asyncio.sleep(self.controller.linger)
             try:
-                async with self._buffer_lock:
-                    await self._flush_buffer()
-                await self._flush_agent_timestamps()
+                now = time.monotonic()
+                if now - last_maintenance >= BATCH_INTERVAL:
+                    last_maintenance = now
+                    if self.dedup is not None:
+                        await self._queue_repeats(self.dedup.expire(time.time()))
+                        stats.set('dedup_entries', len(self.dedup))
+                    await self._flush_agent_timestamps()
+                    await self._flush_rollup()
+                await self._submit_batch()
+                appended, self._appended = self._appended, 0
+                self.controller.tick(appended, len(self._ingest_queue) if self._ingest_queue is not None else 0,
+                                     self.inflight)
             except Exception as e:
                 logger.error(f"Flush-Loop Fehler: {e}")
 
+    async def partition_loop(self):
+        """Tages-Partitionen für die nächsten PARTITION_DAYS_AHEAD Tage sicherstellen.
 
-class SyslogUDPProtocol(asyncio.DatagramProtocol):
-    """UDP Syslog EmpfÃ¤nger."""
+        Läuft beim Start und danach stündlich (bei DB-Ausfall minütlich); ohne Partition
+        landen Zeilen in logs_default, verloren geht also nichts.
+        """
+        while True:
+            interval = 60
+            if self.pool is not None and self.healthy:
+                try:
+                    created = await self.pool.fetchval('SELECT logs_ensure_partitions($1)', PARTITION_DAYS_AHEAD)
+                    if created:
+                        logger.info(f"logs: {created} neue Tages-Partition(en) angelegt")
+                    interval = PARTITION_CHECK_INTERVAL
+                except asyncpg.UndefinedFunctionError:
+                    logger.warning("logs ist nicht partitioniert (db/init.sql einspielen), Partitionspflege aus")
+                    return
+                except Exception as e:
+                    logger.error(f"Partitionspflege fehlgeschlagen: {e}")
+            await asyncio.sleep(interval)
+
+
+def peek_severity(data: bytes) -> int:
+    """Severity direkt aus dem PRI-Header lesen (ohne Decode/Parse), Fallback 'info'."""
+    if data[:1] == b'<':
+        end = data.find(b'>', 1, 5)
+        if end > 1 and data[1:end].isdigit():
+            return int(data[1:end]) & 0x07
+    return 6
+
+
+class IngestQueue:
+    """Begrenzte Ring-Queue für empfangene Datagramme mit Überlauf-Policy.
+
+    drop_newest:   volle Queue verwirft neue Nachrichten
+    drop_oldest:   volle Queue verwirft die älteste Nachricht
+    drop_severity: volle Queue verwirft zuerst die unwichtigste Severity (debug vor info ...)
+    """
+
+    POLICIES = ('drop_newest', 'drop_oldest', 'drop_severity')
+
+    def __init__(self, capacity: int = QUEUE_CAPACITY, policy: str = QUEUE_POLICY):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unbekannte QUEUE_POLICY '{policy}' (erlaubt: {', '.join(self.POLICIES)})")
+        self.capacity = capacity
+        self.policy = policy
+        # drop_severity: ein Ring pro Severity 0..7, sonst ein einziger Ring
+        self._rings = [deque() for _ in range(8 if policy == 'drop_severity' else 1)]
+        self._size = 0
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return self._size
+
+    def _drop(self, data: bytes):
+        stats.incr('dropped')
+        stats.incr(f"dropped_{LEVEL_NAMES[peek_severity(data)]}")
+
+    def put(self, data: bytes, ip: str) -> bool:
+        """Nachricht einreihen (synchron, aus datagram_received). False = verworfen."""
+        if self.policy == 'drop_severity':
+            severity = peek_severity(data)
+            ring = self._rings[severity]
+            if self._size >= self.capacity:
+                # Unwichtigste belegte Severity suchen, die unwichtiger ist als die neue
+                for worst in range(7, severity, -1):
+                    if self._rings[worst]:
+                        self._drop(self._rings[worst].popleft()[0])
+                        self._size -= 1
+                        break
+                else:
+                    self._drop(data)
+                    return False
+        else:
+            ring = self._rings[0]
+            if self._size >= self.capacity:
+                if self.policy == 'drop_newest':
+                    self._drop(data)
+                    return False
+                self._drop(ring.popleft()[0])
+                self._size -= 1
+
+        ring.append((data, ip))
+        self._size += 1
+        stats.incr('queued')
+        self._ready.set()
+        return True
+
+    def put_many(self, entries) -> int:
+        """Mehrere (data, ip)-Einträge einreihen, gibt die Anzahl angenommener zurück."""
+        put = self.put
+        return sum(1 for data, ip in entries if put(data, ip))
+
+    async def get_batch(self, max_items: int):
+        """Bis zu max_items Nachrichten entnehmen, wartet solange die Queue leer ist.
+
+        Bei drop_severity werden wichtige Severities zuerst ausgeliefert.
+        """
+        while not self._size:
+            self._ready.clear()
+            await self._ready.wait()
+        batch = []
+        for ring in self._rings:
+            while ring and len(batch) < max_items:
+                batch.append(ring.popleft())
+            if len(batch) >= max_items:
+                break
+        self._size -= len(batch)
+        return batch
 
-    def __init__(self, parser: SyslogParser, db: DatabaseManager):
-        self.parser = parser
-        self.db = db
-        self.count = 0
 
-    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
-        msg = data.decode('utf-8', errors='replace').strip()
-        if msg:
-            self.count += 1
-            asyncio.create_task(self._process(msg, addr[0]))
+class EncodedChunk:
+    """Ergebnis von parse_chunk: fertig kodierte Zeilenreste statt ParsedLog pro Nachricht.
 
-    async def _process(self, msg: str, ip: str):
+    rows: (Absender-Index, Format, source, severity, tail); senders: pro Absender ein auf die
+    Agent-Felder reduziertes ParsedLog (wie beim Spool). Mit Dedup-Fenster stattdessen logs
+    (ParsedLog), da die Sammelzeile erst später kodiert wird. timestamp: Empfangszeit aller Zeilen.
+    """
+
+    __slots__ = ('rows', 'senders', 'logs', 'counters', 'timestamp')
+
+    def __init__(self):
+        self.timestamp = 0.0
+        self.rows = []
+        self.senders = []
+        self.logs = []
+        self.counters: Dict[str, float] = {}
+
+
+# Parser und Encoder eines Parse-Workers (gesetzt von init_parse_worker)
+_worker_parser: Optional[SyslogParser] = None
+_worker_encoder: Optional[RowEncoder] = None
+
+
+def init_parse_worker():
+    """Initializer der Parse-Worker: Signale wie run_worker, eigener Parser/Encoder/Zähler."""
+    global _worker_parser, _worker_encoder, stats
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Geerbtes Wakeup-FD gehört zum Event-Loop des Elternprozesses
+    signal.set_wakeup_fd(-1)
+    stats = IngestStats()
+    _worker_parser = SyslogParser()
+    _worker_encoder = RowEncoder()
+
+
+def parse_chunk(entries: list, dedup: bool) -> EncodedChunk:
+    """Im Parse-Worker: Datagramme parsen und direkt ins COPY-Format kodieren.
+
+    Der Hauptprozess macht danach nur noch Agent-Lookup und Batch-Append; Zähler
+    (parsed, failed, parser_switches) reisen im Ergebnis mit.
+    """
+    parser, encoder = _worker_parser, _worker_encoder
+    chunk = EncodedChunk()
+    senders: Dict[Tuple[str, str, Optional[str]], int] = {}
+    # timestamp = Empfangszeit; ein Wert pro Chunk (Abstand zum Empfang wie beim Parsen im Loop)
+    now = chunk.timestamp = time.time()
+    for data, ip in entries:
+        msg = data.decode('utf-8', errors='replace').strip()
+        if not msg:
+            continue
         try:
-            parsed = self.parser.parse(msg, ip)
-            await self.db.queue_log(parsed)
+            parsed = parser.parse(msg, ip)
+            fmt = parsed.extra_data.get('format', 'plain')
+            stats.incr('parsed')
+            stats.incr_label('parsed', 'format', fmt)
+            if dedup:
+                chunk.logs.append(parsed)
+                continue
+            key = (parsed.hostname, parsed.ip_address, parsed.mac_address)
+            index = senders.get(key)
+            if index is None:
+                index = senders[key] = len(chunk.senders)
+                chunk.senders.append(ParsedLog(parsed.hostname, parsed.ip_address, parsed.mac_address,
+                                               parsed.device_type, 0, '', '', '', '', parsed.extra_data))
+            chunk.rows.append((index, fmt, parsed.source, LEVEL_SEVERITY.get(parsed.level), encoder.tail(parsed, now)))
         except Exception as e:
+            stats.incr('failed')
             logger.error(f"Fehler: {e}")
+    chunk.counters = stats.drain()
+    return chunk
 
 
-async def handle_tcp(reader, writer, parser: SyslogParser, db: DatabaseManager):
-    """TCP Syslog Handler."""
-    addr = writer.get_extra_info('peername')
-    ip = addr[0] if addr else 'unknown'
-    try:
-        while True:
-            data = await reader.readline()
-            if not data:
-                break
+def start_parse_pool(workers: int) -> ProcessPoolExecutor:
+    """Parse-Worker starten (fork, alle sofort - vor DB-Pool und Metrics-Thread)."""
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                               initializer=init_parse_worker)
+    pool.submit(os.getpid).result()
+    return pool
+
+
+async def ingest_consumer(ingest_queue: IngestQueue, parser: SyslogParser, db: DatabaseManager,
+                          pool: Optional[ProcessPoolExecutor] = None):
+    """Entnimmt Batches aus der Ingest-Queue, parst sie und legt sie in den DB-Buffer.
+
+    Mit pool (PARSE_WORKERS) wird parallel in den Parse-Workern geparst und kodiert,
+    der Event-Loop wartet nur auf das Ergebnis.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = await ingest_queue.get_batch(QUEUE_BATCH)
+        if pool is not None:
+            try:
+                chunk = await loop.run_in_executor(pool, parse_chunk, batch, db.dedup is not None)
+            except BrokenProcessPool as e:
+                logger.error(f"Parse-Worker ausgefallen, parse im Hauptprozess weiter: {e}")
+                pool = None
+            else:
+                stats.add(chunk.counters)
+                await db.queue_chunk(chunk)
+                stats.incr('processed', len(batch))
+                continue
+        for data, ip in batch:
             msg = data.decode('utf-8', errors='replace').strip()
-            if msg:
+            if not msg:
+                continue
+            try:
                 parsed = parser.parse(msg, ip)
+                stats.incr('parsed')
+                stats.incr_label('parsed', 'format', parsed.extra_data.get('format', 'plain'))
                 await db.queue_log(parsed)
-    except:
+            except Exception as e:
+                stats.incr('failed')
+                logger.error(f"Fehler: {e}")
+        stats.incr('processed', len(batch))
+        # Anderen Tasks (Empfang, Flush) Zeit geben
+        await asyncio.sleep(0)
+
+
+class SyslogUDPProtocol(asyncio.DatagramProtocol):
+    """UDP Syslog EmpfÃ¤nger - reiht Datagramme nur in die Ingest-Queue ein."""
+
+    def __init__(self, ingest_queue: IngestQueue):
+        self.queue = ingest_queue
+        self.count = 0
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        if data:
+            self.count += 1
+            stats.incr('received')
+            stats.incr_label('received', 'protocol', 'udp')
+            self.queue.put(data, addr[0])
+
+
+def create_udp_socket(port: int, reuse_port: bool, rcvbuf: int = UDP_RCVBUF) -> socket.socket:
+    """UDP-Socket für beide Engines (SO_RCVBUF muss vor dem ersten Datagramm gesetzt sein)."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        # Linux verdoppelt den Wert intern, begrenzt wird er durch net.core.rmem_max
+        effective = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) // 2
+        if effective < rcvbuf:
+            logger.warning(f"SO_RCVBUF nur {effective} statt {rcvbuf} Bytes "
+                           f"(sysctl net.core.rmem_max erhöhen)")
+    sock.bind(('0.0.0.0', port))
+    sock.setblocking(False)
+    return sock
+
+
+class BatchUDPReceiver:
+    """UDP-Empfang ohne DatagramProtocol-Callback pro Paket.
+
+    Der Socket wird per add_reader überwacht; pro Wakeup werden bis zu UDP_RECV_BATCH
+    Datagramme non-blocking in einen vorab allokierten Buffer gelesen (recvmmsg-artig,
+    Python bietet kein recvmmsg) und als ganzer Batch in die Ingest-Queue gelegt.
+    """
+
+    def __init__(self, sock: socket.socket, ingest_queue: IngestQueue, max_batch: int = UDP_RECV_BATCH):
+        self.sock = sock
+        self.queue = ingest_queue
+        self.max_batch = max_batch
+        self._buf = bytearray(UDP_MAX_DATAGRAM)
+        self._view = memoryview(self._buf)
+        self._loop = None
+        self.count = 0
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def close(self):
+        if self._loop:
+            self._loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+    def _on_readable(self):
+        recv_into = self.sock.recvfrom_into
+        buf, view = self._buf, self._view
+        batch = []
+        for _ in range(self.max_batch):
+            try:
+                nbytes, addr = recv_into(buf)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                logger.warning(f"UDP Empfangsfehler: {e}")
+                break
+            if nbytes:
+                batch.append((view[:nbytes].tobytes(), addr[0]))
+        if batch:
+            self.count += len(batch)
+            stats.incr('received', len(batch))
+            stats.incr_label('received', 'protocol', 'udp', len(batch))
+            self.queue.put_many(batch)
+
+
+class SyslogTCPProtocol(asyncio.BufferedProtocol):
+    """TCP Syslog EmpfÃ¤nger mit RFC 6587 Framing.
+
+    Liest per BufferedProtocol direkt in einen vorab allokierten Buffer, zerlegt pro
+    Read beliebig viele Frames (memoryview-Slices) und reiht sie gesammelt in die
+    Ingest-Queue ein. Unterstützt Octet-Counting ("LEN SP MSG") und Non-Transparent-
+    Framing (LF- oder NUL-getrennt), auch gemischt pro Verbindung. Zu große Frames
+    werden verworfen und die Session synchronisiert sich neu, statt abzubrechen.
+    Bei voller Ingest-Queue wird nicht verworfen, sondern das Lesen pausiert.
+    """
+
+    def __init__(self, ingest_queue: IngestQueue, max_frame: int = TCP_MAX_FRAME):
+        self.queue = ingest_queue
+        self.max_frame = max_frame
+        self._buf = bytearray(max(TCP_READ_BUFFER, max_frame + 32))
+        self._view = memoryview(self._buf)
+        self._end = 0
+        # Resync nach kaputtem Frame: bis zum nächsten LF bzw. noch N Bytes verwerfen
+        self._skip_line = False
+        self._skip_bytes = 0
+        self._transport = None
+        self._ip = 'unknown'
+        self._paused = False
+        # Frames, die bei pausiertem Lesen noch nicht in die Queue passen
+        self._backlog = []
+        self.count = 0
+
+    def connection_made(self, transport):
+        self._transport = transport
+        peer = transport.get_extra_info('peername')
+        self._ip = peer[0] if peer else 'unknown'
+
+    def connection_lost(self, exc):
+        self._transport = None
+
+    def get_buffer(self, sizehint: int):
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes: int):
+        self._end += nbytes
+        frames = []
+        pos = self._split(frames)
+        # Unvollständigen Rest an den Anfang schieben
+        rest = self._end - pos
+        if rest and pos:
+            self._buf[:rest] = self._view[pos:self._end]
+        self._end = rest
+        if frames:
+            self._deliver(frames)
+
+    def eof_received(self):
+        # Letzter Non-Transparent-Frame ohne abschließendes LF
+        if self._end and not self._skip_line and not self._skip_bytes:
+            frame = self._view[:self._end].tobytes().strip(b'\r\n\x00 ')
+            if frame and len(frame) <= self.max_frame:
+                self._deliver([frame])
+        self._end = 0
+        return None
+
+    def _bad_frame(self, reason: str):
+        stats.incr('bad_frames')
+        logger.debug(f"TCP {self._ip}: Frame verworfen ({reason})")
+
+    def _split(self, frames: list) -> int:
+        """Frames aus buf[0:end] nach `frames` schneiden, gibt die Position des Rests zurück."""
+        buf, view, end, max_frame = self._buf, self._view, self._end, self.max_frame
+        pos = 0
+        while pos < end:
+            if self._skip_bytes:
+                skipped = min(self._skip_bytes, end - pos)
+                self._skip_bytes -= skipped
+                pos += skipped
+                continue
+            if self._skip_line:
+                nl = buf.find(b'\n', pos, end)
+                if nl < 0:
+                    return end
+                self._skip_line = False
+                pos = nl + 1
+                continue
+
+            c = buf[pos]
+            if c in b'\n\r\x00 ':
+                # Leerzeilen / Trenner zwischen Frames
+                pos += 1
+            elif 0x31 <= c <= 0x39:
+                # Octet-Counting: "LEN SP MSG" (LEN ohne führende 0)
+                sp = buf.find(b' ', pos, min(end, pos + 11))
+                if sp < 0:
+                    if end - pos < 11:
+                        return pos  # Header noch unvollständig
+                    digits = None
+                else:
+                    digits = buf[pos:sp]
+                if digits is not None and digits.isdigit():
+                    length = int(digits)
+                    start = sp + 1
+                    if length > max_frame:
+                        self._bad_frame(f"{length} Bytes > TCP_MAX_FRAME")
+                        self._skip_bytes = length
+                        pos = start
+                    elif start + length > end:
+                        return pos  # Frame noch unvollständig
+                    else:
+                        frames.append(view[start:start + length].tobytes())
+                        pos = start + length
+                    continue
+                # Keine gültige Längenangabe: als Non-Transparent-Frame behandeln
+                pos = self._split_line(frames, pos)
+                if pos < 0:
+                    return -pos - 1
+            else:
+                pos = self._split_line(frames, pos)
+                if pos < 0:
+                    return -pos - 1
+        return pos
+
+    def _split_line(self, frames: list, pos: int) -> int:
+        """Non-Transparent-Frame ab pos; negativ (-pos-1), wenn der Frame unvollständig ist."""
+        buf, end = self._buf, self._end
+        nl = buf.find(b'\n', pos, end)
+        stop = nl if nl >= 0 else end
+        nul = buf.find(b'\x00', pos, stop)
+        if nul >= 0:
+            nl = nul
+        if nl < 0:
+            if end - pos > self.max_frame:
+                self._bad_frame("Zeile > TCP_MAX_FRAME")
+                self._skip_line = True
+                return end
+            return -pos - 1
+        if nl - pos > self.max_frame:
+            self._bad_frame("Zeile > TCP_MAX_FRAME")
+        else:
+            frames.append(self._view[pos:nl].tobytes())
+        return nl + 1
+
+    def _deliver(self, frames: list):
+        self.count += len(frames)
+        stats.incr('received', len(frames))
+        stats.incr_label('received', 'protocol', 'tcp', len(frames))
+        self._backlog.extend(frames)
+        self._enqueue()
+        # Backpressure: TCP kann warten, daher Lesen pausieren statt verwerfen
+        if not self._paused and (self._backlog or len(self.queue) >= self.queue.capacity * TCP_PAUSE_RATIO):
+            self._paused = True
+            if self._transport:
+                self._transport.pause_reading()
+            asyncio.get_running_loop().call_later(0.05, self._maybe_resume)
+
+    def _enqueue(self):
+        """Frames aus dem Backlog einreihen, soweit unterhalb von TCP_PAUSE_RATIO Platz ist."""
+        room = int(self.queue.capacity * TCP_PAUSE_RATIO) - len(self.queue)
+        if room > 0 and self._backlog:
+            ip = self._ip
+            self.queue.put_many([(frame, ip) for frame in self._backlog[:room]])
+            del self._backlog[:room]
+
+    def _maybe_resume(self):
+        self._enqueue()
+        if self._backlog or len(self.queue) >= self.queue.capacity * TCP_PAUSE_RATIO / 2:
+            asyncio.get_running_loop().call_later(0.05, self._maybe_resume)
+            return
+        self._paused = False
+        if self._transport:
+            self._transport.resume_reading()
+
+
+async def stats_loop(ingest_queue: IngestQueue, db: DatabaseManager, worker_id: Optional[int] = None, stats_queue=None):
+    """Zähler periodisch loggen bzw. an den Supervisor melden.
+
+    Füllstände werden alle paar Sekunden aktualisiert (aktuelle Werte unter /metrics),
+    geloggt wird nur alle STATS_INTERVAL.
+    """
+    interval = min(STATS_INTERVAL, 5.0)
+    last_report = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        stats.set('queue_depth', len(ingest_queue))
+        db.update_gauges()
+        if stats_queue is not None:
+            try:
+                stats_queue.put_nowait((worker_id, stats.snapshot()))
+            except queue.Full:
+                pass
+        elif time.monotonic() - last_report >= STATS_INTERVAL:
+            last_report = time.monotonic()
+            logger.info(f"Ingest: {IngestStats.format(stats.snapshot())}")
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics im Prometheus-Textformat; collect liefert den Text (siehe start_metrics_server)."""
+
+    collect: Callable[[], str]
+
+    def do_GET(self):
+        if self.path.partition('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.collect().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Kein Access-Log pro Scrape
         pass
+
+
+def start_metrics_server(collect: Callable[[], str], port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """HTTP-Endpunkt in einem Daemon-Thread starten (Scrapes blockieren den Event-Loop nicht).
+
+    Der Thread liest nur Snapshots (dict-Kopie unter dem GIL), geschrieben wird weiter
+    ausschließlich vom Event-Loop bzw. Supervisor.
+    """
+    if not port:
+        return None
+    handler = type('Handler', (MetricsHandler,), {'collect': staticmethod(collect)})
+    try:
+        server = ThreadingHTTPServer(('0.0.0.0', port), handler)
+    except OSError as e:
+        logger.error(f"Metrics-Endpunkt auf Port {port} nicht verfügbar: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"Metrics: http://0.0.0.0:{port}/metrics")
+    return server
+
+
+async def serve(worker_id: Optional[int] = None, stats_queue=None):
+    """Ein Ingest-Prozess: UDP/TCP empfangen, parsen, in Batches schreiben."""
+    reuse_port = worker_id is not None
+
+    parser = SyslogParser()
+    # Zuerst forken: die Parse-Worker sollen weder DB-Verbindungen noch Threads erben
+    parse_pool = start_parse_pool(PARSE_WORKERS) if PARSE_WORKERS > 0 else None
+    spool = None
+    if SPOOL_DIR:
+        # Pro Worker ein eigenes Verzeichnis (Neustart eines Workers übernimmt seinen Spool)
+        spool = Spool(SPOOL_DIR if worker_id is None else os.path.join(SPOOL_DIR, f"worker-{worker_id}"))
+    db = DatabaseManager(spool, DedupWindow() if DEDUP_WINDOW > 0 else None)
+    await db.connect()
+    ingest_queue = IngestQueue()
+
+    # Writer + Flush-Loop starten (Batch-Inserts + Agent last_seen)
+    db.start(ingest_queue)
+    asyncio.create_task(stats_loop(ingest_queue, db, worker_id, stats_queue))
+    # Im Supervisor-Modus exportiert der Supervisor die Werte aller Worker
+    metrics = start_metrics_server(lambda: IngestStats.render(stats.snapshot())) if worker_id is None else None
+    # Mit Parse-Workern je Worker mind. zwei Consumer, damit keiner auf den Loop wartet
+    consumers = max(QUEUE_CONSUMERS, 2 * PARSE_WORKERS)
+    for _ in range(consumers):
+        asyncio.create_task(ingest_consumer(ingest_queue, parser, db, parse_pool))
+
+    loop = asyncio.get_running_loop()
+
+    # UDP Server (SO_REUSEPORT: Kernel verteilt per Absender-Hash auf die Worker,
+    # ein Gerät landet also immer beim selben Worker und dessen Agent-Cache)
+    if UDP_ENGINE not in ('protocol', 'batch'):
+        raise ValueError(f"Unbekannte UDP_ENGINE '{UDP_ENGINE}' (erlaubt: protocol, batch)")
+    if UDP_ENGINE == 'batch':
+        receiver = BatchUDPReceiver(create_udp_socket(SYSLOG_PORT, reuse_port), ingest_queue)
+        receiver.start(loop)
+        udp_close = receiver.close
+    else:
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: SyslogUDPProtocol(ingest_queue), sock=create_udp_socket(SYSLOG_PORT, reuse_port))
+        udp_close = transport.close
+
+    # TCP Server
+    tcp_server = await loop.create_server(
+        lambda: SyslogTCPProtocol(ingest_queue),
+        '0.0.0.0', SYSLOG_PORT, reuse_port=reuse_port)
+
+    # SIGTERM (docker stop) sauber behandeln, damit der Buffer noch geflusht wird
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+
+    if worker_id is None:
+        logger.info(f"Syslog Server lÃ¤uft auf UDP/TCP Port {SYSLOG_PORT}")
+        if BATCH_ADAPTIVE:
+            logger.info(f"Batch-Modus: adaptiv {BATCH_SIZE_MIN}-{BATCH_SIZE_MAX} Logs, Linger "
+                        f"{BATCH_LINGER_MIN}-{BATCH_INTERVAL}s, Ziel-Latenz {BATCH_TARGET_LATENCY}s")
+        else:
+            logger.info(f"Batch-Modus: {BATCH_SIZE} Logs oder alle {BATCH_INTERVAL}s")
+        logger.info(f"{FLUSH_WRITERS} Writer, max. {MAX_INFLIGHT_BATCHES} Batches in der Pipeline")
+        logger.info(f"Ingest-Queue: {QUEUE_CAPACITY} Nachrichten, Policy {QUEUE_POLICY}, "
+                    f"{consumers} Consumer")
+        if parse_pool is not None:
+            logger.info(f"Parse-Worker: {PARSE_WORKERS} Prozesse")
+        logger.info(f"UDP-Engine: {UDP_ENGINE}, Event-Loop: {loop_name(loop)}")
+        logger.info(f"Parser: {', '.join(p.name for p in parser.parsers)}")
+        if DEDUP_WINDOW > 0:
+            logger.info(f"Dedup: Wiederholungen innerhalb {DEDUP_WINDOW}s zusammenfassen")
+        if spool is not None:
+            logger.info(f"Spool: {SPOOL_DIR}, max. {SPOOL_MAX_BYTES} Bytes, fsync {SPOOL_FSYNC}")
+    else:
+        logger.info(f"Worker {worker_id} (PID {os.getpid()}) lÃ¤uft auf UDP/TCP Port {SYSLOG_PORT}")
+
+    try:
+        await stop.wait()
     finally:
-        writer.close()
+        udp_close()
+        tcp_server.close()
+        await db.close()
+        if parse_pool is not None:
+            parse_pool.shutdown(cancel_futures=True)
+        if metrics is not None:
+            metrics.shutdown()
+            metrics.server_close()
+
+
+def loop_factory(mode: str = EVENT_LOOP) -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """Event-Loop-Fabrik für asyncio.Runner (None = Standard-Loop von asyncio)."""
+    if mode not in ('auto', 'uvloop', 'asyncio'):
+        raise ValueError(f"Unbekannter EVENT_LOOP '{mode}' (erlaubt: auto, uvloop, asyncio)")
+    if mode == 'uvloop' and uvloop is None:
+        raise RuntimeError("EVENT_LOOP=uvloop, aber uvloop ist nicht installiert")
+    if mode == 'asyncio' or uvloop is None:
+        return None
+    return uvloop.new_event_loop
+
+
+def loop_name(loop: asyncio.AbstractEventLoop) -> str:
+    return 'uvloop' if uvloop is not None and isinstance(loop, uvloop.Loop) else 'asyncio'
+
+
+def run_loop(coro, mode: str = EVENT_LOOP):
+    """Wie asyncio.run, aber mit dem per EVENT_LOOP gewählten Loop."""
+    with asyncio.Runner(loop_factory=loop_factory(mode)) as runner:
+        return runner.run(coro)
 
 
 async def main():
     logger.info("=" * 60)
     logger.info("LogBot Syslog Server v2026.02.16.12.00.00")
     logger.info("=" * 60)
+    await serve()
 
-    parser = SyslogParser()
-    db = DatabaseManager()
-    await db.connect()
 
-    # Flush-Loop starten (Batch-Inserts + Agent last_seen)
-    asyncio.create_task(db.flush_loop())
+# ==============================================================================
+# SUPERVISOR - N Worker-Prozesse mit SO_REUSEPORT
+# ==============================================================================
 
-    loop = asyncio.get_event_loop()
+def run_worker(worker_id: int, stats_queue):
+    """Einstiegspunkt eines Worker-Prozesses."""
+    global stats
+    stats = IngestStats()
+    # Handler des Supervisors nicht erben: SIGINT ignorieren, SIGTERM beendet
+    # (im Event-Loop übernimmt serve() SIGTERM für einen sauberen Flush)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    run_loop(serve(worker_id, stats_queue))
 
-    # UDP Server
-    transport, protocol = await loop.create_datagram_endpoint(
-        lambda: SyslogUDPProtocol(parser, db),
-        local_addr=('0.0.0.0', SYSLOG_PORT))
 
-    # TCP Server
-    tcp_server = await asyncio.start_server(
-        lambda r, w: handle_tcp(r, w, parser, db),
-        '0.0.0.0', SYSLOG_PORT)
+def run_supervisor(workers: int):
+    """Startet N Worker, startet abgestürzte neu und aggregiert deren Zähler."""
+    logger.info("=" * 60)
+    logger.info(f"LogBot Syslog Server v2026.02.16.12.00.00 - Supervisor ({workers} Worker)")
+    logger.info("=" * 60)
 
-    logger.info(f"Syslog Server lÃ¤uft auf UDP/TCP Port {SYSLOG_PORT}")
-    logger.info(f"Batch-Modus: {BATCH_SIZE} Logs oder alle {BATCH_INTERVAL}s")
+    ctx = multiprocessing.get_context('fork')
+    stats_queue = ctx.Queue(maxsize=workers * 64)
+    procs: Dict[int, Any] = {}
+    # Letzter Snapshot pro Worker + Summe beendeter Worker (Zähler bleiben monoton)
+    latest: Dict[int, Dict[str, int]] = {}
+    retired: Dict[str, int] = IngestStats.merge([])
+    stopping = False
 
-    try:
-        await tcp_server.serve_forever()
-    finally:
-        transport.close()
-        tcp_server.close()
-        await db.close()
+    def start(worker_id: int):
+        proc = ctx.Process(target=run_worker, args=(worker_id, stats_queue),
+                           name=f"syslog-worker-{worker_id}")
+        proc.start()
+        procs[worker_id] = proc
 
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
 
-if __name__ == '__main__':
-    asyncio.run(main())
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for worker_id in range(workers):
+        start(worker_id)
+
+    def collect() -> str:
+        snaps = dict(latest)
+        return IngestStats.render(IngestStats.merge([retired, *snaps.values()]), snaps)
 
+    # Erst nach dem Fork starten (Worker brauchen den Metrics-Thread nicht)
+    metrics = start_metrics_server(collect)
+
+    last_report = time.monotonic()
+    while not stopping:
+        mp_wait([p.sentinel for p in procs.values()], timeout=1.0)
+
+        while True:
+            try:
+                worker_id, snap = stats_queue.get_nowait()
+            except queue.Empty:
+                break
+            latest[worker_id] = snap
+
+        for worker_id, proc in list(procs.items()):
+            if proc.is_alive() or stopping:
+                continue
+            logger.error(f"Worker {worker_id} beendet (Exit-Code {proc.exitcode}), Neustart")
+            retired = IngestStats.merge([retired, latest.pop(worker_id, {})])
+            time.sleep(1)
+            start(worker_id)
+
+        if time.monotonic() - last_report >= STATS_INTERVAL:
+            last_report = time.monotonic()
+            total = IngestStats.merge([retired, *latest.values()])
+            total.update(IngestStats.gauge_max(latest.values()))
+            logger.info(f"Ingest gesamt ({len(procs)} Worker, Gauges als Maximum): {IngestStats.format(total)}")
+
+    logger.info("Supervisor beendet Worker...")
+    if metrics is not None:
+        metrics.shutdown()
+    for proc in procs.values():
+        proc.terminate()
+    for proc in procs.values():
+        proc.join(timeout=15)
+
+
+if __name__ == '__main__':
+    if SYSLOG_WORKERS > 1:
+        run_supervisor(SYSLOG_WORKERS)
+    else:
+        run_loop(main())
@@ -0,0 +1,36 @@
+# ==============================================================================
+# Name:        Philipp Fischer
+# Kontakt:     p.fischer@itconex.de
+# Version:     2026.10.18.12.00.00
+# Beschreibung: LogBot v2026.10.18.12.00.00 - Tests der Parser-Kette (SyslogParser)
+# ==============================================================================
+#
+# Ausführen im Verzeichnis syslog: python -m pytest tests
+
+from syslog_server import SyslogParser
+
+BSD = '<14>Feb 16 12:00:00 win1 sshd[1]: hello'
+NXLOG = ('<14>Feb 16 12:00:00 WIN1 Microsoft-Windows-Security-Auditing[4]: '
+         '{"EventTime":"2026-02-16 12:00:00","Hostname":"WIN1.corp","EventType":"AUDIT_SUCCESS",'
+         '"EventID":4624,"Channel":"Security","Message":"An account was successfully logged on"}')
+
+
+def fields(parsed) -> tuple:
+    return tuple(getattr(parsed, name) for name in parsed.__slots__)
+
+
+def test_mixed_bsd_and_nxlog_from_one_sender():
+    # Ein gemerkter Auffang-Parser (bsd) darf den Windows-Parser nicht verdrängen
+    parser = SyslogParser()
+    for raw in (BSD, NXLOG, BSD, NXLOG):
+        assert fields(parser.parse(raw, '10.0.0.1')) == fields(SyslogParser().parse(raw, '10.0.0.1'))
+    assert parser.parse(NXLOG, '10.0.0.1').extra_data['event_id'] == 4624
+    assert parser.parse(BSD, '10.0.0.1').extra_data == {'format': 'bsd'}
+
+
+def test_specific_parser_is_remembered():
+    parser = SyslogParser()
+    parser.parse(NXLOG, '10.0.0.1')
+    assert '10.0.0.1' in parser._by_sender
+    parser.parse(BSD, '10.0.0.3')
+    assert '10.0.0.3' not in parser._by_sender
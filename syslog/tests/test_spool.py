@@ -0,0 +1,60 @@
+# ==============================================================================
+# Name:        Philipp Fischer
+# Kontakt:     p.fischer@itconex.de
+# Version:     2026.10.18.12.00.00
+# Beschreibung: LogBot v2026.10.18.12.00.00 - Tests des Write-Ahead-Spools (Spool)
+# ==============================================================================
+#
+# Ausführen im Verzeichnis syslog: python -m pytest tests
+
+from syslog_server import Spool
+
+
+def replay(spool: Spool) -> list:
+    payloads = []
+    while True:
+        record = spool.peek()
+        if record is None:
+            return payloads
+        seq, offset, payload = record
+        payloads.append(payload)
+        spool.ack(seq, offset)
+
+
+def test_replay_after_restart(tmp_path):
+    spool = Spool(str(tmp_path), fsync='never')
+    assert spool.append(b'a') and spool.append(b'b')
+    spool.close()
+    assert replay(Spool(str(tmp_path), fsync='never')) == [b'a', b'b']
+
+
+def test_drain_restart_spool_replay(tmp_path):
+    # Nach komplettem Replay darf der alte Cursor neue Records nicht überspringen
+    spool = Spool(str(tmp_path), fsync='never')
+    spool.append(b'a')
+    spool.append(b'b')
+    assert replay(spool) == [b'a', b'b']
+    spool.close()
+
+    spool = Spool(str(tmp_path), fsync='never')
+    assert spool.empty
+    spool.append(b'c')
+    spool.append(b'd')
+    spool.close()
+    assert replay(Spool(str(tmp_path), fsync='never')) == [b'c', b'd']
+
+
+def test_stale_cursor_after_crash(tmp_path):
+    # Absturz zwischen Löschen des Segments und Zurücksetzen des Cursors
+    spool = Spool(str(tmp_path), fsync='never')
+    spool.append(b'a')
+    spool.close()
+    spool = Spool(str(tmp_path), fsync='never')
+    seq, offset, _ = spool.peek()
+    spool.ack(seq, offset)
+    (tmp_path / f"seg-{seq:012d}.spool").unlink()
+
+    spool = Spool(str(tmp_path), fsync='never')
+    spool.append(b'b')
+    spool.close()
+    assert replay(Spool(str(tmp_path), fsync='never')) == [b'b']